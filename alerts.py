@@ -2,7 +2,7 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
 from database import DatabaseManager
-from utils import classify_domain
+from repository import shared_repository
 from twilio.rest import Client
 import os
 
@@ -50,35 +50,24 @@ class AlertSystem:
             st.error(f"Erreur envoi SMS: {str(e)}")
             return False
     
-    def check_absence_alerts(self, days_to_check=30):
+    def check_absence_alerts(self, days_to_check=30, counts=None):
         """Vérifie les alertes d'absence (plus de 2 absences)"""
         try:
-            end_date = datetime.now().date()
-            start_date = end_date - timedelta(days=days_to_check)
+            if counts is None:
+                counts = self._employee_counts(days_to_check)
             
-            df = self.db.get_attendance_data(start_date, end_date)
-            
-            if df.empty:
+            if counts.empty:
                 return []
             
-            # Ajout de la classification des domaines
-            df['domaine'] = df['matricule'].apply(classify_domain)
-            
-            # Comptage des absences par employé
-            absence_counts = df[df['statut'] == 'Absent'].groupby('matricule').size()
-            
             # Employés avec plus de 2 absences
-            problematic_employees = absence_counts[absence_counts > 2]
+            problematic_employees = counts[counts['absent'] > 2]
             
             alerts = []
-            for matricule, count in problematic_employees.items():
-                # Informations sur l'employé
-                emp_data = df[df['matricule'] == matricule]
-                domaine = emp_data['domaine'].iloc[0] if not emp_data.empty else 'Inconnu'
-                
-                # Dernières absences
-                recent_absences = emp_data[emp_data['statut'] == 'Absent'].tail(3)
-                last_absence_date = recent_absences['date_pointage'].max() if not recent_absences.empty else None
+            for row in problematic_employees.itertuples(index=False):
+                matricule = row.matricule
+                domaine = row.domaine
+                count = int(row.absent)
+                last_absence_date = row.derniere_absence.date() if pd.notna(row.derniere_absence) else None
                 
                 alert = {
                     'type': 'absence',
@@ -99,35 +88,24 @@ class AlertSystem:
             st.error(f"Erreur vérification alertes absences: {str(e)}")
             return []
     
-    def check_lateness_alerts(self, days_to_check=30):
+    def check_lateness_alerts(self, days_to_check=30, counts=None):
         """Vérifie les alertes de retard (3 retards ou plus)"""
         try:
-            end_date = datetime.now().date()
-            start_date = end_date - timedelta(days=days_to_check)
+            if counts is None:
+                counts = self._employee_counts(days_to_check)
             
-            df = self.db.get_attendance_data(start_date, end_date)
-            
-            if df.empty:
+            if counts.empty:
                 return []
             
-            # Ajout de la classification des domaines
-            df['domaine'] = df['matricule'].apply(classify_domain)
-            
-            # Comptage des retards par employé
-            late_counts = df[df['statut'] == 'Retard'].groupby('matricule').size()
-            
             # Employés avec 3 retards ou plus
-            problematic_employees = late_counts[late_counts >= 3]
+            problematic_employees = counts[counts['late'] >= 3]
             
             alerts = []
-            for matricule, count in problematic_employees.items():
-                # Informations sur l'employé
-                emp_data = df[df['matricule'] == matricule]
-                domaine = emp_data['domaine'].iloc[0] if not emp_data.empty else 'Inconnu'
-                
-                # Derniers retards
-                recent_lates = emp_data[emp_data['statut'] == 'Retard'].tail(3)
-                last_late_date = recent_lates['date_pointage'].max() if not recent_lates.empty else None
+            for row in problematic_employees.itertuples(index=False):
+                matricule = row.matricule
+                domaine = row.domaine
+                count = int(row.late)
+                last_late_date = row.dernier_retard.date() if pd.notna(row.dernier_retard) else None
                 
                 alert = {
                     'type': 'retard',
@@ -148,10 +126,29 @@ class AlertSystem:
             st.error(f"Erreur vérification alertes retards: {str(e)}")
             return []
     
-    def get_all_alerts(self, days_to_check=30):
-        """Récupère toutes les alertes"""
-        absence_alerts = self.check_absence_alerts(days_to_check)
-        lateness_alerts = self.check_lateness_alerts(days_to_check)
+    def _employee_counts(self, days_to_check):
+        """Comptes par employé sur la période de contrôle (dépôt partagé, sinon agrégés en base)"""
+        repository = shared_repository(self.db)
+        if days_to_check <= repository.days:
+            return repository.employee_counts(days_to_check)
+        
+        end_date = datetime.now().date()
+        start_date = end_date - timedelta(days=days_to_check)
+        return self.db.get_employee_counts(start_date, end_date)
+    
+    def get_all_alerts(self, days_to_check=30, frame=None):
+        """
+        Récupère toutes les alertes.
+        `frame` (AttendanceFrame de la période) évite la lecture des comptes en base.
+        """
+        # Une seule lecture de la période, partagée par les deux contrôles
+        if frame is not None:
+            counts = frame.employee_counts()
+        else:
+            counts = self._employee_counts(days_to_check)
+        
+        absence_alerts = self.check_absence_alerts(days_to_check, counts)
+        lateness_alerts = self.check_lateness_alerts(days_to_check, counts)
         
         all_alerts = absence_alerts + lateness_alerts
         
@@ -6,8 +6,18 @@ from datetime import datetime, timedelta, date
 import time
 import os
 from database import DatabaseManager
-from utils import classify_domain, calculate_statistics, format_time_display
-from reports import generate_pdf_report, generate_csv_report
+from data_cache import AttendanceCache
+from async_loader import AsyncDataLoader
+from repository import shared_repository
+from listener import ChangeListener
+from metrics import query_metrics
+from schema import install_indexes, verify_query_plans, QueryPlanError
+from partitioning import ensure_partitions
+from expected_attendance import materialize_daily
+from utils import classify_domains, format_time_display
+from domains import domain_registry
+from stats_engine import PERIOD_LABELS, AttendanceStats, multi_period_stats, resolve_periods
+from reports import generate_pdf_report, generate_csv_report_from_chunks
 from auth import AuthManager
 from chatbot import AttendanceChatbot
 from prediction import AttendancePrediction
@@ -37,13 +47,96 @@ def init_modules():
 # Initialisation de la base de données
 @st.cache_resource
 def init_database():
-    return DatabaseManager()
+    db = DatabaseManager()
+    # Préchargement de l'annuaire des ouvriers (insertions et lectures enrichies)
+    try:
+        db.workers.refresh()
+    except Exception as e:
+        print(f"⚠️ Annuaire des ouvriers non préchargé : {e}")
+    # Table partitionnée : partitions des prochains mois (renouvelées chaque nuit, voir render.yaml)
+    if db.attendance_partitioned():
+        ensure_partitions(db)
+    # Absences implicites des jours clos depuis le dernier calcul (effectif actif sans pointage)
+    materialize_daily(db)
+    return db
+
+# Cache des pointages détaillés, synchronisé par delta (seules les nouvelles lignes sont téléchargées)
+@st.cache_resource
+def init_attendance_cache():
+    return AttendanceCache(init_database())
+
+# Notifications des écritures (LISTEN/NOTIFY) : invalidation ciblée des caches
+@st.cache_resource
+def init_listener():
+    db = init_database()
+    if not db.notifications_available():
+        print("ℹ️ Triggers de notification absents (python schema.py install-notify) : actualisation périodique")
+        return None
+
+    listener = ChangeListener(db)
+
+    @listener.subscribe
+    def invalidate_database_caches(debut, fin, matricules):
+        if debut is None:
+            db.workers.invalidate()
+            return
+        # Corrections a posteriori : les mois clos capturés sont à recharger
+        db.invalidate_history(debut, fin)
+        if matricules is None or any(m not in db.workers for m in matricules):
+            db.workers.invalidate()
+
+    shared_repository(db).attach_listener(listener)
+    init_attendance_cache().attach_listener(listener)
+    return listener.start()
+
+def data_version():
+    """Clé de fraîcheur des agrégats : version notifiée, sinon tranche d'une minute"""
+    # Première lecture d'une nouvelle journée : absences implicites de la veille
+    materialize_daily(init_database())
+    listener = init_listener()
+    if listener is not None and listener.connected:
+        return ('notify', listener.version)
+    return ('ttl', int(time.time() // 60))
 
-# Cache pour les données avec TTL de 1 minute
-@st.cache_data(ttl=60)
 def load_data(start_date, end_date):
+    return load_frame(start_date, end_date).to_dataframe()
+
+def load_frame(start_date, end_date):
+    db = init_database()
+    materialize_daily(db)
+    # Fenêtre récente : dépôt partagé avec les alertes, prédictions et le chatbot
+    repository = shared_repository(db)
+    if repository.covers(start_date, end_date):
+        return repository.range(start_date, end_date)
+    return init_attendance_cache().get_frame(start_date, end_date)
+
+# Agrégats calculés côté serveur (quelques lignes par jour et par employé)
+@st.cache_data(max_entries=32)
+def load_counts(start_date, end_date, version=None):
     db = init_database()
-    return db.get_attendance_data(start_date, end_date)
+    # Les deux agrégats partent en parallèle, chacun sur sa connexion du pool
+    counts = AsyncDataLoader(db).run({
+        'daily': ('get_daily_counts', (start_date, end_date)),
+        'employee': ('get_employee_counts', (start_date, end_date))
+    })
+    return counts['daily'], counts['employee']
+
+# Correspondance libellé de statut → colonne des comptes par employé
+STATUS_COUNT_COLUMNS = {'Présent': 'present', 'Absent': 'absent', 'Retard': 'late'}
+
+def filter_attendance(df, domain_filter, status_filter):
+    """Applique les filtres de domaine et de statut aux pointages détaillés"""
+    df = df.copy()
+    if 'domaine' not in df.columns:
+        df['domaine'] = classify_domains(df['matricule'])
+    
+    if domain_filter != "Tous":
+        df = df[df['domaine'] == domain_filter]
+    
+    if status_filter:
+        df = df[df['statut'].isin(status_filter)]
+    
+    return df
 
 def main():
     # Vérification de l'authentification
@@ -130,7 +223,7 @@ def show_dashboard():
         # Sélection du domaine
         domain_filter = st.selectbox(
             "Domaine",
-            ["Tous", "Chantre", "Protocole", "Régis"]
+            ["Tous"] + domain_registry().names
         )
         
         # Sélection du type de statut
@@ -143,34 +236,40 @@ def show_dashboard():
         st.markdown("---")
         
         # Actualisation automatique
-        auto_refresh = st.checkbox("Actualisation automatique (1 min)", value=True)
+        version = data_version()
+        live = version[0] == 'notify'
+        auto_refresh = st.checkbox(
+            "Actualisation automatique (temps réel)" if live else "Actualisation automatique (1 min)",
+            value=True
+        )
         
         if st.button("🔄 Actualiser maintenant"):
             st.cache_data.clear()
             st.rerun()
     
-    # Chargement des données
+    # Chargement des agrégats
     try:
         with st.spinner("Chargement des données..."):
-            df = load_data(start_date, end_date)
+            daily_counts, employee_counts = load_counts(start_date, end_date, version)
         
-        if df.empty:
+        if daily_counts.empty:
             st.warning("Aucune donnée disponible pour la période sélectionnée.")
             return
         
-        # Classification des domaines
-        df['domaine'] = df['matricule'].apply(classify_domain)
-        
         # Filtrage par domaine
         if domain_filter != "Tous":
-            df = df[df['domaine'] == domain_filter]
+            daily_counts = daily_counts[daily_counts['domaine'] == domain_filter]
+            employee_counts = employee_counts[employee_counts['domaine'] == domain_filter]
         
         # Filtrage par statut
         if status_filter:
-            df = df[df['statut'].isin(status_filter)]
+            daily_counts = daily_counts[daily_counts['statut'].isin(status_filter)]
+            selected = [STATUS_COUNT_COLUMNS[s] for s in status_filter if s in STATUS_COUNT_COLUMNS]
+            employee_counts = employee_counts[employee_counts[selected].sum(axis=1) > 0]
         
-        # Calcul des statistiques
-        stats = calculate_statistics(df)
+        # Calcul des statistiques (une passe ; graphiques et tableaux en dérivent)
+        result = AttendanceStats.from_counts(daily_counts, employee_counts)
+        stats = result.to_dict()
         
         # Affichage des KPI principaux
         st.subheader("📈 Indicateurs Clés de Performance")
@@ -206,6 +305,23 @@ def show_dashboard():
                 delta=stats['late_vs_yesterday'] if 'late_vs_yesterday' in stats else None
             )
         
+        # Aujourd'hui, cette semaine, ce mois : une seule lecture de l'union des périodes
+        periods = resolve_periods(['today', 'week', 'month'])
+        frame = load_frame(min(d for d, _ in periods.values()), max(f for _, f in periods.values()))
+        if domain_filter != "Tous":
+            frame = frame.for_domain(domain_filter)
+        if status_filter:
+            frame = frame.with_statuses(status_filter)
+        
+        for col, (name, period_stats) in zip(st.columns(len(periods)), multi_period_stats(frame, periods).items()):
+            with col:
+                st.metric(
+                    f"Présence {PERIOD_LABELS[name]}",
+                    f"{period_stats.presence_rate():.1f}%",
+                    help=f"{period_stats.status_count('Présent')} présents sur {period_stats.total_records} pointages "
+                         f"({period_stats.total_employees} employés)"
+                )
+        
         st.markdown("---")
         
         # Graphiques principaux
@@ -215,10 +331,10 @@ def show_dashboard():
             st.subheader("📊 Répartition par Statut")
             
             # Graphique en camembert
-            status_counts = df['statut'].value_counts()
+            status_counts = result.status_totals
             fig_pie = px.pie(
-                values=status_counts.values,
-                names=status_counts.index,
+                values=list(status_counts.values()),
+                names=list(status_counts.keys()),
                 title="Répartition des Statuts",
                 color_discrete_map={
                     'Présent': '#28a745',
@@ -232,7 +348,7 @@ def show_dashboard():
             st.subheader("🏢 Statistiques par Domaine")
             
             # Graphique en barres par domaine
-            domain_stats = df.groupby(['domaine', 'statut']).size().unstack(fill_value=0)
+            domain_stats = result.domain_matrix()
             fig_bar = px.bar(
                 domain_stats,
                 title="Statuts par Domaine",
@@ -248,9 +364,9 @@ def show_dashboard():
         # Évolution temporelle
         st.subheader("📈 Évolution Temporelle")
         
-        if len(df) > 0 and 'date_pointage' in df.columns:
-            # Grouper par date et statut
-            daily_stats = df.groupby([df['date_pointage'].dt.date, 'statut']).size().unstack(fill_value=0)
+        if len(daily_counts) > 0:
+            # Série par date et statut
+            daily_stats = result.daily()
             
             fig_line = go.Figure()
             
@@ -276,29 +392,24 @@ def show_dashboard():
         # Tableau détaillé par domaine
         st.subheader("📋 Détails par Domaine")
         
-        domain_details = []
-        for domain in ['Chantre', 'Protocole', 'Régis']:
-            domain_data = df[df['domaine'] == domain]
-            if not domain_data.empty:
-                present = len(domain_data[domain_data['statut'] == 'Présent'])
-                absent = len(domain_data[domain_data['statut'] == 'Absent'])
-                late = len(domain_data[domain_data['statut'] == 'Retard'])
-                total = len(domain_data)
-                
-                domain_details.append({
-                    'Domaine': domain,
-                    'Total': total,
-                    'Présents': present,
-                    'Absents': absent,
-                    'Retards': late,
-                    'Taux Présence': f"{(present/total*100):.1f}%" if total > 0 else "0%"
-                })
+        domain_details = [
+            {
+                'Domaine': domain,
+                'Total': data['total'],
+                'Présents': data['present'],
+                'Absents': data['absent'],
+                'Retards': data['late'],
+                'Taux Présence': f"{data['presence_rate']:.1f}%" if data['total'] > 0 else "0%"
+            }
+            for domain, data in result.domain_summary().items()
+            if domain in domain_stats.index
+        ]
         
         if domain_details:
             domain_df = pd.DataFrame(domain_details)
             st.dataframe(domain_df, use_container_width=True)
         
-        # Section des rapports
+        # Section des rapports (les pointages détaillés ne sont chargés qu'à la demande)
         st.markdown("---")
         st.subheader("📄 Génération de Rapports")
         
@@ -307,7 +418,12 @@ def show_dashboard():
         with col1:
             if st.button("📊 Rapport PDF"):
                 with st.spinner("Génération du rapport PDF..."):
-                    pdf_buffer = generate_pdf_report(df, stats, start_date, end_date)
+                    frame = load_frame(start_date, end_date)
+                    if domain_filter != "Tous":
+                        frame = frame.for_domain(domain_filter)
+                    if status_filter:
+                        frame = frame.with_statuses(status_filter)
+                    pdf_buffer = generate_pdf_report(frame, result, start_date, end_date)
                     st.download_button(
                         label="Télécharger le rapport PDF",
                         data=pdf_buffer,
@@ -317,7 +433,12 @@ def show_dashboard():
         
         with col2:
             if st.button("📈 Export CSV"):
-                csv_data = generate_csv_report(df)
+                # Export par blocs via curseur serveur : mémoire bornée même sur une année
+                chunks = (
+                    filter_attendance(chunk, domain_filter, status_filter)
+                    for chunk in init_database().iter_attendance_chunks(start_date, end_date)
+                )
+                csv_data = generate_csv_report_from_chunks(chunks)
                 st.download_button(
                     label="Télécharger les données CSV",
                     data=csv_data,
@@ -331,6 +452,7 @@ def show_dashboard():
         # Tableau des données récentes
         if st.checkbox("Afficher les données détaillées"):
             st.subheader("📊 Données Récentes")
+            df = filter_attendance(load_data(start_date, end_date), domain_filter, status_filter)
             
             # Sélection des colonnes à afficher
             display_columns = ['matricule', 'domaine', 'statut', 'date_pointage', 'heure_pointage']
@@ -349,7 +471,11 @@ def show_dashboard():
     
     # Actualisation automatique
     if auto_refresh:
-        time.sleep(60)
+        if live:
+            # Réaffichage dès qu'un pointage est écrit (au plus tard après une minute)
+            init_listener().wait_for_change(version[1], timeout=60)
+        else:
+            time.sleep(60)
         st.rerun()
 
 def show_chatbot(chatbot):
@@ -450,19 +576,17 @@ def show_predictions(prediction_module):
         # Récupération des employés actifs
         end_date = datetime.now().date()
         start_date = end_date - timedelta(days=30)
-        db = init_database()
-        df = db.get_attendance_data(start_date, end_date)
+        frame = load_frame(start_date, end_date)
         
-        if not df.empty:
-            df['domaine'] = df['matricule'].apply(classify_domain)
-            employees = sorted(df['matricule'].unique())
+        if not frame.empty:
+            employees = sorted(frame.unique_employees())
             
             selected_employee = st.selectbox("Choisir un employé:", employees)
             
             if selected_employee:
                 # Analyse des risques
                 st.markdown("### 📊 Analyse des Risques")
-                risk_analysis = prediction_module.get_risk_analysis(selected_employee)
+                risk_analysis = prediction_module.get_risk_analysis(selected_employee, frame)
                 
                 if risk_analysis:
                     col1, col2, col3 = st.columns(3)
@@ -588,6 +712,29 @@ def show_settings():
                 st.dataframe(table_structure)
             else:
                 st.info("Aucune table de pointage trouvée.")
+        
+        # Index et plans de requêtes
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            if st.button("🧱 Créer les index manquants"):
+                success, message = install_indexes(db)
+                if success:
+                    st.success(message)
+                else:
+                    st.error(message)
+        
+        with col2:
+            if st.button("🔍 Vérifier les plans de requêtes"):
+                try:
+                    report = verify_query_plans(db)
+                    st.success("✅ Aucune requête ne parcourt séquentiellement une grande table")
+                    st.dataframe(report, use_container_width=True)
+                except QueryPlanError as e:
+                    st.error(str(e))
+                    st.dataframe(e.report, use_container_width=True)
+                except Exception as e:
+                    st.error(f"❌ Vérification impossible : {e}")
     
     # Configuration des alertes
     with st.expander("🚨 Configuration des Alertes"):
@@ -609,8 +756,38 @@ def show_settings():
     
     # Statistiques système
     with st.expander("📈 Statistiques Système"):
-        st.markdown("**Utilisation de l'application:**")
-        st.info("Statistiques d'utilisation à venir...")
+        metrics = query_metrics()
+        summary = metrics.summary()
+        
+        if summary.empty:
+            st.info("Aucun appel à la base enregistré depuis le démarrage.")
+        else:
+            st.markdown(f"**Requêtes par méthode** ({metrics.window} derniers appels par méthode):")
+            st.dataframe(summary, use_container_width=True)
+            st.caption("Octets : volume reçu par les lectures COPY. Attente pool : temps passé à obtenir une connexion.")
+            
+            st.markdown("**Appelants les plus coûteux** (onglet, question, module):")
+            st.dataframe(metrics.by_caller(), use_container_width=True)
+            
+            histogram = metrics.histogram()
+            fig = px.bar(histogram, x='Tranche', y='Appels', title="Distribution des latences")
+            st.plotly_chart(fig, use_container_width=True)
+        
+        st.markdown("**Pool de connexions:**")
+        st.json(init_database().pool.stats())
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(
+                label="📥 Exporter les mesures (JSON)",
+                data=metrics.to_json(),
+                file_name=f"mesures_base_{datetime.now():%Y%m%d_%H%M}.json",
+                mime="application/json"
+            )
+        with col2:
+            if st.button("🔄 Réinitialiser les mesures"):
+                metrics.reset()
+                st.rerun()
 
 
 
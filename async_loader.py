@@ -0,0 +1,71 @@
+import asyncio
+import threading
+from metrics import caller_scope
+
+
+class AsyncDataLoader:
+    """
+    Exécute plusieurs lectures du DatabaseManager en parallèle, chacune sur sa propre
+    connexion du pool : la latence d'une question composée est celle de la requête
+    la plus lente, pas la somme des requêtes.
+    """
+
+    def __init__(self, db, max_concurrency=None):
+        self.db = db
+        self.max_concurrency = max_concurrency or self.db.pool_settings['max_size']
+
+    async def _call(self, semaphore, method, args):
+        """Exécute une méthode bloquante du DatabaseManager dans un thread"""
+        async with semaphore:
+            # Le thread de lecture ne voit pas la pile de l'appelant : elle est transmise aux mesures
+            with caller_scope():
+                return await asyncio.to_thread(getattr(self.db, method), *args)
+
+    async def gather(self, calls):
+        """
+        Lance toutes les lectures en parallèle.
+        `calls` : dictionnaire nom -> (nom de méthode, arguments) ; retourne nom -> résultat.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        names = list(calls)
+        results = await asyncio.gather(
+            *(self._call(semaphore, method, args) for method, args in (calls[n] for n in names))
+        )
+        return dict(zip(names, results))
+
+    async def load_ranges(self, ranges, method='get_attendance_data'):
+        """Charge plusieurs périodes (nom -> (début, fin)) avec la même méthode de lecture"""
+        return await self.gather({name: (method, period) for name, period in ranges.items()})
+
+    def run(self, calls):
+        """Version synchrone de gather, utilisable depuis Streamlit ou le chatbot"""
+        return run_sync(self.gather(calls))
+
+    def run_ranges(self, ranges, method='get_attendance_data'):
+        """Version synchrone de load_ranges"""
+        return run_sync(self.load_ranges(ranges, method))
+
+
+def run_sync(coro):
+    """Exécute une coroutine jusqu'au bout, y compris si une boucle tourne déjà dans ce thread"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    # Boucle déjà active (ex. notebook) : exécution dans un thread dédié
+    result = {}
+
+    def runner():
+        try:
+            result['value'] = asyncio.run(coro)
+        except BaseException as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=runner)
+    thread.start()
+    thread.join()
+
+    if 'error' in result:
+        raise result['error']
+    return result['value']
@@ -0,0 +1,273 @@
+import numpy as np
+import pandas as pd
+from database import STATUTS, typer_pointages
+from domains import domain_registry
+
+# Domaines codés en entiers (int8) ; le préfixe du matricule détermine le domaine (voir domains.py)
+DOMAINES = domain_registry().categories
+
+# Codes des statuts canoniques (typer_pointages place STATUTS en tête des catégories)
+PRESENT, ABSENT, RETARD = (STATUTS.index(s) for s in ('Présent', 'Absent', 'Retard'))
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+
+def domain_of(matricule):
+    """Domaine d'un matricule selon son préfixe"""
+    return domain_registry().classify(matricule)
+
+
+def _jour(date):
+    """Numéro de jour (depuis 1970-01-01) d'une date"""
+    return int((np.datetime64(date, 'D') - EPOCH).astype(np.int64))
+
+
+def _secondes(heures):
+    """Heures 'HH:MM:SS' → secondes depuis minuit (int32, -1 si absente), une conversion par valeur distincte"""
+    codes, uniques = pd.factorize(heures)
+    valeurs = np.array([
+        -1 if pd.isna(h) else sum(int(float(p)) * m for p, m in zip(str(h).split(':'), (3600, 60, 1)))
+        for h in uniques
+    ] + [-1], dtype=np.int32)
+    return valeurs[codes]
+
+
+class AttendanceFrame:
+    """
+    Représentation compacte et canonique des pointages : employé, domaine et statut codés
+    en entiers, date en numéro de jour (int32), heure en secondes depuis minuit (int32).
+    Environ 30 octets par pointage ; to_dataframe() fournit la vue large pour l'affichage.
+    """
+
+    def __init__(self, ids, emp, employees, domain, status, statuts, day, checkin, created):
+        self.id = ids
+        self.emp = emp
+        self.employees = employees
+        self.domain = domain
+        self.status = status
+        self.statuts = statuts
+        self.day = day
+        self.checkin = checkin
+        self.created = created
+
+    @classmethod
+    def empty_frame(cls):
+        """Frame sans pointage"""
+        return cls(
+            np.empty(0, np.int64), np.empty(0, np.int32), np.empty(0, object),
+            np.empty(0, np.int8), np.empty(0, np.int8), list(STATUTS),
+            np.empty(0, np.int32), np.empty(0, np.int32), np.empty(0, 'datetime64[ns]')
+        )
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """Construit la représentation compacte à partir de pointages (typés ou non)"""
+        if df.empty:
+            return cls.empty_frame()
+
+        df = typer_pointages(df.copy(deep=False))
+        n = len(df)
+
+        matricules = df['matricule'].cat
+        employees = np.asarray(matricules.categories, dtype=object)
+        emp = matricules.codes.to_numpy().astype(np.int32)
+
+        # Domaine calculé une fois par employé, puis propagé par indexation
+        domain = domain_registry().codes(df['matricule'])
+
+        statut = df['statut'].cat
+        status = statut.codes.to_numpy().astype(np.int8)
+
+        day = (df['date_pointage'].to_numpy().astype('datetime64[D]') - EPOCH).astype(np.int32)
+        checkin = _secondes(df['heure_pointage']) if 'heure_pointage' in df.columns else np.full(n, -1, np.int32)
+        created = (
+            df['created_at'].to_numpy().astype('datetime64[ns]') if 'created_at' in df.columns
+            else np.full(n, np.datetime64('NaT'), 'datetime64[ns]')
+        )
+        ids = df['id'].to_numpy().astype(np.int64) if 'id' in df.columns else np.arange(n, dtype=np.int64)
+
+        return cls(ids, emp, employees, domain, status, list(statut.categories), day, checkin, created)
+
+    def __len__(self):
+        return len(self.id)
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    @property
+    def nbytes(self):
+        """Mémoire occupée par les colonnes (hors dictionnaire des matricules)"""
+        return sum(column.nbytes for column in self._columns())
+
+    def _columns(self):
+        return (self.id, self.emp, self.domain, self.status, self.day, self.checkin, self.created)
+
+    def freeze(self):
+        """Rend les colonnes non modifiables (frame partagé en lecture seule)"""
+        for column in self._columns():
+            column.flags.writeable = False
+        return self
+
+    # --- Sélections -------------------------------------------------------
+
+    def take(self, selection):
+        """Sous-ensemble (masque booléen ou indices), les dictionnaires sont partagés"""
+        return AttendanceFrame(
+            self.id[selection], self.emp[selection], self.employees, self.domain[selection],
+            self.status[selection], self.statuts, self.day[selection], self.checkin[selection],
+            self.created[selection]
+        )
+
+    def status_code(self, statut):
+        """Code d'un libellé de statut (-2 s'il n'apparaît pas)"""
+        return self.statuts.index(statut) if statut in self.statuts else -2
+
+    def between(self, date_debut, date_fin):
+        """Pointages entre deux dates incluses"""
+        return self.take((self.day >= _jour(date_debut)) & (self.day <= _jour(date_fin)))
+
+    def for_domain(self, domaine):
+        """Pointages d'un domaine"""
+        return self.take(self.domain == DOMAINES.index(domaine))
+
+    def for_employee(self, matricule):
+        """Pointages d'un employé"""
+        code = np.flatnonzero(self.employees == str(matricule).strip().upper())
+        return self.take(self.emp == (code[0] if len(code) else -2))
+
+    def with_statuses(self, statuts):
+        """Pointages dont le statut figure dans la liste"""
+        return self.take(np.isin(self.status, [self.status_code(s) for s in statuts]))
+
+    def unique_employees(self):
+        """Matricules présents, dans l'ordre de première apparition"""
+        return self.employees[pd.unique(self.emp[self.emp >= 0])]
+
+    # --- Agrégats ---------------------------------------------------------
+
+    def status_counts(self):
+        """Nombre de pointages par libellé de statut"""
+        counts = np.bincount(self.status[self.status >= 0], minlength=len(self.statuts))
+        return dict(zip(self.statuts, (int(c) for c in counts)))
+
+    def domain_status_matrix(self):
+        """Tableau domaine × statut des nombres de pointages"""
+        valid = self.status >= 0
+        flat = self.domain[valid].astype(np.int64) * len(self.statuts) + self.status[valid]
+        counts = np.bincount(flat, minlength=len(DOMAINES) * len(self.statuts))
+        return pd.DataFrame(
+            counts.reshape(len(DOMAINES), len(self.statuts)), index=DOMAINES, columns=self.statuts
+        )
+
+    def stats(self):
+        """Indicateurs calculés en une passe (stats_engine.AttendanceStats)"""
+        from stats_engine import AttendanceStats
+        return AttendanceStats.from_frame(self)
+
+    def presence_rate(self, domaine=None):
+        """Taux de présence (en %) global ou d'un domaine"""
+        return self.stats().presence_rate(domaine)
+
+    def statistics(self):
+        """Mêmes indicateurs que utils.calculate_statistics, calculés sur les codes"""
+        return self.stats().to_dict()
+
+    def domain_summary(self):
+        """Même résumé par domaine que utils.generate_domain_summary"""
+        return self.stats().domain_summary()
+
+    def employee_counts(self):
+        """Comptes par employé, mêmes colonnes que DatabaseManager.get_employee_counts"""
+        columns = [
+            'matricule', 'domaine', 'total', 'present', 'absent', 'late',
+            'dernier_pointage', 'derniere_absence', 'dernier_retard'
+        ]
+        if self.empty:
+            return pd.DataFrame(columns=columns)
+
+        size = len(self.employees)
+        valid = self.emp >= 0
+        emp, status, day = self.emp[valid], self.status[valid], self.day[valid]
+
+        def dernier(mask):
+            jours = np.full(size, np.iinfo(np.int32).min, dtype=np.int64)
+            np.maximum.at(jours, emp[mask], day[mask])
+            dates = (jours + EPOCH.astype(np.int64)).astype('datetime64[D]').astype('datetime64[ns]')
+            return np.where(jours == np.iinfo(np.int32).min, np.datetime64('NaT'), dates)
+
+        total = np.bincount(emp, minlength=size)
+        counts = pd.DataFrame({
+            'matricule': self.employees,
+            'domaine': domain_registry().classify_series(self.employees),
+            'total': total,
+            'present': np.bincount(emp[status == PRESENT], minlength=size),
+            'absent': np.bincount(emp[status == ABSENT], minlength=size),
+            'late': np.bincount(emp[status == RETARD], minlength=size),
+            'dernier_pointage': dernier(np.ones(len(emp), dtype=bool)),
+            'derniere_absence': dernier(status == ABSENT),
+            'dernier_retard': dernier(status == RETARD),
+        })
+        return counts[total > 0].sort_values('matricule', ignore_index=True)
+
+    # --- Fusion et vues ---------------------------------------------------
+
+    def merge(self, other):
+        """
+        Remplace les pointages de même id par ceux de `other` et ajoute les nouveaux.
+        Les dictionnaires (matricules, statuts) sont unifiés puis les codes recalculés.
+        """
+        if other.empty:
+            return self
+        if self.empty:
+            return other
+
+        employees = pd.Index(self.employees).append(pd.Index(other.employees)).unique()
+        statuts = list(pd.Index(self.statuts).append(pd.Index(other.statuts)).unique())
+
+        def recode(frame):
+            emp_map = np.append(employees.get_indexer(frame.employees), -1).astype(np.int32)
+            status_map = np.array([statuts.index(s) for s in frame.statuts] + [-1], dtype=np.int8)
+            return emp_map[frame.emp], status_map[frame.status]
+
+        keep = ~np.isin(self.id, other.id)
+        base_emp, base_status = recode(self)
+        new_emp, new_status = recode(other)
+
+        merged = AttendanceFrame(
+            np.concatenate([self.id[keep], other.id]),
+            np.concatenate([base_emp[keep], new_emp]),
+            np.asarray(employees, dtype=object),
+            np.concatenate([self.domain[keep], other.domain]),
+            np.concatenate([base_status[keep], new_status]),
+            statuts,
+            np.concatenate([self.day[keep], other.day]),
+            np.concatenate([self.checkin[keep], other.checkin]),
+            np.concatenate([self.created[keep], other.created]),
+        )
+        # Ordre de lecture : date puis heure décroissantes
+        return merged.take(np.lexsort((-merged.checkin.astype(np.int64), -merged.day.astype(np.int64))))
+
+    def dates(self):
+        """Dates de pointage (datetime64[ns])"""
+        return (self.day.astype(np.int64) + EPOCH.astype(np.int64)).astype('datetime64[D]').astype('datetime64[ns]')
+
+    def heures(self):
+        """Heures de pointage 'HH:MM:SS', formatées une fois par valeur distincte"""
+        uniques, inverse = np.unique(self.checkin, return_inverse=True)
+        labels = np.array([
+            None if s < 0 else f"{s // 3600:02d}:{s % 3600 // 60:02d}:{s % 60:02d}" for s in uniques
+        ], dtype=object)
+        return pd.array(labels[inverse] if len(labels) else [], dtype='string')
+
+    def to_dataframe(self):
+        """Vue large (colonnes canoniques du tableau de bord, domaine inclus)"""
+        return pd.DataFrame({
+            'id': self.id,
+            'matricule': pd.Categorical.from_codes(self.emp, categories=self.employees),
+            'domaine': pd.Categorical.from_codes(self.domain, categories=DOMAINES),
+            'date_pointage': self.dates(),
+            'heure_pointage': self.heures(),
+            'statut': pd.Categorical.from_codes(self.status, categories=self.statuts),
+            'created_at': self.created,
+        })
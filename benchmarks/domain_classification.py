@@ -0,0 +1,58 @@
+"""
+Classification des domaines : `.apply(classify_domain)` ligne à ligne contre le classifieur
+vectorisé du registre (domains.py), sur une colonne de matricules catégorielle (type des
+lectures) et sur une colonne de chaînes. Vérifie que les résultats sont identiques.
+
+    python benchmarks/domain_classification.py [--lignes 100000] [--employes 2000] [--repetitions 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from domains import domain_registry
+from utils import classify_domain, classify_domains
+
+
+def chrono(fn, repetitions):
+    temps, resultat = [], None
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        resultat = fn()
+        temps.append(time.perf_counter() - start)
+    return resultat, statistics.median(temps) * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lignes", type=int, default=100_000)
+    parser.add_argument("--employes", type=int, default=2000)
+    parser.add_argument("--repetitions", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    prefixes = list(domain_registry().prefixes) + ['X']
+    matricules = np.array([f"{rng.choice(prefixes)}{i:04d}" for i in range(args.employes)], dtype=object)
+    texte = pd.Series(matricules[rng.integers(0, args.employes, args.lignes)])
+    categorielle = texte.astype('category')
+
+    attendu, t_apply = chrono(lambda: texte.apply(classify_domain), args.repetitions)
+    resultats = [{'Classification': '.apply(classify_domain)', 'µs': round(t_apply), 'Accélération': 1.0}]
+
+    for libelle, colonne in (('vectorisée (catégorielle)', categorielle), ('vectorisée (chaînes)', texte)):
+        obtenu, temps = chrono(lambda: classify_domains(colonne), args.repetitions)
+        if not (obtenu.astype(str) == attendu).all():
+            raise SystemExit(f"❌ Résultats différents (classification {libelle})")
+        resultats.append({'Classification': libelle, 'µs': round(temps), 'Accélération': round(t_apply / temps, 1)})
+
+    print(pd.DataFrame(resultats).to_string(index=False))
+    print(f"✅ Résultats identiques sur {args.lignes} matricules")
+
+
+if __name__ == "__main__":
+    main()
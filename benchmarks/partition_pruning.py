@@ -0,0 +1,83 @@
+"""
+Élagage des partitions sur les lectures par période de get_attendance_data.
+
+Pour plusieurs largeurs de période, compare (EXPLAIN ANALYZE) la table partitionnée et
+l'ancienne table conservée par la migration (si elle existe encore) : partitions
+parcourues, blocs lus, temps d'exécution médian.
+
+    python partitioning.py migrate
+    python benchmarks/partition_pruning.py [--repetitions 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from database import DatabaseManager
+from partitioning import LEGACY_TABLE, list_partitions
+
+PERIODES = {'1 jour': 0, '1 semaine': 6, '1 mois': 30, '1 trimestre': 90, '1 an': 365}
+
+
+def _plan_nodes(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from _plan_nodes(child)
+
+
+def explain(cur, query, params, repetitions):
+    """(relations parcourues, blocs lus, temps médian en ms) d'une requête"""
+    temps = []
+    for _ in range(repetitions):
+        cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", params)
+        plan = cur.fetchone()[0][0]
+        temps.append(plan['Execution Time'])
+    relations = {n['Relation Name'] for n in _plan_nodes(plan['Plan']) if 'Relation Name' in n}
+    blocs = plan['Plan'].get('Shared Hit Blocks', 0) + plan['Plan'].get('Shared Read Blocks', 0)
+    return relations, blocs, statistics.median(temps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repetitions", type=int, default=5)
+    args = parser.parse_args()
+
+    db = DatabaseManager()
+    if not db.attendance_partitioned():
+        raise SystemExit("❌ La table attendance n'est pas partitionnée (python partitioning.py migrate)")
+
+    total = len(list_partitions(db))
+    fin = datetime.now().date()
+    resultats = []
+
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL", (LEGACY_TABLE,))
+            legacy = cur.fetchone()[0]
+
+            for libelle, jours in PERIODES.items():
+                query, params = db._attendance_query(fin - timedelta(days=jours), fin)
+                relations, blocs, temps = explain(cur, query, params, args.repetitions)
+                ligne = {
+                    'Période': libelle,
+                    'Partitions lues': f"{len(relations)}/{total}",
+                    'Blocs (partitionnée)': blocs,
+                    'ms (partitionnée)': round(temps, 2),
+                }
+                if legacy:
+                    query = query.replace("FROM attendance a", f"FROM {LEGACY_TABLE} a")
+                    _, blocs, temps = explain(cur, query, params, args.repetitions)
+                    ligne['Blocs (ancienne)'] = blocs
+                    ligne['ms (ancienne)'] = round(temps, 2)
+                resultats.append(ligne)
+        conn.rollback()
+
+    print(pd.DataFrame(resultats).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Features du modèle de prédiction : boucle d'origine de AttendancePrediction.prepare_data
+(un sous-ensemble de l'historique par ligne, quadratique par employé) contre le calcul
+vectorisé en O(n), sur des pointages synthétiques (100 000 par défaut, un par employé et
+par jour, dans le désordre). Vérifie que les deux versions donnent le même DataFrame
+(colonnes, types, ordre et valeurs), pour un DataFrame et pour un AttendanceFrame.
+
+    python benchmarks/prediction_features.py [--lignes 100000] [--employes 2000] [--repetitions 3]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from attendance_frame import AttendanceFrame
+from database import typer_pointages
+from prediction import AttendancePrediction
+from utils import classify_domains
+
+
+# --- Implémentation d'origine --------------------------------------------------
+
+def legacy_count_consecutive_status(df, status):
+    if df.empty:
+        return 0
+    recent_statuses = df.tail(5)['statut'].tolist()
+    consecutive = 0
+    for s in reversed(recent_statuses):
+        if s == status:
+            consecutive += 1
+        else:
+            break
+    return consecutive
+
+
+def legacy_prepare_data(df):
+    if df.empty:
+        return pd.DataFrame()
+    if isinstance(df, AttendanceFrame):
+        df = df.to_dataframe()
+    if 'domaine' not in df.columns:
+        df['domaine'] = classify_domains(df['matricule'])
+
+    df['date_pointage'] = pd.to_datetime(df['date_pointage'])
+    df['jour_semaine'] = df['date_pointage'].dt.dayofweek
+    df['mois'] = df['date_pointage'].dt.month
+    df['jour_mois'] = df['date_pointage'].dt.day
+    df['semaine_annee'] = df['date_pointage'].dt.isocalendar().week
+
+    employee_features = []
+    for matricule in df['matricule'].unique():
+        emp_data = df[df['matricule'] == matricule].copy()
+        # Tri stable : à date égale, l'ordre d'arrivée (référence des tests de non-régression)
+        emp_data = emp_data.sort_values('date_pointage', kind='stable')
+
+        for i in range(len(emp_data)):
+            historic_data = emp_data.iloc[:i+1]
+            total_days = len(historic_data)
+            present_days = len(historic_data[historic_data['statut'] == 'Présent'])
+            absent_days = len(historic_data[historic_data['statut'] == 'Absent'])
+            late_days = len(historic_data[historic_data['statut'] == 'Retard'])
+
+            recent_data = historic_data.tail(7)
+            employee_features.append({
+                'matricule': matricule,
+                'date_pointage': emp_data.iloc[i]['date_pointage'],
+                'domaine': emp_data.iloc[i]['domaine'],
+                'jour_semaine': emp_data.iloc[i]['jour_semaine'],
+                'mois': emp_data.iloc[i]['mois'],
+                'jour_mois': emp_data.iloc[i]['jour_mois'],
+                'semaine_annee': emp_data.iloc[i]['semaine_annee'],
+                'total_days': total_days,
+                'presence_rate': present_days / total_days if total_days > 0 else 0,
+                'absence_rate': absent_days / total_days if total_days > 0 else 0,
+                'late_rate': late_days / total_days if total_days > 0 else 0,
+                'recent_present': len(recent_data[recent_data['statut'] == 'Présent']),
+                'recent_absent': len(recent_data[recent_data['statut'] == 'Absent']),
+                'recent_late': len(recent_data[recent_data['statut'] == 'Retard']),
+                'consecutive_absences': legacy_count_consecutive_status(historic_data, 'Absent'),
+                'consecutive_lates': legacy_count_consecutive_status(historic_data, 'Retard'),
+                'statut': emp_data.iloc[i]['statut']
+            })
+    return pd.DataFrame(employee_features)
+
+
+# --- Données et mesures -------------------------------------------------------
+
+def synthetic(lignes, employes, seed=42):
+    """
+    Pointages aléatoires typés comme à la lecture, au plus un par employé et par jour
+    (clé d'unicité de la base). Chaque employé a ses propres probabilités de statut,
+    pour obtenir des séries d'absences et de retards de toutes longueurs.
+    """
+    rng = np.random.default_rng(seed)
+    jours = -(-lignes * 5 // (employes * 4))
+    cellules = rng.choice(employes * jours, lignes, replace=False)
+    employe, jour = np.divmod(cellules, jours)
+
+    matricules = np.array([f"{p}{i:04d}" for i, p in enumerate(rng.choice(list('CPRX'), employes))])
+    profils = rng.dirichlet([6, 2, 1], employes)
+    tirage = rng.random(lignes)
+    statut = (tirage > profils[employe, 0]).astype(int) + (tirage > profils[employe, :2].sum(axis=1))
+    dates = np.datetime64('2026-01-01') + jour.astype('timedelta64[D]')
+
+    return typer_pointages(pd.DataFrame({
+        'id': np.arange(lignes, dtype=np.int64),
+        'matricule': matricules[employe],
+        'date_pointage': dates.astype('datetime64[ns]'),
+        'heure_pointage': '08:00:00',
+        'statut': np.array(['Présent', 'Absent', 'Retard'])[statut],
+        'created_at': dates.astype('datetime64[ns]') + np.timedelta64(8, 'h'),
+    }))
+
+
+def chrono(fn, arg, repetitions):
+    temps, resultat = [], None
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        resultat = fn(arg.copy() if isinstance(arg, pd.DataFrame) else arg)
+        temps.append(time.perf_counter() - start)
+    return resultat, statistics.median(temps) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lignes", type=int, default=100_000)
+    parser.add_argument("--employes", type=int, default=2000)
+    parser.add_argument("--repetitions", type=int, default=3)
+    args = parser.parse_args()
+
+    df = synthetic(args.lignes, args.employes)
+    frame = AttendanceFrame.from_dataframe(df)
+    prediction = AttendancePrediction()
+
+    # La boucle d'origine est mesurée une seule fois (une dizaine de minutes à 100 000 lignes)
+    attendu, t_legacy = chrono(legacy_prepare_data, df, 1)
+    resultats = [{'Features': 'Boucle par employé et par ligne (origine)', 'ms': round(t_legacy), 'Accélération': 1.0}]
+
+    for libelle, source in (('DataFrame', df), ('AttendanceFrame', frame)):
+        obtenu, temps = chrono(prediction.prepare_data, source, args.repetitions)
+        try:
+            pd.testing.assert_frame_equal(obtenu, attendu, check_exact=True)
+        except AssertionError as e:
+            raise SystemExit(f"❌ Résultats différents (vectorisé, {libelle}) :\n{e}")
+        resultats.append({
+            'Features': f'Vectorisé O(n) ({libelle})', 'ms': round(temps, 1),
+            'Accélération': round(t_legacy / temps, 1)
+        })
+
+    # L'appelant garde son DataFrame intact (la boucle d'origine y ajoutait ses colonnes)
+    colonnes = list(df.columns)
+    prediction.prepare_data(df)
+    if list(df.columns) != colonnes:
+        raise SystemExit("❌ prepare_data a modifié le DataFrame reçu")
+
+    print(pd.DataFrame(resultats).to_string(index=False))
+    print(f"✅ Résultats identiques sur {args.lignes} pointages ({args.employes} employés)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Statistiques par blocs : calculate_statistics sur la période entière chargée en mémoire,
+contre StatsAccumulator alimenté bloc par bloc (flux), puis réparti entre plusieurs processus
+dont les accumulateurs sont fusionnés. Vérifie que les trois résultats sont identiques et
+mesure le pic mémoire (tracemalloc) du calcul complet et du calcul en flux. Les temps
+incluent la génération des blocs, qui tient lieu de lecture en base.
+
+    python benchmarks/stats_accumulator.py [--lignes 1000000] [--bloc 50000] [--processus 4]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+from stats_engine import accumulate
+from stats_single_pass import synthetic
+from utils import calculate_statistics
+
+
+def blocs(lignes, taille, premier=0, pas=1):
+    """Blocs synthétiques générés à la demande (graine = numéro du bloc)"""
+    for numero in range(premier, -(-lignes // taille), pas):
+        yield synthetic(min(taille, lignes - numero * taille), seed=numero).drop(columns=['domaine'])
+
+
+def part(args):
+    """Processus de travail : accumule un bloc sur `pas`"""
+    lignes, taille, premier, pas, today = args
+    return accumulate(blocs(lignes, taille, premier, pas), today)
+
+
+def mesure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    resultat = fn()
+    temps = time.perf_counter() - start
+    _, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultat, temps * 1000, pic / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lignes", type=int, default=1_000_000)
+    parser.add_argument("--bloc", type=int, default=50_000)
+    parser.add_argument("--processus", type=int, default=4)
+    args = parser.parse_args()
+    today = datetime.now().date()
+
+    attendu, t_complet, m_complet = mesure(
+        lambda: calculate_statistics(pd.concat(list(blocs(args.lignes, args.bloc)), ignore_index=True))
+    )
+    flux, t_flux, m_flux = mesure(lambda: accumulate(blocs(args.lignes, args.bloc), today).finalize())
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(args.processus) as pool:
+        parts = list(pool.map(part, [(args.lignes, args.bloc, i, args.processus, today) for i in range(args.processus)]))
+    total = parts[0]
+    for autre in parts[1:]:
+        total.merge(autre)
+    parallele = total.finalize()
+    t_parallele = (time.perf_counter() - start) * 1000
+
+    for nom, obtenu in (('flux', flux), ('parallèle', parallele)):
+        if obtenu != attendu:
+            raise SystemExit(f"❌ Résultats différents (calcul {nom})")
+
+    print(pd.DataFrame([
+        {'Calcul': 'Période entière en mémoire', 'ms': round(t_complet), 'Pic mémoire (Mo)': round(m_complet, 1)},
+        {'Calcul': f'Flux, blocs de {args.bloc}', 'ms': round(t_flux), 'Pic mémoire (Mo)': round(m_flux, 1)},
+        {'Calcul': f'{args.processus} processus fusionnés', 'ms': round(t_parallele), 'Pic mémoire (Mo)': None},
+    ]).to_string(index=False))
+    print(f"✅ Résultats identiques sur {args.lignes} pointages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Indicateurs du tableau de bord : boucles de filtrage d'origine contre le calcul en une passe
+de stats_engine.AttendanceStats, sur des pointages synthétiques (1 000 000 par défaut).
+
+Mesure calculate_statistics + generate_domain_summary + calculate_presence_rate par domaine
++ create_attendance_summary, tels qu'appelés pour un rapport, puis vérifie que les deux
+versions donnent les mêmes résultats. Aucune base n'est nécessaire.
+
+    python benchmarks/stats_single_pass.py [--lignes 1000000] [--repetitions 3]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from attendance_frame import AttendanceFrame, domain_of
+from database import typer_pointages
+from stats_engine import attendance_stats
+
+DOMAINES_RESUME = ['Chantre', 'Protocole', 'Régis']
+
+
+# --- Implémentations d'origine (une sélection par domaine puis par statut) ---
+
+def legacy_calculate_statistics(df):
+    stats = {
+        'total_employees': df['matricule'].nunique(),
+        'total_records': len(df),
+    }
+    status_counts = df['statut'].value_counts()
+    stats['total_present'] = status_counts.get('Présent', 0)
+    stats['total_absent'] = status_counts.get('Absent', 0)
+    stats['total_late'] = status_counts.get('Retard', 0)
+    stats['domain_breakdown'] = df.groupby(['domaine', 'statut'], observed=True).size().unstack(fill_value=0).to_dict()
+
+    today = datetime.now().date()
+    stats['new_employees_today'] = df[pd.to_datetime(df['created_at']).dt.date == today]['matricule'].nunique()
+    yesterday = today - timedelta(days=1)
+    yesterday_data = df[pd.to_datetime(df['date_pointage']).dt.date == yesterday]
+    if not yesterday_data.empty:
+        yesterday_present = len(yesterday_data[yesterday_data['statut'] == 'Présent'])
+        yesterday_late = len(yesterday_data[yesterday_data['statut'] == 'Retard'])
+        stats['yesterday_presence_rate'] = (yesterday_present / max(len(yesterday_data), 1)) * 100
+        stats['present_vs_yesterday'] = stats['total_present'] - yesterday_present
+        stats['late_vs_yesterday'] = stats['total_late'] - yesterday_late
+    return stats
+
+
+def legacy_presence_rate(df, domain=None):
+    if domain:
+        df = df[df['domaine'] == domain]
+    if df.empty:
+        return 0
+    return (len(df[df['statut'] == 'Présent']) / len(df)) * 100
+
+
+def legacy_domain_summary(df):
+    summary = {}
+    for domain in DOMAINES_RESUME:
+        domain_data = df[df['domaine'] == domain]
+        summary[domain] = {
+            'total': len(domain_data),
+            'present': len(domain_data[domain_data['statut'] == 'Présent']),
+            'absent': len(domain_data[domain_data['statut'] == 'Absent']),
+            'late': len(domain_data[domain_data['statut'] == 'Retard']),
+            'presence_rate': legacy_presence_rate(domain_data)
+        }
+    return summary
+
+
+def legacy_attendance_summary(df):
+    domain_stats = {}
+    for domain in DOMAINES_RESUME:
+        domain_data = df[df['domaine'] == domain]
+        presents = len(domain_data[domain_data['statut'] == 'Présent'])
+        domain_stats[domain] = {
+            'total': len(domain_data),
+            'presents': presents,
+            'taux_presence': presents / len(domain_data) * 100 if len(domain_data) else 0
+        }
+    return domain_stats
+
+
+def legacy(df):
+    return (
+        legacy_calculate_statistics(df),
+        legacy_domain_summary(df),
+        {d: legacy_presence_rate(df, d) for d in DOMAINES_RESUME},
+        legacy_attendance_summary(df),
+    )
+
+
+def single_pass(source):
+    stats = attendance_stats(source)
+    summary = stats.domain_summary()
+    return (
+        stats.to_dict(),
+        summary,
+        {d: stats.presence_rate(d) for d in DOMAINES_RESUME},
+        {d: {'total': v['total'], 'presents': v['present'], 'taux_presence': v['presence_rate']}
+         for d, v in summary.items()},
+    )
+
+
+# --- Données et mesures -------------------------------------------------------
+
+def synthetic(lignes, employes=2000, jours=365, seed=42):
+    """Pointages aléatoires sur `jours` jours jusqu'à aujourd'hui, typés comme à la lecture"""
+    rng = np.random.default_rng(seed)
+    matricules = np.array([f"{p}{i:04d}" for i, p in enumerate(rng.choice(list('CPRX'), employes))])
+    today = np.datetime64(datetime.now().date(), 'D')
+    dates = today - rng.integers(0, jours, lignes).astype('timedelta64[D]')
+    df = pd.DataFrame({
+        'id': np.arange(lignes, dtype=np.int64),
+        'matricule': matricules[rng.integers(0, employes, lignes)],
+        'date_pointage': dates.astype('datetime64[ns]'),
+        'heure_pointage': '08:00:00',
+        'statut': rng.choice(['Présent', 'Absent', 'Retard'], lignes, p=[0.8, 0.12, 0.08]),
+        'created_at': dates.astype('datetime64[ns]') + np.timedelta64(8, 'h'),
+    })
+    df = typer_pointages(df)
+    df['domaine'] = df['matricule'].map(domain_of).astype('category')
+    return df
+
+
+def chrono(fn, arg, repetitions):
+    temps, resultat = [], None
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        resultat = fn(arg)
+        temps.append(time.perf_counter() - start)
+    return resultat, statistics.median(temps) * 1000
+
+
+def _normalise(value):
+    """Scalaires numpy en types Python, taux arrondis"""
+    if isinstance(value, (tuple, list)):
+        return [_normalise(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _normalise(v) for k, v in value.items()}
+    if isinstance(value, (float, np.floating)):
+        return round(float(value), 9)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lignes", type=int, default=1_000_000)
+    parser.add_argument("--repetitions", type=int, default=3)
+    args = parser.parse_args()
+
+    df = synthetic(args.lignes)
+    frame = AttendanceFrame.from_dataframe(df)
+
+    attendu, t_legacy = chrono(legacy, df, args.repetitions)
+    obtenu_df, t_df = chrono(single_pass, df, args.repetitions)
+    obtenu_frame, t_frame = chrono(single_pass, frame, args.repetitions)
+
+    for nom, obtenu in (('DataFrame', obtenu_df), ('AttendanceFrame', obtenu_frame)):
+        if _normalise(obtenu) != _normalise(attendu):
+            raise SystemExit(f"❌ Résultats différents (une passe sur {nom})")
+
+    print(pd.DataFrame([
+        {'Calcul': 'Boucles de filtrage (origine)', 'ms': round(t_legacy, 1), 'Accélération': 1.0},
+        {'Calcul': 'Une passe (DataFrame)', 'ms': round(t_df, 1), 'Accélération': round(t_legacy / t_df, 1)},
+        {'Calcul': 'Une passe (AttendanceFrame)', 'ms': round(t_frame, 1), 'Accélération': round(t_legacy / t_frame, 1)},
+    ]).to_string(index=False))
+    print(f"✅ Résultats identiques sur {args.lignes} pointages")
+
+
+if __name__ == "__main__":
+    main()
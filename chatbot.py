@@ -1,24 +1,29 @@
 import streamlit as st
-import pandas as pd
 import re
 from datetime import datetime, timedelta
 from database import DatabaseManager
-from utils import classify_domain, calculate_statistics, generate_domain_summary
+from attendance_frame import AttendanceFrame
+from repository import shared_repository
+from utils import classify_domain
+from domains import domain_registry
+from stats_engine import PERIODES, PERIOD_LABELS, AttendanceStats, load_period_stats, resolve_periods
 
 class AttendanceChatbot:
     def __init__(self):
         self.db = DatabaseManager()
+        self.domains = domain_registry()
+        mots_domaines = '|'.join(re.escape(mot) for mot in self.domains.keywords)
         self.patterns = {
             'retard': r'(retard|late|délai|ponctualité|en retard|tardif)',
             'absence': r'(absent|absence|manque|manquant|manqué|pas venu)',
             'presence': r'(présent|presence|présence|assiduité|pointé|venu|arrivé)',
-            'domaine': r'(chantre|protocole|régis|domaine|département|service)',
+            'domaine': rf'({mots_domaines}|domaine|département|service)',
             'statistique': r'(statistique|stat|nombre|combien|taux|pourcentage|total)',
             'aujourd_hui': r'(aujourd\'hui|today|ce jour|maintenant)',
             'semaine': r'(semaine|week|cette semaine|7 jours)',
             'mois': r'(mois|month|ce mois|30 jours)',
             'hier': r'(hier|yesterday|la veille)',
-            'employe': r'(employé|ouvrier|agent|personne|matricule|[CPR]\d+)',
+            'employe': rf'(employé|ouvrier|agent|personne|matricule|{self.domains.matricule_pattern})',
             'meilleur': r'(meilleur|best|top|plus|maximum|max)',
             'pire': r'(pire|worst|moins|minimum|min|problème)',
             'comparaison': r'(comparer|versus|vs|différence|entre)',
@@ -100,13 +105,7 @@ class AttendanceChatbot:
     
     def _extract_domain(self, question):
         """Extrait le domaine de la question"""
-        if 'chantre' in question or 'chantres' in question:
-            return 'Chantre'
-        elif 'protocole' in question:
-            return 'Protocole'
-        elif 'régis' in question or 'regis' in question:
-            return 'Régis'
-        return None
+        return self.domains.find_domain(question)
     
     def _extract_period(self, question):
         """Extrait la période de la question"""
@@ -132,71 +131,87 @@ class AttendanceChatbot:
     
     def _extract_matricule(self, question):
         """Extrait un matricule spécifique de la question"""
-        matricule_pattern = r'[CPR]\d+'
-        match = re.search(matricule_pattern, question.upper())
+        match = re.search(self.domains.matricule_pattern, question.upper())
         return match.group() if match else None
     
     def _generate_response(self, domain, period, stat_type, matricule, question):
         """Génère une réponse basée sur les paramètres extraits"""
         try:
             # Détermination des dates
-            if period == 'today':
-                start_date = end_date = datetime.now().date()
-                period_text = "aujourd'hui"
-            elif period == 'yesterday':
-                start_date = end_date = datetime.now().date() - timedelta(days=1)
-                period_text = "hier"
-            elif period == 'week':
-                today = datetime.now().date()
-                start_date = today - timedelta(days=today.weekday())
-                end_date = today
-                period_text = "cette semaine"
-            elif period == 'month':
-                today = datetime.now().date()
-                start_date = datetime(today.year, today.month, 1).date()
-                end_date = today
-                period_text = "ce mois"
-            else:
-                start_date = end_date = datetime.now().date()
-                period_text = "aujourd'hui"
-            
-            # Récupération des données
-            df = self.db.get_attendance_data(start_date, end_date)
+            if period not in PERIODES:
+                period = 'today'
+            start_date, end_date = resolve_periods([period])[period]
+            period_text = PERIOD_LABELS[period]
             
-            if df.empty:
-                return f"Aucune donnée disponible pour {period_text}."
+            statut = None
             
-            # Ajout de la classification des domaines
-            df['domaine'] = df['matricule'].apply(classify_domain)
-            
-            # Filtrage par domaine si spécifié
-            if domain:
-                df = df[df['domaine'] == domain]
-                if df.empty:
-                    return f"Aucune donnée pour le domaine {domain} {period_text}."
-            
-            # Filtrage par matricule si spécifié
             if matricule:
-                df = df[df['matricule'] == matricule]
-                if df.empty:
+                # Question sur un employé : pointages détaillés (dépôt partagé si la période y figure)
+                repository = shared_repository(self.db)
+                if repository.covers(start_date, end_date):
+                    frame = repository.range(start_date, end_date)
+                else:
+                    frame = AttendanceFrame.from_dataframe(self.db.get_attendance_data(start_date, end_date))
+                
+                if frame.empty:
+                    return f"Aucune donnée disponible pour {period_text}."
+                
+                # Filtrage par domaine si spécifié
+                if domain and classify_domain(matricule) != domain:
+                    return f"Aucune donnée pour le domaine {domain} {period_text}."
+                
+                frame = frame.for_employee(matricule)
+                if frame.empty:
                     return f"Aucune donnée pour l'employé {matricule} {period_text}."
+                
+                status_counts = frame.status_counts()
+                totals = {
+                    'present': status_counts.get('Présent', 0),
+                    'absent': status_counts.get('Absent', 0),
+                    'late': status_counts.get('Retard', 0),
+                    'total': len(frame)
+                }
+                statut = frame.statuts[frame.status[0]]
+            else:
+                # Question globale ou par domaine : comptes agrégés côté serveur
+                stats = load_period_stats(self.db, [period])[period]
+                
+                if stats.empty:
+                    return f"Aucune donnée disponible pour {period_text}."
+                
+                # Filtrage par domaine si spécifié
+                if domain:
+                    stats = stats.for_domain(domain)
+                    if stats.empty:
+                        return f"Aucune donnée pour le domaine {domain} {period_text}."
+                
+                totals = self._status_totals(stats)
             
             # Génération de la réponse selon le type
             if stat_type == 'retard':
-                return self._generate_late_response(df, domain, period_text, matricule)
+                return self._generate_late_response(totals, domain, period_text, matricule)
             elif stat_type == 'absence':
-                return self._generate_absence_response(df, domain, period_text, matricule)
+                return self._generate_absence_response(totals, domain, period_text, matricule)
             elif stat_type == 'presence':
-                return self._generate_presence_response(df, domain, period_text, matricule)
+                return self._generate_presence_response(totals, domain, period_text, matricule)
             else:
-                return self._generate_general_response(df, domain, period_text, matricule)
+                return self._generate_general_response(totals, domain, period_text, matricule, statut)
                 
         except Exception as e:
             return f"Erreur lors de la récupération des données: {str(e)}"
     
-    def _generate_late_response(self, df, domain, period_text, matricule):
+    def _status_totals(self, stats):
+        """Totaux par statut d'un AttendanceStats"""
+        return {
+            'present': stats.status_count('Présent'),
+            'absent': stats.status_count('Absent'),
+            'late': stats.status_count('Retard'),
+            'total': stats.total_records
+        }
+    
+    def _generate_late_response(self, totals, domain, period_text, matricule):
         """Génère une réponse pour les retards"""
-        late_count = len(df[df['statut'] == 'Retard'])
+        late_count = totals['late']
         
         if matricule:
             return f"L'employé {matricule} a {late_count} retard(s) {period_text}."
@@ -205,9 +220,9 @@ class AttendanceChatbot:
         else:
             return f"Il y a {late_count} retard(s) au total {period_text}."
     
-    def _generate_absence_response(self, df, domain, period_text, matricule):
+    def _generate_absence_response(self, totals, domain, period_text, matricule):
         """Génère une réponse pour les absences"""
-        absent_count = len(df[df['statut'] == 'Absent'])
+        absent_count = totals['absent']
         
         if matricule:
             return f"L'employé {matricule} a {absent_count} absence(s) {period_text}."
@@ -216,10 +231,10 @@ class AttendanceChatbot:
         else:
             return f"Il y a {absent_count} absence(s) au total {period_text}."
     
-    def _generate_presence_response(self, df, domain, period_text, matricule):
+    def _generate_presence_response(self, totals, domain, period_text, matricule):
         """Génère une réponse pour les présences"""
-        present_count = len(df[df['statut'] == 'Présent'])
-        total_count = len(df)
+        present_count = totals['present']
+        total_count = totals['total']
         presence_rate = (present_count / total_count * 100) if total_count > 0 else 0
         
         if matricule:
@@ -229,26 +244,17 @@ class AttendanceChatbot:
         else:
             return f"Il y a {present_count} présence(s) au total {period_text} (taux: {presence_rate:.1f}%)."
     
-    def _generate_general_response(self, df, domain, period_text, matricule):
+    def _generate_general_response(self, totals, domain, period_text, matricule, statut=None):
         """Génère une réponse générale"""
-        stats = calculate_statistics(df)
-        
         if matricule:
-            emp_data = df[df['matricule'] == matricule]
-            if not emp_data.empty:
-                status = emp_data['statut'].iloc[0]
-                return f"L'employé {matricule} est {status.lower()} {period_text}."
+            if statut is not None:
+                return f"L'employé {matricule} est {statut.lower()} {period_text}."
             else:
                 return f"Aucune donnée trouvée pour l'employé {matricule} {period_text}."
         elif domain:
-            domain_data = df[df['domaine'] == domain]
-            present = len(domain_data[domain_data['statut'] == 'Présent'])
-            absent = len(domain_data[domain_data['statut'] == 'Absent'])
-            late = len(domain_data[domain_data['statut'] == 'Retard'])
-            
-            return f"Domaine {domain} {period_text}: {present} présent(s), {absent} absent(s), {late} retard(s)."
+            return f"Domaine {domain} {period_text}: {totals['present']} présent(s), {totals['absent']} absent(s), {totals['late']} retard(s)."
         else:
-            return f"Statistiques {period_text}: {stats['total_present']} présent(s), {stats['total_absent']} absent(s), {stats['total_late']} retard(s)."
+            return f"Statistiques {period_text}: {totals['present']} présent(s), {totals['absent']} absent(s), {totals['late']} retard(s)."
     
     def _handle_alert_question(self, question):
         """Gère les questions sur les alertes"""
@@ -291,21 +297,18 @@ class AttendanceChatbot:
             from prediction import AttendancePrediction
             prediction_system = AttendancePrediction()
             
-            # Récupération des données récentes
-            df = self.db.get_attendance_data(
-                (datetime.now() - timedelta(days=30)).date(),
-                datetime.now().date()
-            )
+            # Récupération des données récentes (partagées par toutes les analyses)
+            frame = prediction_system.load_recent_frame(30)
             
-            if df.empty:
+            if frame.empty:
                 return "❌ Pas assez de données pour faire des prédictions."
             
             # Analyse des employés à risque
-            employees_sample = df['matricule'].unique()[:5]
+            employees_sample = frame.unique_employees()[:5]
             risk_employees = []
             
             for emp in employees_sample:
-                risk_analysis = prediction_system.get_risk_analysis(emp)
+                risk_analysis = prediction_system.get_risk_analysis(emp, frame)
                 if risk_analysis and risk_analysis.get('risk_level') in ['Élevé', 'Modéré']:
                     risk_employees.append(risk_analysis)
             
@@ -326,26 +329,20 @@ class AttendanceChatbot:
     def _handle_comparison_question(self, question):
         """Gère les questions de comparaison"""
         try:
-            # Données de cette semaine
-            this_week_start = datetime.now().date() - timedelta(days=datetime.now().weekday())
-            this_week_end = datetime.now().date()
-            
-            # Données de la semaine dernière
-            last_week_start = this_week_start - timedelta(days=7)
-            last_week_end = this_week_start - timedelta(days=1)
+            # Les deux semaines en un seul chargement (comptes journaliers de l'union)
+            periods = load_period_stats(self.db, ['week', 'last_week'])
             
-            df_this_week = self.db.get_attendance_data(this_week_start, this_week_end)
-            df_last_week = self.db.get_attendance_data(last_week_start, last_week_end)
-            
-            if df_this_week.empty or df_last_week.empty:
+            if periods['week'].empty or periods['last_week'].empty:
                 return "❌ Pas assez de données pour effectuer une comparaison."
             
             # Calcul des statistiques
-            this_week_present = len(df_this_week[df_this_week['statut'] == 'Présent'])
-            last_week_present = len(df_last_week[df_last_week['statut'] == 'Présent'])
+            this_week = self._status_totals(periods['week'])
+            last_week = self._status_totals(periods['last_week'])
+            this_week_present = this_week['present']
+            last_week_present = last_week['present']
             
-            this_week_rate = (this_week_present / len(df_this_week)) * 100 if len(df_this_week) > 0 else 0
-            last_week_rate = (last_week_present / len(df_last_week)) * 100 if len(df_last_week) > 0 else 0
+            this_week_rate = (this_week_present / this_week['total']) * 100 if this_week['total'] > 0 else 0
+            last_week_rate = (last_week_present / last_week['total']) * 100 if last_week['total'] > 0 else 0
             
             difference = this_week_rate - last_week_rate
             
@@ -368,21 +365,20 @@ class AttendanceChatbot:
     def _handle_trend_question(self, question):
         """Gère les questions sur les tendances"""
         try:
-            df = self.db.get_attendance_data(
+            counts = self.db.get_daily_counts(
                 (datetime.now() - timedelta(days=30)).date(),
                 datetime.now().date()
             )
             
-            if df.empty:
+            if counts.empty:
                 return "❌ Pas assez de données pour analyser les tendances."
             
             # Calcul des tendances par semaine
-            df['date_pointage'] = pd.to_datetime(df['date_pointage'])
-            df['semaine'] = df['date_pointage'].dt.isocalendar().week
+            counts['semaine'] = counts['date_pointage'].dt.isocalendar().week
+            counts['present'] = counts['nombre'].where(counts['statut'] == 'Présent', 0)
             
-            weekly_stats = df.groupby('semaine').agg({
-                'statut': lambda x: (x == 'Présent').sum() / len(x) * 100
-            }).reset_index()
+            weekly = counts.groupby('semaine')[['present', 'nombre']].sum()
+            weekly_stats = (weekly['present'] / weekly['nombre'] * 100).rename('statut').reset_index()
             
             if len(weekly_stats) < 2:
                 return "❌ Pas assez de données pour identifier une tendance."
@@ -409,16 +405,15 @@ class AttendanceChatbot:
     def _handle_performance_question(self, question):
         """Gère les questions sur les performances"""
         try:
-            df = self.db.get_attendance_data(
+            counts = self.db.get_daily_counts(
                 (datetime.now() - timedelta(days=30)).date(),
                 datetime.now().date()
             )
             
-            if df.empty:
+            if counts.empty:
                 return "❌ Pas de données disponibles pour l'analyse de performance."
             
-            df['domaine'] = df['matricule'].apply(classify_domain)
-            domain_stats = generate_domain_summary(df)
+            domain_stats = AttendanceStats.from_counts(counts).domain_summary()
             
             response = "💪 **Analyse de Performance par Domaine:**\n\n"
             
@@ -446,27 +441,18 @@ class AttendanceChatbot:
     def _handle_ranking_question(self, question):
         """Gère les questions de classement (meilleur/pire)"""
         try:
-            df = self.db.get_attendance_data(
+            # Comptes par employé agrégés côté serveur
+            employee_stats = self.db.get_employee_counts(
                 (datetime.now() - timedelta(days=30)).date(),
                 datetime.now().date()
             )
             
-            if df.empty:
+            if employee_stats.empty:
                 return "❌ Pas de données disponibles pour le classement."
             
-            # Analyse par employé
-            employee_stats = df.groupby('matricule').agg({
-                'statut': lambda x: {
-                    'present': (x == 'Présent').sum(),
-                    'absent': (x == 'Absent').sum(),
-                    'late': (x == 'Retard').sum(),
-                    'total': len(x)
-                }
-            }).reset_index()
-            
             # Calcul du taux de présence par employé
-            employee_stats['presence_rate'] = employee_stats['statut'].apply(
-                lambda x: (x['present'] / x['total']) * 100 if x['total'] > 0 else 0
+            employee_stats['presence_rate'] = (
+                employee_stats['present'] / employee_stats['total'].clip(lower=1) * 100
             )
             
             is_best_question = re.search(self.patterns['meilleur'], question)
@@ -486,9 +472,8 @@ class AttendanceChatbot:
                 response = "⚠️ **Employés Nécessitant une Attention:**\n\n"
                 
                 for i, (_, row) in enumerate(bottom_employees.iterrows(), 1):
-                    stats = row['statut']
                     response += f"• {row['matricule']}: {row['presence_rate']:.1f}%\n"
-                    response += f"  Absences: {stats['absent']}, Retards: {stats['late']}\n"
+                    response += f"  Absences: {row['absent']}, Retards: {row['late']}\n"
             
             return response
             
@@ -0,0 +1,138 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from attendance_frame import AttendanceFrame
+
+
+class AttendanceCache:
+    """
+    Cache en mémoire des pointages par période, conservés sous forme compacte (AttendanceFrame).
+    Une actualisation ne télécharge que les lignes insérées ou modifiées depuis le dernier
+    repère (id / heure du serveur), plus une courte fenêtre de recouvrement. Le delta ne voit
+    pas les suppressions : les comptes par mois de la base sont comparés à ceux du cache et
+    la période est rechargée s'ils diffèrent. Avec un ChangeListener connecté, le repère n'est
+    même plus consulté : seules les périodes signalées comme modifiées sont resynchronisées.
+    """
+
+    def __init__(self, db, max_ranges=8):
+        self.db = db
+        self.max_ranges = max_ranges
+        self._ranges = OrderedDict()  # (début, fin) -> (AttendanceFrame, repère)
+        self._stale = set()  # périodes modifiées depuis leur dernière synchronisation
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def attach_listener(self, listener):
+        """Branche le cache sur les notifications de changements (listener.ChangeListener)"""
+        self._listener = listener
+        # Lignes supprimées ou changées de date : les périodes touchées sont oubliées
+        listener.subscribe_removals(self.invalidate)
+        listener.subscribe(self.mark_stale)
+        return self
+
+    def mark_stale(self, date_debut=None, date_fin=None, matricules=None):
+        """Signale les périodes en cache qui recoupent [date_debut, date_fin] (toutes si None)"""
+        with self._lock:
+            for debut, fin in self._ranges:
+                if date_debut is None or (debut <= date_fin and date_debut <= fin):
+                    self._stale.add((debut, fin))
+
+    def get(self, date_debut, date_fin):
+        """Pointages de la période en vue large (DataFrame, domaine inclus)"""
+        return self.get_frame(date_debut, date_fin).to_dataframe()
+
+    def get_frame(self, date_debut, date_fin):
+        """Pointages de la période : chargement complet la première fois, delta ensuite"""
+        key = (date_debut, date_fin)
+
+        with self._lock:
+            entry = self._ranges.get(key)
+            pushed = self._listener is not None and self._listener.connected
+            if entry is not None and pushed and key not in self._stale:
+                # Aucun changement notifié sur la période : pas de requête
+                self._ranges.move_to_end(key)
+                return entry[0]
+            # Retiré avant la synchronisation : une notification ultérieure le remettra
+            self._stale.discard(key)
+
+        if entry is None:
+            return self._load(key)
+
+        frame, watermark = entry
+        try:
+            # Nouveau repère pris avant la lecture du delta : rien ne tombe entre les deux
+            new_watermark = self.db.get_watermark()
+            delta = self.db.get_attendance_since(watermark, date_debut, date_fin)
+            if not delta.empty:
+                frame = frame.merge(AttendanceFrame.from_dataframe(delta))
+                print(f"🔄 {len(delta)} pointages synchronisés ({date_debut} → {date_fin})")
+            ecarts = self._count_mismatches(frame, date_debut, date_fin)
+            if ecarts:
+                # Pointages supprimés ou déplacés : les captures locales de ces mois sont périmées
+                print(f"♻️ Pointages supprimés ou déplacés ({date_debut} → {date_fin}) : rechargement")
+                for mois in ecarts:
+                    self.db.invalidate_history(mois)
+                return self._load(key)
+            watermark = new_watermark
+        except Exception as e:
+            print(f"⚠️ Synchronisation incrémentale impossible, données en cache conservées : {e}")
+
+        with self._lock:
+            self._ranges[key] = (frame, watermark)
+            self._ranges.move_to_end(key)
+        return frame
+
+    def _count_mismatches(self, frame, date_debut, date_fin):
+        """
+        Mois dont le nombre de pointages en cache diffère de la base. Les mois archivés par
+        la rétention sont lus dans ARCHIVE_DIR et non en base : ils ne sont pas comparés.
+        """
+        en_base = self.db.get_monthly_counts(date_debut, date_fin)
+        mois, lignes = np.unique(frame.dates().astype('datetime64[M]'), return_counts=True)
+        en_cache = {pd.Timestamp(m).date(): int(n) for m, n in zip(mois, lignes)}
+        return sorted(
+            m for m in set(en_base) | set(en_cache)
+            if en_base.get(m, 0) != en_cache.get(m, 0) and not self.db.archive.is_closed(m)
+        )
+
+    def _load(self, key):
+        """Chargement complet d'une période et mémorisation de son repère"""
+        try:
+            # Repère pris avant le chargement : les lignes arrivées entre-temps
+            # seront reprises (et dédoublonnées par id) à la prochaine synchronisation
+            watermark = self.db.get_watermark()
+        except Exception as e:
+            print(f"⚠️ Repère de synchronisation indisponible : {e}")
+            return AttendanceFrame.from_dataframe(self.db.get_attendance_data(*key))
+
+        df = self.db.get_attendance_data(*key)
+        frame = AttendanceFrame.from_dataframe(df)
+        if df.empty and 'id' not in df.columns:
+            # Erreur de chargement : on ne met pas en cache
+            return frame
+
+        with self._lock:
+            self._ranges[key] = (frame, watermark)
+            self._ranges.move_to_end(key)
+            while len(self._ranges) > self.max_ranges:
+                self._ranges.popitem(last=False)
+        return frame
+
+    def watermark(self, date_debut, date_fin):
+        """Repère de la dernière synchronisation d'une période (None si absente du cache)"""
+        with self._lock:
+            entry = self._ranges.get((date_debut, date_fin))
+        return entry[1] if entry else None
+
+    def invalidate(self, date_debut=None, date_fin=None, matricules=None):
+        """
+        Oublie les périodes qui recoupent [date_debut, date_fin] (tout le cache si None) :
+        le prochain accès les rechargera entièrement
+        """
+        date_fin = date_fin or date_debut
+        with self._lock:
+            for debut, fin in list(self._ranges):
+                if date_debut is None or (debut <= date_fin and date_debut <= fin):
+                    del self._ranges[(debut, fin)]
+                    self._stale.discard((debut, fin))
@@ -1,8 +1,310 @@
 import psycopg2
+import psycopg2.extras
 import pandas as pd
 import os
-from datetime import datetime
+import atexit
+import io
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from domains import domain_registry
+from history_store import HistoryStore, ArchiveStore, debut_mois, fin_mois
+from metrics import add_pool_wait, add_transfer, instrument
+from worker_directory import WorkerDirectory
 
+
+class PoolTimeoutError(Exception):
+    """Aucune connexion libérée dans le délai d'attente du pool"""
+
+
+class ConnectionPool:
+    """Pool de connexions PostgreSQL partagé par tout le processus"""
+
+    def __init__(self, connect_args, min_size=1, max_size=10, timeout=10.0, check_interval=30.0):
+        self.connect_args = connect_args
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.timeout = timeout
+        self.check_interval = check_interval
+
+        self._idle = []  # (connexion, instant de retour au pool)
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        for _ in range(self.min_size):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        """Ouvre une nouvelle connexion physique"""
+        try:
+            if isinstance(self.connect_args, str):
+                return psycopg2.connect(self.connect_args)
+            return psycopg2.connect(**self.connect_args)
+        except Exception as e:
+            raise Exception(f"❌ Erreur de connexion PostgreSQL : {e}")
+
+    def _is_healthy(self, conn, idle_since):
+        """Vérifie qu'une connexion inactive est encore utilisable"""
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        # Ping seulement si la connexion dort depuis un moment
+        if time.monotonic() - idle_since < self.check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        """Ferme une connexion et libère sa place dans le pool"""
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def getconn(self, timeout=None):
+        """Emprunte une connexion saine, en attendant au plus `timeout` secondes"""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise Exception("❌ Pool de connexions fermé")
+                    if self._idle:
+                        conn, idle_since = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        conn, idle_since = None, None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeoutError(
+                            f"❌ Aucune connexion disponible après {timeout:.0f}s "
+                            f"({self.max_size} connexions utilisées)"
+                        )
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+
+            if self._is_healthy(conn, idle_since):
+                return conn
+
+            # Connexion morte : on la remplace et on réessaie
+            self._discard(conn)
+
+    def putconn(self, conn, close=False):
+        """Rend une connexion au pool (ou la ferme si elle est inutilisable)"""
+        if not conn.closed and not close:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                close = True
+
+        if conn.closed or close or self._closed:
+            self._discard(conn)
+            return
+
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Connexion empruntée le temps d'un bloc `with` : commit en sortie, rollback sur erreur"""
+        start = time.perf_counter()
+        conn = self.getconn(timeout)
+        add_pool_wait(time.perf_counter() - start)
+        broken = False
+        try:
+            yield conn
+            if not conn.closed:
+                conn.commit()
+        except Exception:
+            try:
+                if not conn.closed:
+                    conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            self.putconn(conn, close=broken)
+
+    def closeall(self):
+        """Ferme toutes les connexions inactives et refuse les nouveaux emprunts"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        """État courant du pool"""
+        with self._cond:
+            return {
+                'taille': self._size,
+                'inactives': len(self._idle),
+                'utilisees': self._size - len(self._idle),
+                'min': self.min_size,
+                'max': self.max_size,
+            }
+
+
+# Un pool par cible de connexion, partagé par toutes les instances de DatabaseManager
+_pools = {}
+_directories = {}
+_pools_lock = threading.Lock()
+
+
+def close_all_pools():
+    """Ferme tous les pools du processus"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.closeall()
+
+
+atexit.register(close_all_pools)
+
+
+# Colonnes projetées pour les lectures de pointage (noms attendus par le tableau de bord)
+ATTENDANCE_COLUMNS = """
+    a.id,
+    a.employee_id AS matricule,
+    a.attendance_date AS date_pointage,
+    a.check_in_time AS heure_pointage,
+    a.status AS statut,
+    a.created_at,
+    a.updated_at
+"""
+
+ATTENDANCE_DATE_COLUMNS = ['date_pointage', 'created_at', 'updated_at']
+
+ATTENDANCE_DTYPES = {
+    'id': 'int64',
+    'matricule': 'category',
+    'heure_pointage': 'string',
+    'statut': 'category',
+    'nom': 'category',
+    'poste': 'category',
+}
+
+# Insertion groupée : ouvriers manquants et pointages en une seule requête
+BATCH_INSERT_SQL = """
+    WITH lot (idx, matricule, statut, jour, heure, horodatage, nom, poste) AS (
+        VALUES %s
+    ),
+    ouvriers AS (
+        INSERT INTO workers (matricule, nom, poste)
+        SELECT DISTINCT ON (matricule) matricule, nom, poste
+        FROM lot
+        ORDER BY matricule, idx
+        ON CONFLICT (matricule) DO NOTHING
+    )
+    INSERT INTO attendance (
+        employee_id, attendance_date, check_in_time, status, created_at, updated_at
+    )
+    SELECT matricule, jour, heure, statut, horodatage, now()
+    FROM lot
+    ORDER BY idx
+"""
+BATCH_ROW_TEMPLATE = "(%s, %s, %s, %s::date, %s::time, %s::timestamp, %s, %s)"
+
+# Un pointage par employé et par jour (clé uq_attendance_employee_day, voir schema.py) :
+# un scan (présent, retard) remplace une absence, sinon le premier pointage du jour est conservé.
+# updated_at est toujours l'heure du serveur (jamais l'horodatage client, qui peut être ancien
+# pour un rejeu ou une reprise) : c'est le repère de la synchronisation incrémentale.
+ATTENDANCE_UPSERT_SQL = """
+    ON CONFLICT (employee_id, attendance_date) DO UPDATE SET
+        check_in_time = EXCLUDED.check_in_time,
+        status = EXCLUDED.status,
+        updated_at = now()
+    WHERE lower(btrim(attendance.status)) = 'absent'
+      AND lower(btrim(EXCLUDED.status)) <> 'absent'
+"""
+
+# Libellés de statut : valeurs saisies par l'app QR → libellés du tableau de bord
+STATUTS = ['Présent', 'Absent', 'Retard']
+STATUT_LABELS = {
+    'present': 'Présent',
+    'présent': 'Présent',
+    'absent': 'Absent',
+    'retard': 'Retard',
+    'late': 'Retard',
+}
+
+# Domaine et statut calculés directement en SQL (même règles que classify_domain / typer_pointages)
+def domaine_sql(colonne):
+    """Expression SQL donnant le domaine d'un matricule (règles du registre des domaines)"""
+    return domain_registry().sql(colonne)
+
+
+def statut_sql(colonne):
+    """Expression SQL donnant le libellé canonique d'un statut brut"""
+    cas = " ".join(f"WHEN '{brut}' THEN '{libelle}'" for brut, libelle in STATUT_LABELS.items())
+    return f"CASE lower(btrim({colonne})) {cas} ELSE {colonne} END"
+
+
+DOMAINE_SQL = domaine_sql('a.employee_id')
+STATUT_SQL = statut_sql('a.status')
+
+
+def _normaliser_statut(statut):
+    """Libellé canonique d'un statut brut"""
+    return STATUT_LABELS.get(str(statut).strip().lower(), str(statut))
+
+
+def typer_pointages(df):
+    """Applique les types finaux : dates datetime64, matricule et statut catégoriels"""
+    # Les normalisations portent sur les catégories (quelques valeurs), pas ligne à ligne
+    if 'matricule' in df.columns:
+        df['matricule'] = (
+            df['matricule'].astype('category').map(lambda m: str(m).strip().upper()).astype('category')
+        )
+
+    if 'statut' in df.columns:
+        statuts = df['statut'].astype('category').map(_normaliser_statut).astype('category')
+        autres = sorted(set(statuts.cat.categories) - set(STATUTS))
+        # set_categories (et non astype) : l'ordre des catégories compte pour les codes
+        df['statut'] = statuts.cat.set_categories(STATUTS + autres)
+
+    for col in ATTENDANCE_DATE_COLUMNS:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col])
+
+    return df
+
+
+# Chaque méthode publique est mesurée (voir metrics.py) ; les accès bas niveau sont exclus
+@instrument('get_connection', 'dedicated_connection', 'close', 'invalidate_history', 'read_queries')
 class DatabaseManager:
     def __init__(self):
         """Initialise la connexion PostgreSQL (Render ou locale)"""
@@ -25,65 +327,164 @@ class DatabaseManager:
             'password': os.getenv('PGPASSWORD', '')
         }
 
+        # ✅ Dimensionnement du pool de connexions
+        self.pool_settings = {
+            'min_size': int(os.getenv('DB_POOL_MIN', '1')),
+            'max_size': int(os.getenv('DB_POOL_MAX', '10')),
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+            'check_interval': float(os.getenv('DB_POOL_CHECK_INTERVAL', '30')),
+        }
+
+        # Tables de synthèse et clé d'unicité détectées au premier usage
+        self._rollups = None
+        self._unique_key = None
+        self._partitioned = None
+
+        # Historique local des mois clos (Parquet)
+        self.history = HistoryStore()
+        # Mois sortis de la base par la rétention (Parquet compressé)
+        self.archive = ArchiveStore()
+
+    def _pool_key(self):
+        """Identifiant de la cible de connexion (URL ou paramètres)"""
+        if self.use_url:
+            return self.database_url
+        return tuple(sorted(self.connection_params.items()))
+
+    @property
+    def pool(self):
+        """Pool partagé par le processus pour cette cible de connexion"""
+        key = self._pool_key()
+
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                connect_args = self.database_url if self.use_url else self.connection_params
+                pool = ConnectionPool(connect_args, **self.pool_settings)
+                _pools[key] = pool
+            return pool
+
+    @property
+    def workers(self):
+        """Annuaire des ouvriers partagé par le processus pour cette cible de connexion"""
+        key = self._pool_key()
+
+        with _pools_lock:
+            directory = _directories.get(key)
+            if directory is None:
+                directory = WorkerDirectory(self)
+                _directories[key] = directory
+            return directory
+
+    def dedicated_connection(self):
+        """Connexion physique hors pool, pour les sessions longues (LISTEN)"""
+        if self.use_url:
+            return psycopg2.connect(self.database_url)
+        return psycopg2.connect(**self.connection_params)
+
     def get_connection(self):
-        """Connexion fiable à PostgreSQL"""
-        try:
-            if self.use_url:
-                return psycopg2.connect(self.database_url)
-            return psycopg2.connect(**self.connection_params)
-        except Exception as e:
-            raise Exception(f"❌ Erreur de connexion PostgreSQL : {e}")
+        """Connexion fiable à PostgreSQL, empruntée au pool et rendue en sortie de `with`"""
+        return self.pool.connection()
+
+    def close(self):
+        """Ferme le pool de connexions de cette cible"""
+        with _pools_lock:
+            pool = _pools.pop(self._pool_key(), None)
+        if pool:
+            pool.closeall()
+
+    def _scan_queue(self):
+        """
+        File d'écriture différée des scans (ingestion.py) partagée par le processus,
+        ou None si SCAN_QUEUE=0 (écriture synchrone)
+        """
+        if os.getenv('SCAN_QUEUE', '1').strip().lower() in ('0', 'false', 'non'):
+            return None
+        # Import local : ingestion.py importe DatabaseManager
+        from ingestion import shared_scan_queue
+        return shared_scan_queue(self)
+
+    def _enqueue_scan(self, scan_queue, matricule, statut, nom=None, poste=None):
+        """Scan confié à la file : journalisé localement puis écrit par lot en arrière-plan"""
+        timeout = float(os.getenv('SCAN_ENQUEUE_TIMEOUT', '1'))
+        return scan_queue.enqueue(matricule, statut, nom=nom, poste=poste, timeout=timeout)
 
     def ajouter_ouvrier_et_pointage(self, matricule, nom, poste, statut="present"):
-        """Ajoute un ouvrier et son pointage dans la base"""
+        """
+        Ajoute un ouvrier et son pointage dans la base. Par défaut le scan passe par la
+        file d'écriture différée (réponse dès la journalisation locale, voir _scan_queue).
+        """
         matricule = matricule.strip().upper()
         nom = nom.strip().title()
         poste = poste.strip().title()
         statut = statut.strip().lower()
         now = datetime.now()
 
+        scan_queue = self._scan_queue()
+        if scan_queue is not None:
+            return self._enqueue_scan(scan_queue, matricule, statut, nom, poste)
+
         try:
+            # Détectés avant d'emprunter la connexion : une seule connexion du pool par écriture
+            # (le rechargement de l'annuaire et la détection de la clé en empruntent une)
+            conflit = self._upsert_conflict()
+            nouveau = not self._worker_known(matricule)
             with self.get_connection() as conn:
                 with conn.cursor() as cur:
-                    # Ajout ouvrier
-                    cur.execute("""
-                        INSERT INTO workers (matricule, nom, poste)
-                        VALUES (%s, %s, %s)
-                        ON CONFLICT (matricule) DO NOTHING;
-                    """, (matricule, nom, poste))
+                    # Ajout ouvrier (inutile s'il est déjà dans l'annuaire)
+                    if nouveau:
+                        cur.execute("""
+                            INSERT INTO workers (matricule, nom, poste)
+                            VALUES (%s, %s, %s)
+                            ON CONFLICT (matricule) DO NOTHING;
+                        """, (matricule, nom, poste))
 
                     # Ajout pointage
-                    cur.execute("""
-                        INSERT INTO attendance (
-                            employee_id, attendance_date, check_in_time, status, created_at, updated_at
-                        )
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                    """, (matricule, now.date(), now.time(), statut, now, now))
+                    enregistre = self._upsert_attendance(cur, matricule, statut, now, conflit)
 
                 conn.commit()
+            if nouveau:
+                self.workers.add(matricule, nom, poste)
+            if not enregistre:
+                return True, f"ℹ️ Pointage déjà enregistré aujourd'hui : {matricule}"
             print(f"✅ Ouvrier {matricule} et pointage {statut} enregistrés")
             return True, f"✅ Enregistré : {matricule} ({statut})"
 
         except Exception as e:
+            # L'annuaire a pu diverger de la table (ouvrier supprimé entre-temps)
+            self.workers.invalidate()
             print(f"❌ Erreur d’ajout : {e}")
             return False, f"❌ Erreur ajout : {e}"
 
+    def _worker_known(self, matricule):
+        """Ouvrier présent dans l'annuaire (False si l'annuaire est indisponible)"""
+        try:
+            return matricule in self.workers
+        except Exception as e:
+            print(f"⚠️ Annuaire des ouvriers indisponible : {e}")
+            return False
+
     def insert_attendance(self, matricule, statut="present"):
-        """Insère un pointage sans créer l’ouvrier"""
+        """
+        Insère un pointage sans créer l’ouvrier. Par défaut le scan passe par la file
+        d'écriture différée (voir _scan_queue) ; un ouvrier inconnu y est créé sans nom ni poste.
+        """
         matricule = matricule.strip().upper()
         now = datetime.now()
 
+        scan_queue = self._scan_queue()
+        if scan_queue is not None:
+            return self._enqueue_scan(scan_queue, matricule, statut)
+
         try:
+            conflit = self._upsert_conflict()
             with self.get_connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute("""
-                        INSERT INTO attendance (
-                            employee_id, attendance_date, check_in_time, status, created_at, updated_at
-                        )
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                    """, (matricule, now.date(), now.time(), statut, now, now))
+                    enregistre = self._upsert_attendance(cur, matricule, statut, now, conflit)
                 conn.commit()
 
+            if not enregistre:
+                return True, f"ℹ️ Pointage déjà enregistré aujourd'hui : {matricule}"
             print(f"✅ Pointage ajouté : {matricule} ({statut})")
             return True, f"✅ Pointage enregistré : {matricule}"
 
@@ -91,34 +492,164 @@ class DatabaseManager:
             print(f"❌ Erreur insertion attendance : {e}")
             return False, f"❌ Erreur pointage : {e}"
 
-    def get_attendance_data(self, date_debut=None, date_fin=None, avec_jointure=False):
-        """Récupère les données de pointage avec ou sans jointure"""
+    def _upsert_conflict(self):
+        """
+        Clause ON CONFLICT des écritures si la clé d'unicité est installée. À appeler avant
+        d'emprunter la connexion d'écriture (la détection en emprunte une la première fois).
+        """
+        return ATTENDANCE_UPSERT_SQL if self.unique_key_available() else ""
+
+    def _upsert_attendance(self, cur, matricule, statut, horodatage, conflit):
+        """
+        Insère (ou remplace une absence par) un pointage ; False si le jour était déjà pointé.
+        `conflit` : clause de _upsert_conflict(), calculée avant l'emprunt de `cur`.
+        """
+        cur.execute(f"""
+            INSERT INTO attendance (
+                employee_id, attendance_date, check_in_time, status, created_at, updated_at
+            )
+            VALUES (%s, %s, %s, %s, %s, now())
+            {conflit}
+            RETURNING id
+        """, (matricule, horodatage.date(), horodatage.time(), statut, horodatage))
+        return cur.fetchone() is not None
+
+    def insert_attendance_batch(self, pointages, taille_lot=1000):
+        """
+        Insère un lot de pointages (matricule, statut, horodatage[, nom, poste]).
+        Les ouvriers manquants sont créés et tous les pointages insérés en une seule
+        requête et un seul commit par lot. Retourne un (succès, message) par pointage.
+        """
+        resultats = [None] * len(pointages)
+        lignes = []
+
+        # Validation côté client : une ligne invalide ne fait pas échouer le lot
+        for idx, pointage in enumerate(pointages):
+            try:
+                matricule, statut, horodatage, *identite = pointage
+                matricule = str(matricule or "").strip().upper()
+                if not matricule:
+                    raise ValueError("matricule vide")
+                statut = (statut or "present").strip().lower()
+                if horodatage is None:
+                    horodatage = datetime.now()
+                elif isinstance(horodatage, str):
+                    horodatage = datetime.fromisoformat(horodatage)
+                nom = identite[0].strip().title() if len(identite) > 0 and identite[0] else None
+                poste = identite[1].strip().title() if len(identite) > 1 and identite[1] else None
+            except Exception as e:
+                resultats[idx] = (False, f"❌ Pointage invalide : {e}")
+                continue
+
+            lignes.append((idx, matricule, statut, horodatage.date(), horodatage.time(), horodatage, nom, poste))
+
+        # Doublons internes au lot (double scan, renvoi) : même règle que ATTENDANCE_UPSERT_SQL,
+        # une instruction ON CONFLICT ne pouvant pas modifier deux fois la même ligne
+        retenus = {}
+        for ligne in lignes:
+            cle = (ligne[1], ligne[3])
+            actuel = retenus.get(cle)
+            if actuel is None or (actuel[2] == 'absent' and ligne[2] != 'absent'):
+                retenus[cle] = ligne
+        for ligne in lignes:
+            if retenus[(ligne[1], ligne[3])] is not ligne:
+                resultats[ligne[0]] = (True, f"ℹ️ Pointage déjà enregistré : {ligne[1]}")
+        lignes = sorted(retenus.values())
+
+        for debut in range(0, len(lignes), taille_lot):
+            lot = lignes[debut:debut + taille_lot]
+            for idx, ok, message in self._insert_lot(lot):
+                resultats[idx] = (ok, message)
+
+        # Ouvriers éventuellement créés par le lot : l'annuaire sera rechargé
+        if any(not self._worker_known(ligne[1]) for ligne in lignes):
+            self.workers.invalidate()
+
+        nb_ok = sum(1 for r in resultats if r and r[0])
+        print(f"✅ Lot de pointages : {nb_ok}/{len(pointages)} enregistrés")
+        return resultats
+
+    def _insert_lot(self, lot):
+        """Insère un lot validé ; en cas d'échec, isole les lignes fautives par savepoint"""
+        if not lot:
+            return []
+
+        try:
+            conflit = self._upsert_conflict()
+        except Exception as e:
+            return [(ligne[0], False, f"❌ Erreur pointage : {str(e).strip()}") for ligne in lot]
+        sql = f"{BATCH_INSERT_SQL} {conflit} RETURNING employee_id, attendance_date"
+
+        def resultat(ligne, enregistres):
+            if (ligne[1], ligne[3]) in enregistres:
+                return (ligne[0], True, f"✅ Pointage enregistré : {ligne[1]}")
+            return (ligne[0], True, f"ℹ️ Pointage déjà enregistré : {ligne[1]}")
+
+        try:
+            with self.get_connection() as conn:
+                with conn.cursor() as cur:
+                    enregistres = set(psycopg2.extras.execute_values(
+                        cur, sql, lot,
+                        template=BATCH_ROW_TEMPLATE, page_size=len(lot), fetch=True
+                    ))
+            return [resultat(ligne, enregistres) for ligne in lot]
+
+        except Exception as e:
+            print(f"⚠️ Lot rejeté ({str(e).strip()}), insertion ligne par ligne")
+
+        resultats = []
         try:
             with self.get_connection() as conn:
-                if avec_jointure:
-                    base_query = """
-                        SELECT 
-                            a.employee_id AS matricule,
-                            w.nom,
-                            w.poste,
-                            a.attendance_date,
-                            a.check_in_time,
-                            a.status,
-                            a.created_at
-                        FROM attendance a
-                        JOIN workers w ON a.employee_id = w.matricule
-                    """
-                else:
-                    base_query = "SELECT * FROM attendance"
-
-                params = ()
-                if date_debut and date_fin:
-                    base_query += " WHERE attendance_date BETWEEN %s AND %s"
-                    params = (date_debut, date_fin)
-
-                base_query += " ORDER BY attendance_date DESC, check_in_time DESC"
-
-                df = pd.read_sql(base_query, conn, params=params if params else None)
+                with conn.cursor() as cur:
+                    for ligne in lot:
+                        cur.execute("SAVEPOINT ligne_pointage")
+                        try:
+                            enregistres = set(psycopg2.extras.execute_values(
+                                cur, sql, [ligne], template=BATCH_ROW_TEMPLATE, fetch=True
+                            ))
+                            cur.execute("RELEASE SAVEPOINT ligne_pointage")
+                            resultats.append(resultat(ligne, enregistres))
+                        except Exception as e:
+                            cur.execute("ROLLBACK TO SAVEPOINT ligne_pointage")
+                            resultats.append((ligne[0], False, f"❌ Erreur pointage : {str(e).strip()}"))
+        except Exception as e:
+            return [(ligne[0], False, f"❌ Erreur pointage : {e}") for ligne in lot]
+
+        return resultats
+
+    def _attendance_query(self, date_debut=None, date_fin=None, avec_jointure=False):
+        """Requête (SQL, paramètres) de lecture des pointages"""
+        if avec_jointure:
+            query = f"""
+                SELECT {ATTENDANCE_COLUMNS}, w.nom, w.poste
+                FROM attendance a
+                JOIN workers w ON a.employee_id = w.matricule
+            """
+        else:
+            query = f"SELECT {ATTENDANCE_COLUMNS} FROM attendance a"
+
+        params = ()
+        if date_debut and date_fin:
+            query += " WHERE a.attendance_date BETWEEN %s AND %s"
+            params = (date_debut, date_fin)
+
+        query += " ORDER BY a.attendance_date DESC, a.check_in_time DESC"
+        return query, params
+
+    def get_attendance_data(self, date_debut=None, date_fin=None, avec_jointure=False):
+        """
+        Récupère les données de pointage typées, avec ou sans jointure.
+        Les mois clos sont lus depuis l'historique local (ou les archives de rétention),
+        seul le reste vient de la base.
+        """
+        try:
+            if date_debut and date_fin and (self.history.enabled or self.archive.enabled):
+                df = self._read_tiered(date_debut, date_fin)
+            else:
+                df = self._fetch_attendance(date_debut, date_fin)
+
+            if avec_jointure:
+                df = self._enrich(df, date_debut, date_fin)
 
             print(f"📊 {len(df)} pointages chargés.")
             return df
@@ -127,6 +658,396 @@ class DatabaseManager:
             print(f"❌ Erreur récupération : {e}")
             return pd.DataFrame()
 
+    def _fetch_attendance(self, date_debut=None, date_fin=None, avec_jointure=False):
+        """Lecture des pointages depuis PostgreSQL"""
+        query, params = self._attendance_query(date_debut, date_fin, avec_jointure)
+
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                df = self._copy_to_frame(
+                    cur, query, params,
+                    dtype=ATTENDANCE_DTYPES, parse_dates=ATTENDANCE_DATE_COLUMNS
+                )
+        return typer_pointages(df)
+
+    def _enrich(self, df, date_debut=None, date_fin=None):
+        """Ajoute nom et poste via l'annuaire en mémoire (jointure SQL si indisponible)"""
+        try:
+            return self.workers.enrich(df)
+        except Exception as e:
+            print(f"⚠️ Annuaire des ouvriers indisponible, jointure SQL : {e}")
+            return self._fetch_attendance(date_debut, date_fin, avec_jointure=True)
+
+    def _history_month(self, mois):
+        """Pointages d'un mois clos : archive de rétention, sinon historique local capturé au premier accès"""
+        if self.archive.is_closed(mois):
+            df = self.archive.read(mois)
+            if df is not None:
+                return typer_pointages(df)
+        df = self.history.read(mois) if self.history.enabled else None
+        if df is None:
+            df = self._fetch_attendance(mois, fin_mois(mois))
+            if self.history.enabled:
+                try:
+                    self.history.write(mois, df)
+                except Exception as e:
+                    print(f"⚠️ Capture de l'historique impossible pour {mois:%Y-%m} : {e}")
+        return df
+
+    def _read_tiered(self, date_debut, date_fin):
+        """Fusionne les mois clos (historique, archives) et la plage ouverte (PostgreSQL)"""
+        # Sans historique local, seuls les mois archivés sont lus sur disque
+        store = self.history if self.history.enabled else self.archive
+        mois_clos, plage_ouverte = store.split(date_debut, date_fin)
+
+        frames = []
+        for mois in mois_clos:
+            df = self._history_month(mois)
+            # Le premier mois peut n'être couvert que partiellement
+            if mois < date_debut:
+                df = df[df['date_pointage'] >= pd.Timestamp(date_debut)]
+            if fin_mois(mois) > date_fin:
+                df = df[df['date_pointage'] <= pd.Timestamp(date_fin)]
+            frames.append(df)
+
+        if plage_ouverte is not None:
+            frames.append(self._fetch_attendance(*plage_ouverte))
+
+        if not frames:
+            return self._fetch_attendance(date_debut, date_fin)
+        # Les mois vides n'interviennent pas dans la fusion
+        frames = [df for df in frames if not df.empty] or frames[:1]
+        if len(frames) == 1:
+            return frames[0].reset_index(drop=True)
+
+        df = pd.concat(frames, ignore_index=True)
+        df = df.sort_values(
+            ['date_pointage', 'heure_pointage'], ascending=False, na_position='last', ignore_index=True
+        )
+        return typer_pointages(df)
+
+    def invalidate_history(self, date_debut, date_fin=None):
+        """Oublie les mois capturés couvrant une période (pointages corrigés a posteriori)"""
+        date_fin = date_fin or date_debut
+        mois = debut_mois(date_debut)
+        while mois <= date_fin:
+            self.history.invalidate_month(mois)
+            mois = fin_mois(mois) + timedelta(days=1)
+
+    def iter_attendance_chunks(self, date_debut=None, date_fin=None, chunk_rows=50000, avec_jointure=False):
+        """
+        Parcourt les pointages par blocs de `chunk_rows` lignes via un curseur serveur nommé.
+        Chaque bloc est un DataFrame typé : la mémoire reste bornée quelle que soit la période.
+        """
+        query, params = self._attendance_query(date_debut, date_fin)
+        # Annuaire pris avant l'emprunt de la connexion du curseur (un rechargement en emprunte une)
+        annuaire = self.workers.snapshot() if avec_jointure else None
+
+        with self.get_connection() as conn:
+            with conn.cursor(name=f"pointages_{uuid.uuid4().hex}") as cur:
+                cur.itersize = chunk_rows
+                cur.execute(query, params or None)
+
+                columns = None
+                while True:
+                    rows = cur.fetchmany(chunk_rows)
+                    if not rows:
+                        break
+                    if columns is None:
+                        columns = [d[0] for d in cur.description]
+
+                    df = pd.DataFrame.from_records(rows, columns=columns)
+                    df['heure_pointage'] = df['heure_pointage'].astype('string')
+                    df = typer_pointages(df)
+                    yield self.workers.enrich(df, annuaire) if avec_jointure else df
+
+        # Mois sortis de la base par la rétention : les plus anciens, donc en dernier
+        if date_debut and date_fin and self.archive.enabled:
+            mois_archives, _ = self.archive.split(date_debut, date_fin)
+            for mois in reversed(mois_archives):
+                df = self._history_month(mois)
+                df = df[
+                    (df['date_pointage'] >= pd.Timestamp(date_debut))
+                    & (df['date_pointage'] <= pd.Timestamp(date_fin))
+                ].reset_index(drop=True)
+                if not df.empty:
+                    yield self.workers.enrich(df) if avec_jointure else df
+
+    def get_watermark(self):
+        """
+        Repère de synchronisation : (dernier id, heure du serveur) de la table attendance.
+        L'heure est celle du serveur, comme updated_at (voir ATTENDANCE_UPSERT_SQL).
+        """
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT coalesce(max(id), 0), now()::timestamp FROM attendance")
+                return cur.fetchone()
+
+    def _since_query(self, watermark, date_debut=None, date_fin=None):
+        """
+        Requête (SQL, paramètres) des pointages postérieurs à un repère. Les SYNC_OVERLAP_SECONDS
+        secondes précédant le repère sont relues : une transaction commencée avant lui (id plus
+        petit, updated_at antérieur) mais validée après n'est pas manquée. Les lignes relues
+        remplacent leurs homologues de même id (AttendanceFrame.merge).
+        """
+        last_id, last_update = watermark
+        recouvrement = timedelta(seconds=int(os.getenv('SYNC_OVERLAP_SECONDS', '300')))
+        query = f"""
+            SELECT {ATTENDANCE_COLUMNS}
+            FROM attendance a
+            WHERE (a.id > %s OR a.updated_at > %s)
+        """
+        params = [last_id, (last_update - recouvrement) if last_update else datetime.min]
+
+        if date_debut and date_fin:
+            query += " AND a.attendance_date BETWEEN %s AND %s"
+            params += [date_debut, date_fin]
+
+        return query, tuple(params)
+
+    def get_attendance_since(self, watermark, date_debut=None, date_fin=None):
+        """Pointages insérés ou modifiés après le repère `watermark` (voir get_watermark)"""
+        query, params = self._since_query(watermark, date_debut, date_fin)
+
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                df = self._copy_to_frame(
+                    cur, query, params,
+                    dtype=ATTENDANCE_DTYPES, parse_dates=ATTENDANCE_DATE_COLUMNS
+                )
+        return typer_pointages(df)
+
+    def _monthly_counts_query(self, date_debut, date_fin):
+        return """
+            SELECT date_trunc('month', a.attendance_date)::date AS mois, count(*) AS lignes
+            FROM attendance a
+            WHERE a.attendance_date BETWEEN %s AND %s
+            GROUP BY 1
+        """, (date_debut, date_fin)
+
+    def get_monthly_counts(self, date_debut, date_fin):
+        """
+        Nombre de pointages en base par mois de la période : {premier jour du mois: lignes}.
+        Contrôle des caches synchronisés par delta, qui ne voient ni les suppressions ni
+        les pointages déplacés hors de leur période.
+        """
+        query, params = self._monthly_counts_query(date_debut, date_fin)
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(query, params)
+                return dict(cur.fetchall())
+
+    def _copy_to_frame(self, cur, query, params=(), dtype=None, parse_dates=None):
+        """Exécute une requête via COPY ... TO STDOUT et la lit directement en colonnes typées"""
+        sql = cur.mogrify(query, params or None).decode()
+        buffer = io.StringIO()
+        cur.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER true)", buffer)
+        add_transfer(buffer.tell())
+        buffer.seek(0)
+
+        return pd.read_csv(
+            buffer,
+            dtype=dtype,
+            parse_dates=parse_dates,
+            date_format='ISO8601',
+            keep_default_na=False,
+            na_values=[''],
+        )
+
+    def rollups_available(self):
+        """Indique si les tables de synthèse journalières sont installées (voir schema.py)"""
+        if self._rollups is None:
+            try:
+                with self.get_connection() as conn:
+                    with conn.cursor() as cur:
+                        cur.execute("""
+                            SELECT to_regclass('attendance_daily_summary') IS NOT NULL
+                               AND to_regclass('attendance_employee_daily') IS NOT NULL
+                               AND EXISTS (
+                                   SELECT 1 FROM pg_trigger WHERE tgname = 'attendance_rollup_insert'
+                               )
+                        """)
+                        self._rollups = cur.fetchone()[0]
+            except Exception as e:
+                print(f"⚠️ Tables de synthèse indisponibles : {e}")
+                return False
+        return self._rollups
+
+    def unique_key_available(self):
+        """
+        Indique si la clé d'unicité (employé, jour) est installée (voir schema.py).
+        Le résultat est mémorisé ; une erreur de détection est propagée (sans la clé,
+        une écriture sans ON CONFLICT échouerait au premier double scan).
+        """
+        if self._unique_key is None:
+            with self.get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT to_regclass('uq_attendance_employee_day') IS NOT NULL")
+                    self._unique_key = cur.fetchone()[0]
+        return self._unique_key
+
+    def attendance_partitioned(self):
+        """Indique si `attendance` est partitionnée par mois (voir partitioning.py)"""
+        if self._partitioned is None:
+            try:
+                with self.get_connection() as conn:
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('attendance')")
+                        row = cur.fetchone()
+                        self._partitioned = bool(row and row[0])
+            except Exception as e:
+                print(f"⚠️ Partitionnement des pointages indéterminé : {e}")
+                return False
+        return self._partitioned
+
+    def notifications_available(self):
+        """Indique si les triggers de notification des changements sont installés (voir schema.py)"""
+        try:
+            with self.get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'attendance_notify_insert')")
+                    return cur.fetchone()[0]
+        except Exception as e:
+            print(f"⚠️ Notifications de changements indisponibles : {e}")
+            return False
+
+    def _daily_counts_query(self, date_debut, date_fin):
+        """Requête (SQL, paramètres) des comptes journaliers par domaine et statut"""
+        if self.rollups_available():
+            query = """
+                SELECT jour AS date_pointage, domaine, statut, nombre
+                FROM attendance_daily_summary
+                WHERE jour BETWEEN %s AND %s AND nombre > 0
+                ORDER BY 1, 2, 3
+            """
+        else:
+            query = f"""
+                SELECT
+                    a.attendance_date AS date_pointage,
+                    {DOMAINE_SQL} AS domaine,
+                    {STATUT_SQL} AS statut,
+                    count(*) AS nombre
+                FROM attendance a
+                WHERE a.attendance_date BETWEEN %s AND %s
+                GROUP BY 1, 2, 3
+                ORDER BY 1, 2, 3
+            """
+        return query, (date_debut, date_fin)
+
+    def get_daily_counts(self, date_debut, date_fin):
+        """Comptes journaliers par domaine et statut, agrégés côté serveur"""
+        query, params = self._daily_counts_query(date_debut, date_fin)
+
+        try:
+            with self.get_connection() as conn:
+                with conn.cursor() as cur:
+                    df = self._copy_to_frame(
+                        cur, query, params,
+                        dtype={'domaine': 'category', 'statut': 'category', 'nombre': 'int64'},
+                        parse_dates=['date_pointage'],
+                    )
+            return df
+
+        except Exception as e:
+            print(f"❌ Erreur agrégation journalière : {e}")
+            return pd.DataFrame(columns=['date_pointage', 'domaine', 'statut', 'nombre'])
+
+    def _employee_counts_query(self, date_debut, date_fin):
+        """Requête (SQL, paramètres) des comptes par employé"""
+        if self.rollups_available():
+            query = f"""
+                SELECT
+                    e.matricule,
+                    {domaine_sql('e.matricule')} AS domaine,
+                    sum(e.nombre) AS total,
+                    coalesce(sum(e.nombre) FILTER (WHERE e.statut = 'Présent'), 0) AS present,
+                    coalesce(sum(e.nombre) FILTER (WHERE e.statut = 'Absent'), 0) AS absent,
+                    coalesce(sum(e.nombre) FILTER (WHERE e.statut = 'Retard'), 0) AS late,
+                    max(e.jour) AS dernier_pointage,
+                    max(e.jour) FILTER (WHERE e.statut = 'Absent') AS derniere_absence,
+                    max(e.jour) FILTER (WHERE e.statut = 'Retard') AS dernier_retard
+                FROM attendance_employee_daily e
+                WHERE e.jour BETWEEN %s AND %s AND e.nombre > 0
+                GROUP BY 1, 2
+                ORDER BY 1
+            """
+        else:
+            query = f"""
+                SELECT
+                    upper(btrim(a.employee_id)) AS matricule,
+                    {DOMAINE_SQL} AS domaine,
+                    count(*) AS total,
+                    count(*) FILTER (WHERE {STATUT_SQL} = 'Présent') AS present,
+                    count(*) FILTER (WHERE {STATUT_SQL} = 'Absent') AS absent,
+                    count(*) FILTER (WHERE {STATUT_SQL} = 'Retard') AS late,
+                    max(a.attendance_date) AS dernier_pointage,
+                    max(a.attendance_date) FILTER (WHERE {STATUT_SQL} = 'Absent') AS derniere_absence,
+                    max(a.attendance_date) FILTER (WHERE {STATUT_SQL} = 'Retard') AS dernier_retard
+                FROM attendance a
+                WHERE a.attendance_date BETWEEN %s AND %s
+                GROUP BY 1, 2
+                ORDER BY 1
+            """
+        return query, (date_debut, date_fin)
+
+    def get_employee_counts(self, date_debut, date_fin):
+        """Comptes par employé sur la période (une ligne par matricule), agrégés côté serveur"""
+        query, params = self._employee_counts_query(date_debut, date_fin)
+
+        try:
+            with self.get_connection() as conn:
+                with conn.cursor() as cur:
+                    df = self._copy_to_frame(
+                        cur, query, params,
+                        dtype={'domaine': 'category'},
+                        parse_dates=['dernier_pointage', 'derniere_absence', 'dernier_retard'],
+                    )
+            return df
+
+        except Exception as e:
+            print(f"❌ Erreur agrégation par employé : {e}")
+            return pd.DataFrame(columns=[
+                'matricule', 'domaine', 'total', 'present', 'absent', 'late',
+                'dernier_pointage', 'derniere_absence', 'dernier_retard'
+            ])
+
+    def read_queries(self, date_debut, date_fin, watermark=None):
+        """
+        Requêtes de lecture émises par ce gestionnaire, avec des paramètres représentatifs.
+        Le delta part du repère actuel (voir get_watermark), comme une synchronisation du cache :
+        un repère à 0 sélectionnerait toute la table et justifierait un parcours séquentiel.
+        """
+        watermark = watermark or self.get_watermark()
+        return {
+            'get_attendance_data': self._attendance_query(date_debut, date_fin),
+            'get_attendance_data (jointure)': self._attendance_query(date_debut, date_fin, avec_jointure=True),
+            'get_attendance_since': self._since_query(watermark, date_debut, date_fin),
+            'get_monthly_counts': self._monthly_counts_query(date_debut, date_fin),
+            'get_daily_counts': self._daily_counts_query(date_debut, date_fin),
+            'get_employee_counts': self._employee_counts_query(date_debut, date_fin),
+        }
+
+    def get_table_structure(self):
+        """Structure des tables de pointage (colonnes et types)"""
+        try:
+            with self.get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT table_name AS "Table", column_name AS "Colonne",
+                               data_type AS "Type", is_nullable AS "Nullable"
+                        FROM information_schema.columns
+                        WHERE table_schema = current_schema()
+                          AND table_name IN ('attendance', 'workers',
+                                             'attendance_daily_summary', 'attendance_employee_daily')
+                        ORDER BY table_name, ordinal_position
+                    """)
+                    rows = cur.fetchall()
+                    columns = [d[0] for d in cur.description]
+            return pd.DataFrame(rows, columns=columns)
+        except Exception as e:
+            print(f"❌ Erreur lecture de la structure : {e}")
+            return pd.DataFrame()
+
     def test_connection(self):
         """Teste la connexion PostgreSQL"""
         try:
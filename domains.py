@@ -0,0 +1,134 @@
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+
+DOMAINS_CONFIG = 'domains_config.json'
+
+# Règles d'origine, utilisées si le fichier de configuration est absent
+DEFAULT_CONFIG = {
+    'defaut': 'Autre',
+    'domaines': [
+        {'nom': 'Chantre', 'prefixe': 'C', 'mots_cles': ['chantre', 'chantres']},
+        {'nom': 'Protocole', 'prefixe': 'P', 'mots_cles': ['protocole']},
+        {'nom': 'Régis', 'prefixe': 'R', 'mots_cles': ['régis', 'regis']},
+    ],
+}
+
+
+class DomainRegistry:
+    """
+    Correspondance préfixe de matricule → domaine, chargée une fois par processus depuis
+    DOMAINS_CONFIG. Fournit la classification unitaire, la classification vectorisée
+    (une évaluation par matricule distinct, résultat catégoriel) et l'expression SQL équivalente.
+    """
+
+    def __init__(self, domaines, defaut='Autre'):
+        self.default = defaut
+        self.names = []
+        self.prefixes = {}
+        self.keywords = {}
+
+        for domaine in domaines:
+            nom = domaine['nom']
+            prefixe = str(domaine['prefixe']).strip().upper()
+            if not prefixe.isalnum():
+                raise ValueError(f"Préfixe invalide pour le domaine {nom} : {prefixe!r}")
+            if prefixe in self.prefixes:
+                raise ValueError(f"Préfixe {prefixe} attribué à {self.prefixes[prefixe]} et à {nom}")
+            if nom == defaut or nom in self.names:
+                raise ValueError(f"Domaine en double : {nom}")
+
+            self.names.append(nom)
+            self.prefixes[prefixe] = nom
+            for mot in domaine.get('mots_cles') or [nom]:
+                self.keywords[mot.lower()] = nom
+
+        # Ordre des codes (AttendanceFrame, statistiques) : domaines configurés puis domaine par défaut
+        self.categories = self.names + [defaut]
+        self._index = {nom: code for code, nom in enumerate(self.categories)}
+        # Code par matricule déjà rencontré (ensemble borné par le nombre d'employés)
+        self._memo = {}
+        # Préfixes les plus longs d'abord : « CH » l'emporte sur « C »
+        self._ordered = sorted(self.prefixes.items(), key=lambda p: len(p[0]), reverse=True)
+        self.matricule_pattern = '(?:' + '|'.join(p for p, _ in self._ordered) + r')\d+'
+        self._matricule = re.compile(rf'^{self.matricule_pattern}$')
+
+    @classmethod
+    def load(cls, path=None):
+        """Registre décrit par le fichier JSON `path` (DOMAINS_CONFIG), règles d'origine s'il est absent"""
+        path = path or os.getenv('DOMAINS_CONFIG', DOMAINS_CONFIG)
+        config = DEFAULT_CONFIG
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                config = json.load(f)
+        return cls(config['domaines'], config.get('defaut', 'Autre'))
+
+    def classify(self, matricule):
+        """Domaine d'un matricule selon son préfixe"""
+        code = str(matricule).upper().strip()
+        for prefixe, domaine in self._ordered:
+            if code.startswith(prefixe):
+                return domaine
+        return self.default
+
+    def codes(self, matricules):
+        """Codes int8 (indices dans `categories`) d'une colonne de matricules, sans boucle par ligne"""
+        if isinstance(getattr(matricules, 'dtype', None), pd.CategoricalDtype):
+            values = matricules.cat if isinstance(matricules, pd.Series) else matricules
+            uniques, codes = values.categories, np.asarray(values.codes)
+        else:
+            codes, uniques = pd.factorize(np.asarray(matricules, dtype=object))
+
+        # Une entrée par matricule distinct ; matricule manquant (code -1) : domaine par défaut, en fin de table
+        uniques = np.asarray(uniques, dtype=object)
+        table = np.array([self._memo.get(m, -1) for m in uniques] + [len(self.names)], dtype=np.int8)
+        for position in np.flatnonzero(table[:-1] < 0):
+            matricule = uniques[position]
+            table[position] = self._memo[matricule] = self._index[self.classify(matricule)]
+        return table[codes]
+
+    def classify_series(self, matricules):
+        """Colonne catégorielle des domaines (catégories : `categories`)"""
+        domaines = pd.Categorical.from_codes(self.codes(matricules), categories=self.categories)
+        if isinstance(matricules, pd.Series):
+            return pd.Series(domaines, index=matricules.index, name='domaine')
+        return domaines
+
+    def sql(self, colonne):
+        """Expression SQL CASE équivalente à classify()"""
+        valeur = f"upper(btrim({colonne}))"
+        cas = "\n".join(
+            f"        WHEN left({valeur}, {len(prefixe)}) = '{prefixe}' THEN '{_quote(domaine)}'"
+            for prefixe, domaine in self._ordered
+        )
+        return f"""
+    CASE
+{cas}
+        ELSE '{_quote(self.default)}'
+    END"""
+
+    def is_matricule(self, matricule):
+        """Matricule au format attendu : un préfixe de domaine suivi de chiffres"""
+        return bool(self._matricule.match(str(matricule).upper().strip()))
+
+    def find_domain(self, texte):
+        """Premier domaine dont un mot-clé apparaît dans `texte`"""
+        texte = texte.lower()
+        for mot, domaine in self.keywords.items():
+            if mot in texte:
+                return domaine
+        return None
+
+
+def _quote(texte):
+    return texte.replace("'", "''")
+
+
+_registry = DomainRegistry.load()
+
+
+def domain_registry():
+    """Registre des domaines du processus"""
+    return _registry
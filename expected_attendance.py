@@ -0,0 +1,306 @@
+import argparse
+import os
+import threading
+import pandas as pd
+from datetime import datetime, timedelta
+from database import DatabaseManager
+from history_store import fin_mois
+from schema import EXPECTED_TABLES_SQL, EXPECTED_TRIGGERS_SQL
+
+# Jours ouvrés par défaut, numéros ISO (1 = lundi … 7 = dimanche)
+WORKING_DAYS = '1,2,3,4,5'
+
+# Dernier jour où chaque cible de connexion a été traitée par ce processus (materialize_daily)
+_materialise_jour = {}
+_materialise_lock = threading.Lock()
+
+# Effectif attendu : ouvriers actifs, de leur entrée (à défaut leur premier scan) à leur sortie
+_ROSTER_SQL = """
+    SELECT w.matricule, coalesce(w.date_entree, p.premier) AS debut, w.date_sortie AS fin
+    FROM workers w
+    LEFT JOIN (
+        SELECT employee_id, min(attendance_date) AS premier FROM attendance GROUP BY employee_id
+    ) p ON p.employee_id = w.matricule
+    WHERE w.actif
+"""
+
+# Couples (jour ouvré, ouvrier attendu) de la période
+_EXPECTED_SQL = f"""
+    SELECT c.jour, r.matricule
+    FROM work_calendar c
+    JOIN ({_ROSTER_SQL}) r ON r.debut <= c.jour AND (r.fin IS NULL OR r.fin >= c.jour)
+    WHERE c.ouvre AND c.jour BETWEEN %(debut)s AND %(fin)s
+"""
+
+# Anti-jointure : un attendu sans aucun pointage ce jour-là devient une absence implicite.
+# Un scan ultérieur la remplace (ATTENDANCE_UPSERT_SQL) ; les triggers de synthèse et de
+# notification répercutent l'insertion comme n'importe quel lot de pointages.
+_MATERIALIZE_SQL = f"""
+    INSERT INTO attendance (employee_id, attendance_date, status, created_at, updated_at, implicite)
+    SELECT e.matricule, e.jour, 'absent', now(), now(), true
+    FROM ({_EXPECTED_SQL}) e
+    WHERE NOT EXISTS (
+        SELECT 1 FROM attendance a WHERE a.employee_id = e.matricule AND a.attendance_date = e.jour
+    )
+    ON CONFLICT DO NOTHING
+"""
+
+_CALENDAR_UPDATE_SQL = f"""
+    UPDATE work_calendar c SET
+        attendus = coalesce(e.attendus, 0),
+        implicites = coalesce(i.implicites, 0),
+        materialise_le = now()
+    FROM work_calendar j
+    LEFT JOIN (
+        SELECT jour, count(*) AS attendus FROM ({_EXPECTED_SQL}) x GROUP BY jour
+    ) e ON e.jour = j.jour
+    LEFT JOIN (
+        SELECT attendance_date AS jour, count(*) AS implicites FROM attendance
+        WHERE implicite AND attendance_date BETWEEN %(debut)s AND %(fin)s
+        GROUP BY attendance_date
+    ) i ON i.jour = j.jour
+    WHERE c.jour = j.jour AND j.ouvre AND j.jour BETWEEN %(debut)s AND %(fin)s
+"""
+
+
+def working_days():
+    """Jours ISO ouvrés lus dans WORKING_DAYS (« 1,2,3,4,5 » : du lundi au vendredi)"""
+    jours = {int(j) for j in os.getenv('WORKING_DAYS', WORKING_DAYS).split(',') if j.strip()}
+    if not jours or not jours <= set(range(1, 8)):
+        raise ValueError(f"WORKING_DAYS invalide : {os.getenv('WORKING_DAYS')!r} (numéros ISO 1 à 7)")
+    return sorted(jours)
+
+
+def expected_installed(db):
+    """Indique si le calendrier et les colonnes des présences attendues sont installés"""
+    try:
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT to_regclass('work_calendar') IS NOT NULL
+                       AND EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'attendance_implicite_update')
+                """)
+                return cur.fetchone()[0]
+    except Exception as e:
+        print(f"⚠️ Présences attendues indisponibles : {e}")
+        return False
+
+
+def _fill_calendar(cur, debut, fin):
+    """Ajoute les jours manquants de la période, ouvrés selon WORKING_DAYS (jours existants conservés)"""
+    cur.execute("""
+        INSERT INTO work_calendar (jour, ouvre)
+        SELECT d::date, extract(isodow FROM d)::int = ANY(%s)
+        FROM generate_series(%s::date, %s::date, interval '1 day') d
+        ON CONFLICT (jour) DO NOTHING
+    """, (working_days(), debut, fin))
+    return cur.rowcount
+
+
+def install_expected(db=None):
+    """Crée le calendrier, les colonnes d'effectif et d'absence implicite, puis remplit le calendrier"""
+    db = db or DatabaseManager()
+    try:
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(EXPECTED_TABLES_SQL)
+                cur.execute(EXPECTED_TRIGGERS_SQL)
+                cur.execute("SELECT min(attendance_date) FROM attendance")
+                aujourd_hui = datetime.now().date()
+                debut = cur.fetchone()[0] or aujourd_hui
+                jours = _fill_calendar(cur, debut, datetime(aujourd_hui.year, 12, 31).date())
+        print(f"✅ Présences attendues installées ({jours} jours ajoutés au calendrier)")
+        return True, "✅ Présences attendues installées"
+    except Exception as e:
+        print(f"❌ Erreur installation des présences attendues : {e}")
+        return False, f"❌ Installation échouée : {e}"
+
+
+def _default_period(cur, debut, fin):
+    """
+    Jours clos seulement : les absences du jour ne sont connues qu'une fois la journée terminée.
+    Sans début, reprise au lendemain du dernier jour matérialisé (aucun jour oublié après
+    une interruption) ; à défaut, les EXPECTED_BACKFILL_DAYS derniers jours clos.
+    """
+    hier = datetime.now().date() - timedelta(days=1)
+    fin = min(fin or hier, hier)
+    if debut is None:
+        cur.execute("SELECT max(jour) FROM work_calendar WHERE materialise_le IS NOT NULL AND jour <= %s", (fin,))
+        dernier = cur.fetchone()[0]
+        if dernier:
+            debut = dernier + timedelta(days=1)
+        else:
+            debut = fin - timedelta(days=int(os.getenv('EXPECTED_BACKFILL_DAYS', '7')) - 1)
+    return debut, fin
+
+
+def materialize_absences(db=None, debut=None, fin=None):
+    """
+    Enregistre en une instruction les absences implicites des jours ouvrés de la période
+    (par défaut les jours clos depuis le dernier jour matérialisé) : effectif actif moins les
+    ouvriers ayant pointé. Idempotent ; les mois archivés par la rétention sont exclus.
+    Refusé sans la clé d'unicité (employé, jour) : un scan arrivé après coup s'ajouterait
+    à l'absence implicite au lieu de la remplacer, et la journée compterait deux fois.
+    """
+    db = db or DatabaseManager()
+
+    try:
+        if not db.unique_key_available():
+            print("❌ Absences implicites refusées : clé d'unicité (employé, jour) absente")
+            return False, "❌ Clé d'unicité absente (python schema.py dedupe-attendance)"
+
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                debut, fin = _default_period(cur, debut, fin)
+                cur.execute("SELECT to_regclass('attendance_archive') IS NOT NULL")
+                if cur.fetchone()[0]:
+                    cur.execute("SELECT max(mois) FROM attendance_archive")
+                    archive = cur.fetchone()[0]
+                    if archive:
+                        debut = max(debut, fin_mois(archive) + timedelta(days=1))
+                if debut > fin:
+                    return True, "ℹ️ Aucun jour clos à traiter"
+
+                _fill_calendar(cur, debut, fin)
+                periode = {'debut': debut, 'fin': fin}
+                cur.execute(_MATERIALIZE_SQL, periode)
+                absences = cur.rowcount
+                cur.execute(_CALENDAR_UPDATE_SQL, periode)
+                jours = cur.rowcount
+
+        # Mois clos déjà capturés dans l'historique local : à recharger
+        if absences:
+            db.invalidate_history(debut, fin)
+
+        print(f"✅ {absences} absence(s) implicite(s) enregistrée(s) sur {jours} jour(s) ouvré(s) ({debut} → {fin})")
+        return True, f"✅ {absences} absences implicites ({debut} → {fin})"
+
+    except Exception as e:
+        print(f"❌ Erreur calcul des absences implicites : {e}")
+        return False, f"❌ Calcul échoué : {e}"
+
+
+def materialize_daily(db=None):
+    """
+    Absences implicites des jours clos, une fois par jour et par processus : appelé à
+    chaque lecture, seul le premier passage d'une nouvelle journée interroge la base.
+    En cas d'échec du calcul, le passage suivant réessaie.
+    """
+    db = db or DatabaseManager()
+    cible, aujourd_hui = db._pool_key(), datetime.now().date()
+    with _materialise_lock:
+        if _materialise_jour.get(cible) == aujourd_hui:
+            return None
+        _materialise_jour[cible] = aujourd_hui
+
+    try:
+        pret = expected_installed(db) and db.unique_key_available()
+    except Exception as e:
+        print(f"⚠️ Clé d'unicité non vérifiée, absences implicites reportées : {e}")
+        pret = None
+    if not pret:
+        if pret is None:
+            with _materialise_lock:
+                _materialise_jour.pop(cible, None)
+        return None
+    success, message = materialize_absences(db)
+    if not success:
+        with _materialise_lock:
+            _materialise_jour.pop(cible, None)
+    return success, message
+
+
+def set_day(db=None, jour=None, ouvre=True, libelle=None):
+    """
+    Déclare un jour ouvré ou chômé (jour férié, fermeture). Un jour devenu chômé perd ses
+    absences implicites ; un jour clos redevenu ouvré est recalculé aussitôt.
+    """
+    db = db or DatabaseManager()
+    try:
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO work_calendar (jour, ouvre, libelle) VALUES (%s, %s, %s)
+                    ON CONFLICT (jour) DO UPDATE SET ouvre = EXCLUDED.ouvre, libelle = EXCLUDED.libelle
+                """, (jour, ouvre, libelle))
+                supprimees = 0
+                if not ouvre:
+                    cur.execute("DELETE FROM attendance WHERE attendance_date = %s AND implicite", (jour,))
+                    supprimees = cur.rowcount
+                    cur.execute(
+                        "UPDATE work_calendar SET attendus = NULL, implicites = NULL, materialise_le = NULL WHERE jour = %s",
+                        (jour,)
+                    )
+
+        if supprimees:
+            db.invalidate_history(jour)
+        if ouvre and jour < datetime.now().date():
+            return materialize_absences(db, jour, jour)
+
+        etat = "ouvré" if ouvre else "chômé"
+        print(f"✅ {jour} déclaré {etat}" + (f" ({supprimees} absences implicites retirées)" if supprimees else ""))
+        return True, f"✅ {jour} déclaré {etat}"
+
+    except Exception as e:
+        print(f"❌ Erreur mise à jour du calendrier : {e}")
+        return False, f"❌ Mise à jour échouée : {e}"
+
+
+def expected_summary(db=None, debut=None, fin=None):
+    """Calendrier de la période : jour, ouvré, libellé, ouvriers attendus, absences implicites"""
+    db = db or DatabaseManager()
+    colonnes = ['jour', 'ouvre', 'libelle', 'attendus', 'implicites', 'materialise_le']
+    fin = fin or datetime.now().date()
+    debut = debut or fin - timedelta(days=30)
+    try:
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT {', '.join(colonnes)} FROM work_calendar
+                    WHERE jour BETWEEN %s AND %s ORDER BY jour
+                """, (debut, fin))
+                return pd.DataFrame(cur.fetchall(), columns=colonnes)
+    except Exception as e:
+        print(f"❌ Erreur lecture du calendrier : {e}")
+        return pd.DataFrame(columns=colonnes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Présences attendues et absences implicites")
+    sub = parser.add_subparsers(dest="commande", required=True)
+    date_arg = lambda d: datetime.strptime(d, "%Y-%m-%d").date()
+
+    sub.add_parser("install", help="Installe le calendrier et les colonnes d'effectif")
+
+    run = sub.add_parser("run", help="Enregistre les absences implicites des jours clos")
+    run.add_argument("--debut", type=date_arg)
+    run.add_argument("--fin", type=date_arg)
+
+    day = sub.add_parser("day", help="Déclare un jour ouvré ou chômé")
+    day.add_argument("jour", type=date_arg)
+    etat = day.add_mutually_exclusive_group(required=True)
+    etat.add_argument("--ouvre", dest="ouvre", action="store_true")
+    etat.add_argument("--chome", dest="ouvre", action="store_false")
+    day.add_argument("--libelle", default=None)
+
+    calendar = sub.add_parser("list", help="Affiche le calendrier et les effectifs attendus")
+    calendar.add_argument("--debut", type=date_arg)
+    calendar.add_argument("--fin", type=date_arg)
+
+    args = parser.parse_args()
+
+    if args.commande == "install":
+        success, _ = install_expected()
+    elif args.commande == "run":
+        success, _ = materialize_absences(debut=args.debut, fin=args.fin)
+    elif args.commande == "day":
+        success, _ = set_day(jour=args.jour, ouvre=args.ouvre, libelle=args.libelle)
+    else:
+        print(expected_summary(debut=args.debut, fin=args.fin).to_string(index=False))
+        success = True
+
+    raise SystemExit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
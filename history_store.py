@@ -0,0 +1,153 @@
+import os
+import threading
+from datetime import date, timedelta
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+
+def debut_mois(jour):
+    """Premier jour du mois d'une date"""
+    return jour.replace(day=1)
+
+
+def fin_mois(jour):
+    """Dernier jour du mois d'une date"""
+    return (debut_mois(jour) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+
+class HistoryStore:
+    """
+    Historique local des mois clos, un fichier Parquet par mois (month=AAAA-MM/).
+    Les pointages d'un mois clos ne changent plus : ils sont lus sur disque
+    au lieu d'être retéléchargés depuis PostgreSQL à chaque vue.
+    """
+
+    compression = 'snappy'
+    label = "l'historique"
+
+    def __init__(self, directory=None, grace_days=None):
+        if directory is None:
+            directory = os.getenv('HISTORY_DIR', 'history')
+        if grace_days is None:
+            grace_days = int(os.getenv('HISTORY_GRACE_DAYS', '3'))
+
+        self.directory = directory
+        # Délai après la fin du mois avant de le considérer clos (saisies tardives)
+        self.grace_days = grace_days
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        """Historique actif : pyarrow installé et répertoire configuré"""
+        return PARQUET_AVAILABLE and bool(self.directory)
+
+    def month_path(self, mois):
+        """Chemin du fichier Parquet d'un mois (date du premier jour)"""
+        return os.path.join(self.directory, f"month={mois:%Y-%m}", "attendance.parquet")
+
+    def is_closed(self, mois, aujourd_hui=None):
+        """Un mois est clos une fois sa fin passée depuis plus de `grace_days` jours"""
+        aujourd_hui = aujourd_hui or date.today()
+        return fin_mois(mois) + timedelta(days=self.grace_days) < aujourd_hui
+
+    def split(self, date_debut, date_fin):
+        """
+        Découpe une période en mois clos (lus depuis l'historique)
+        et en plage ouverte (lue depuis PostgreSQL, ou None).
+        """
+        mois_clos = []
+        mois = debut_mois(date_debut)
+        while mois <= date_fin and self.is_closed(mois):
+            mois_clos.append(mois)
+            mois = fin_mois(mois) + timedelta(days=1)
+
+        if mois > date_fin:
+            return mois_clos, None
+        return mois_clos, (max(mois, date_debut), date_fin)
+
+    def read(self, mois):
+        """Pointages d'un mois depuis l'historique, ou None s'il n'est pas encore capturé"""
+        path = self.month_path(mois)
+        if not os.path.exists(path):
+            return None
+        try:
+            return pd.read_parquet(path)
+        except Exception as e:
+            print(f"⚠️ Historique illisible pour {mois:%Y-%m}, relecture depuis la base : {e}")
+            return None
+
+    def write(self, mois, df):
+        """Capture les pointages d'un mois clos (écriture atomique)"""
+        path = self.month_path(mois)
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            df.to_parquet(tmp_path, index=False, compression=self.compression)
+            os.replace(tmp_path, path)
+        print(f"🗄️ Mois {mois:%Y-%m} archivé dans {self.label} ({len(df)} pointages).")
+
+    def invalidate_month(self, mois):
+        """Supprime la capture d'un mois (corrigé a posteriori) : elle sera refaite au prochain accès"""
+        path = self.month_path(debut_mois(mois))
+        with self._lock:
+            if os.path.exists(path):
+                os.remove(path)
+                return True
+        return False
+
+
+class ArchiveStore(HistoryStore):
+    """
+    Archives de rétention (retention.py) : les mois sortis de PostgreSQL, un fichier Parquet
+    compressé (zstd) par mois. Contrairement à l'historique, c'est la seule copie des
+    pointages : un mois archivé n'est jamais invalidé et prime sur la base.
+    """
+
+    compression = 'zstd'
+    label = "les archives"
+
+    def __init__(self, directory=None):
+        if directory is None:
+            directory = os.getenv('ARCHIVE_DIR', 'archive')
+        super().__init__(directory, grace_days=0)
+
+    def persistence(self):
+        """
+        Vérifie que ARCHIVE_DIR survit à un redéploiement avant d'y verser la seule copie
+        des pointages : répertoire existant, sur un autre disque que l'application (le disque
+        de l'application est éphémère sur Render) et déclaré persistant (ARCHIVE_PERSISTENT=1).
+        Retourne (persistant, raison).
+        """
+        if not self.enabled:
+            return False, "archives désactivées (ARCHIVE_DIR vide ou pyarrow absent)"
+        if not os.path.isdir(self.directory):
+            return False, f"{self.directory} n'existe pas (monter le disque persistant)"
+        application = os.path.dirname(os.path.abspath(__file__))
+        if os.stat(self.directory).st_dev == os.stat(application).st_dev:
+            return False, f"{self.directory} est sur le disque de l'application (éphémère)"
+        if os.getenv('ARCHIVE_PERSISTENT', '').lower() not in ('1', 'true', 'oui'):
+            return False, f"{self.directory} n'est pas déclaré persistant (ARCHIVE_PERSISTENT=1)"
+        return True, f"{self.directory} persistant"
+
+    def is_closed(self, mois, aujourd_hui=None):
+        """Un mois est « clos » pour l'archive dès qu'il y est présent"""
+        return self.enabled and os.path.exists(self.month_path(debut_mois(mois)))
+
+    def months(self):
+        """Mois archivés (dates du premier jour), triés"""
+        if not self.enabled or not os.path.isdir(self.directory):
+            return []
+        mois = []
+        for name in os.listdir(self.directory):
+            if name.startswith("month=") and os.path.exists(os.path.join(self.directory, name, "attendance.parquet")):
+                mois.append(date.fromisoformat(f"{name[6:]}-01"))
+        return sorted(mois)
+
+    def invalidate_month(self, mois):
+        # Seule copie des pointages : jamais supprimée par les invalidations de cache
+        return False
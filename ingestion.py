@@ -0,0 +1,281 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from database import DatabaseManager
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+# Taille au-delà de laquelle un journal entièrement confirmé est vidé
+SPILL_COMPACT_BYTES = 1024 * 1024
+
+
+class ScanQueue:
+    """
+    File d'écriture différée des scans QR : l'enregistrement d'un badge se réduit à un
+    ajout en mémoire, un thread regroupe les scans en lots (taille ou délai) pour
+    insert_attendance_batch. Chaque scan est d'abord écrit dans un journal local
+    (JSONL en ajout seul) et rejoué au démarrage s'il n'a pas été confirmé.
+    """
+
+    def __init__(self, db=None, batch_size=None, flush_interval=None, capacity=None, spill_path=None):
+        self.db = db or DatabaseManager()
+        self.batch_size = batch_size or int(os.getenv('SCAN_BATCH_SIZE', '500'))
+        self.flush_interval = flush_interval or float(os.getenv('SCAN_FLUSH_INTERVAL', '0.5'))
+        self.capacity = capacity or int(os.getenv('SCAN_QUEUE_CAPACITY', '10000'))
+        self.spill_path = spill_path or os.getenv('SCAN_SPILL_FILE', 'scans_spill.jsonl')
+
+        self._queue = queue.Queue(maxsize=self.capacity)
+        self._spill_lock = threading.Lock()
+        self._spill = None
+        self._unacked = 0
+        self._parked = []  # scans refusés (file pleine), rejoués au prochain démarrage
+        self._replay = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()  # un seul thread d'écriture par journal
+        self.stats = {'enqueued': 0, 'flushed': 0, 'rejected': 0, 'batches': 0}
+
+    # --- Journal local ----------------------------------------------------
+
+    def _write_spill(self, record):
+        """Ajoute un enregistrement au journal et le force sur disque"""
+        with self._spill_lock:
+            if 'ack' in record:
+                self._unacked -= len(record['ack'])
+            else:
+                self._unacked += 1
+
+            if self._unacked == 0 and self._spill.tell() > SPILL_COMPACT_BYTES:
+                # Plus aucun scan en attente d'écriture : le journal ne garde que les scans refusés
+                self._spill.truncate(0)
+                self._spill.seek(0)
+                for parked in self._parked:
+                    self._spill.write(json.dumps(parked, ensure_ascii=False) + "\n")
+            else:
+                self._spill.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._spill.flush()
+            os.fsync(self._spill.fileno())
+
+    def _park(self, record):
+        """
+        Scan journalisé mais refusé par la file : il ne sera pas confirmé par ce processus.
+        Il sort du compte des scans en attente (sinon le journal ne serait plus jamais
+        compacté) et est conservé à chaque compaction pour le rejeu au prochain démarrage.
+        """
+        with self._spill_lock:
+            self._unacked -= 1
+            self._parked.append(record)
+
+    def _close_spill(self):
+        """Ferme le journal (une seule fois, par stop() ou par le thread d'écriture)"""
+        with self._spill_lock:
+            if self._spill is not None and not self._spill.closed:
+                self._spill.close()
+
+    def _pending_from_spill(self):
+        """Scans du journal sans confirmation d'écriture en base"""
+        if not os.path.exists(self.spill_path):
+            return []
+
+        scans, acked = {}, set()
+        with open(self.spill_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Dernière ligne tronquée par un arrêt brutal
+                    continue
+                if 'ack' in record:
+                    acked.update(record['ack'])
+                else:
+                    scans[record['scan']] = record
+        return [record for scan_id, record in scans.items() if scan_id not in acked]
+
+    def _compact_spill(self, pending):
+        """Réécrit le journal avec les seuls scans en attente (écriture atomique)"""
+        tmp_path = f"{self.spill_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in pending:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.spill_path)
+
+    # --- Cycle de vie -----------------------------------------------------
+
+    def start(self):
+        """Rejoue les scans non confirmés du journal puis démarre le thread d'écriture"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return self
+
+            pending = self._pending_from_spill()
+            self._compact_spill(pending)
+            self._spill = open(self.spill_path, 'a', encoding='utf-8')
+            self._unacked = len(pending)
+            self._parked = []
+            self._stop.clear()
+
+            if pending:
+                # Rejoués par le thread d'écriture avant les nouveaux scans
+                print(f"♻️ Rejeu de {len(pending)} scan(s) non confirmé(s)")
+                self._replay = pending
+
+            self._thread = threading.Thread(target=self._run, name="scan-queue", daemon=True)
+            self._thread.start()
+            return self
+
+    def stop(self, timeout=10):
+        """
+        Vide la file puis arrête le thread d'écriture. Si le thread écrit encore au bout de
+        `timeout` secondes (nouvel essai après une panne de la base), c'est lui qui fermera
+        le journal en terminant : ses confirmations y sont encore écrites.
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print(f"⚠️ Écriture des scans encore en cours après {timeout}s : journal laissé ouvert")
+            return
+        self._thread = None
+        self._close_spill()
+
+    # --- Enregistrement ---------------------------------------------------
+
+    def enqueue(self, matricule, statut="present", horodatage=None, nom=None, poste=None, timeout=None):
+        """
+        Enregistre un scan (journal local puis file en mémoire).
+        Si la file est pleine, attend au plus `timeout` secondes (None : sans limite).
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self.start()
+
+        record = {
+            'scan': uuid.uuid4().hex,
+            'matricule': str(matricule or "").strip().upper(),
+            'statut': (statut or "present").strip().lower(),
+            'horodatage': (horodatage or datetime.now()).isoformat(),
+            'nom': nom,
+            'poste': poste,
+        }
+        if not record['matricule']:
+            return False, "❌ Scan invalide : matricule vide"
+
+        self._write_spill(record)
+        try:
+            self._queue.put(record, timeout=timeout)
+        except queue.Full:
+            # Le scan reste dans le journal : il sera rejoué au prochain démarrage
+            self._park(record)
+            self.stats['rejected'] += 1
+            return False, f"⏳ File de scans saturée, scan conservé localement : {record['matricule']}"
+
+        self.stats['enqueued'] += 1
+        return True, f"✅ Scan reçu : {record['matricule']}"
+
+    def flush(self, timeout=None):
+        """Attend que tous les scans reçus soient écrits en base"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    # --- Thread d'écriture ------------------------------------------------
+
+    def _next_batch(self):
+        """Lot suivant : dès `batch_size` scans ou `flush_interval` secondes après le premier"""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        try:
+            while self._replay:
+                batch, self._replay = self._replay[:self.batch_size], self._replay[self.batch_size:]
+                self._flush(batch)
+
+            while not (self._stop.is_set() and self._queue.empty()):
+                batch = self._next_batch()
+                if not batch:
+                    continue
+                try:
+                    self._flush(batch)
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+        finally:
+            # Arrêt demandé : stop() n'a pas pu fermer le journal si le thread écrivait encore
+            if self._stop.is_set():
+                self._close_spill()
+
+    def _flush(self, batch):
+        """Écrit un lot en base ; réessaie tant que la base est injoignable"""
+        pointages = [
+            (r['matricule'], r['statut'], r['horodatage'], r['nom'], r['poste']) for r in batch
+        ]
+        delay = 1
+        while True:
+            resultats = self.db.insert_attendance_batch(pointages)
+            if any(ok for ok, _ in resultats) or self.db.test_connection()[0]:
+                break
+            # Base injoignable : le lot est conservé et réessayé (rejoué au redémarrage si on s'arrête)
+            if self._stop.is_set():
+                print(f"⚠️ Arrêt avec {len(batch)} scan(s) non écrits, conservés dans {self.spill_path}")
+                return
+            print(f"⚠️ Écriture du lot impossible, nouvel essai dans {delay}s : {resultats[0][1]}")
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+
+        # Les scans refusés par la base (données invalides) ne sont pas réessayés
+        for record, (ok, message) in zip(batch, resultats):
+            if not ok:
+                print(f"❌ Scan rejeté ({record['matricule']}) : {message}")
+        self._write_spill({'ack': [r['scan'] for r in batch]})
+        self.stats['flushed'] += len(batch)
+        self.stats['batches'] += 1
+
+
+def shared_scan_queue(db=None):
+    """File de scans partagée par le processus pour la cible de connexion de `db`"""
+    db = db or DatabaseManager()
+    key = db._pool_key()
+
+    with _queues_lock:
+        scan_queue = _queues.get(key)
+        if scan_queue is None:
+            scan_queue = ScanQueue(db).start()
+            _queues[key] = scan_queue
+        return scan_queue
+
+
+def stop_all_queues():
+    """Vide et arrête toutes les files du processus"""
+    with _queues_lock:
+        queues = list(_queues.values())
+        _queues.clear()
+    for scan_queue in queues:
+        scan_queue.stop()
+
+
+atexit.register(stop_all_queues)
@@ -0,0 +1,131 @@
+import json
+import select
+import threading
+import time
+from datetime import date
+from database import DatabaseManager
+
+# Canal alimenté par les triggers attendance_notify_* (voir schema.py)
+CHANNEL = 'attendance_changes'
+
+
+class ChangeListener:
+    """
+    Écoute les notifications PostgreSQL (LISTEN) émises à chaque écriture dans `attendance`
+    et prévient les abonnés avec la plage de dates et les matricules touchés.
+    Un abonné reçoit (None, None, None) quand l'étendue des changements est inconnue
+    (reconnexion : des notifications ont pu être perdues). Les abonnés aux retraits
+    (subscribe_removals) ne sont prévenus que des suppressions et des changements de date.
+    """
+
+    def __init__(self, db=None, channel=CHANNEL, reconnect_delay=5):
+        self.db = db or DatabaseManager()
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+
+        self._subscribers = []
+        self._removal_subscribers = []
+        self._version = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self.connected = False
+
+    def subscribe(self, callback):
+        """Abonne `callback(debut, fin, matricules)` aux changements"""
+        self._subscribers.append(callback)
+        return callback
+
+    def subscribe_removals(self, callback):
+        """
+        Abonne `callback(debut, fin, matricules)` aux retraits de lignes : suppressions et mises
+        à jour qui changent la date de pointage, invisibles à une synchronisation par delta
+        """
+        self._removal_subscribers.append(callback)
+        return callback
+
+    @property
+    def version(self):
+        """Compteur incrémenté à chaque changement notifié"""
+        with self._cond:
+            return self._version
+
+    def wait_for_change(self, version, timeout=None):
+        """Attend que la version dépasse `version` ; True si un changement est survenu"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._version > version, timeout)
+
+    def start(self):
+        """Démarre le thread d'écoute"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="attendance-listener", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Arrête l'écoute"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.reconnect_delay + 1)
+            self._thread = None
+
+    def _publish(self, debut, fin, matricules, retrait=False):
+        """Incrémente la version puis prévient les abonnés (et ceux des retraits s'il y a lieu)"""
+        with self._cond:
+            self._version += 1
+            self._cond.notify_all()
+        # Étendue inconnue : des retraits ont pu être perdus
+        retrait = retrait or debut is None
+        subscribers = self._removal_subscribers + self._subscribers if retrait else self._subscribers
+        for callback in subscribers:
+            try:
+                callback(debut, fin, matricules)
+            except Exception as e:
+                print(f"⚠️ Abonné aux changements en erreur : {e}")
+
+    def _dispatch(self, payload):
+        """Décode une notification {operation, deplace, debut, fin, matricules} et la publie"""
+        try:
+            change = json.loads(payload)
+            debut = date.fromisoformat(change['debut'])
+            fin = date.fromisoformat(change['fin'])
+            matricules = change.get('matricules')
+            retrait = change.get('operation') == 'DELETE' or bool(change.get('deplace'))
+        except Exception as e:
+            print(f"⚠️ Notification illisible ({payload!r}) : {e}")
+            debut = fin = matricules = None
+            retrait = True
+        self._publish(debut, fin, matricules, retrait)
+
+    def _listen(self, resync):
+        """Session d'écoute sur une connexion dédiée (hors pool)"""
+        conn = self.db.dedicated_connection()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {self.channel}")
+            self.connected = True
+            print(f"📡 Écoute des changements sur « {self.channel} »")
+            if resync:
+                # Des notifications ont pu être perdues pendant la coupure
+                self._publish(None, None, None)
+
+            while not self._stop.is_set():
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self._dispatch(conn.notifies.pop(0).payload)
+        finally:
+            self.connected = False
+            conn.close()
+
+    def _run(self):
+        resync = False
+        while not self._stop.is_set():
+            try:
+                self._listen(resync)
+            except Exception as e:
+                resync = True
+                print(f"⚠️ Écoute des changements interrompue : {e}")
+                time.sleep(self.reconnect_delay)
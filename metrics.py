@@ -0,0 +1,272 @@
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+import pandas as pd
+
+# Appel du DatabaseManager en cours dans ce thread / cette tâche (les appels imbriqués s'y ajoutent)
+_current_call = ContextVar('db_current_call', default=None)
+# Appelant transmis aux threads de lecture parallèle (voir async_loader.py)
+_current_caller = ContextVar('db_current_caller', default=None)
+
+# Modules d'infrastructure ignorés pour désigner l'appelant (onglet, chatbot, alertes...)
+INFRA_MODULES = (
+    'database', 'metrics', 'async_loader', 'data_cache', 'repository', 'worker_directory',
+    'history_store', 'attendance_frame', 'asyncio', 'threading', 'concurrent', 'contextlib',
+    'functools', 'streamlit',
+)
+
+# Bornes supérieures (ms) des tranches de l'histogramme de latence
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float('inf')]
+
+
+class QueryCall:
+    """Mesures d'un appel du DatabaseManager"""
+
+    __slots__ = ('method', 'caller', 'started', 'latency', 'rows', 'bytes', 'pool_wait', 'error')
+
+    def __init__(self, method, caller):
+        self.method = method
+        self.caller = caller
+        self.started = time.time()
+        self.latency = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.pool_wait = 0.0
+        self.error = None
+
+
+def find_caller():
+    """Premier module.fonction hors infrastructure dans la pile d'appels"""
+    caller = _current_caller.get()
+    if caller:
+        return caller
+
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if module.split('.')[0] not in INFRA_MODULES:
+            name = 'app' if module == '__main__' else module
+            return f"{name}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "inconnu"
+
+
+@contextmanager
+def caller_scope():
+    """Fige l'appelant courant pour les appels lancés dans d'autres threads (asyncio.to_thread)"""
+    token = _current_caller.set(find_caller())
+    try:
+        yield
+    finally:
+        _current_caller.reset(token)
+
+
+def add_pool_wait(seconds):
+    """Attente d'une connexion du pool, imputée à l'appel en cours"""
+    call = _current_call.get()
+    if call is not None:
+        call.pool_wait += seconds
+
+
+def add_transfer(nbytes):
+    """Octets reçus de PostgreSQL (flux COPY), imputés à l'appel en cours"""
+    call = _current_call.get()
+    if call is not None:
+        call.bytes += nbytes
+
+
+def _result_rows(result):
+    """Nombre de lignes d'un résultat (DataFrame, liste)"""
+    if isinstance(result, (pd.DataFrame, list)):
+        return len(result)
+    return 0
+
+
+class QueryMetrics:
+    """
+    Mesures en mémoire des appels du DatabaseManager : fenêtre glissante des `window`
+    derniers appels par méthode (percentiles, histogramme) et cumuls par appelant.
+    """
+
+    def __init__(self, window=None):
+        self.window = window or int(os.getenv('METRICS_WINDOW', '1000'))
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Remet toutes les mesures à zéro"""
+        with self._lock:
+            self._recent = defaultdict(lambda: deque(maxlen=self.window))
+            self._callers = defaultdict(lambda: {'appels': 0, 'erreurs': 0, 'ms': 0.0, 'lignes': 0, 'octets': 0})
+            self._since = datetime.now()
+
+    def record(self, call):
+        """Enregistre un appel terminé"""
+        with self._lock:
+            self._recent[call.method].append(call)
+            totals = self._callers[(call.caller, call.method)]
+            totals['appels'] += 1
+            totals['erreurs'] += call.error is not None
+            totals['ms'] += call.latency * 1000
+            totals['lignes'] += call.rows
+            totals['octets'] += call.bytes
+
+    def _calls(self, method=None):
+        with self._lock:
+            if method is not None:
+                return list(self._recent.get(method, ()))
+            return [call for calls in self._recent.values() for call in calls]
+
+    def summary(self):
+        """Par méthode, sur la fenêtre glissante : appels, erreurs, percentiles, lignes, octets, attente pool"""
+        rows = []
+        with self._lock:
+            recent = {method: list(calls) for method, calls in self._recent.items()}
+        for method, calls in recent.items():
+            latences = pd.Series([c.latency * 1000 for c in calls])
+            rows.append({
+                'Méthode': method,
+                'Appels': len(calls),
+                'Erreurs': sum(c.error is not None for c in calls),
+                'p50 (ms)': round(latences.quantile(0.50), 2),
+                'p95 (ms)': round(latences.quantile(0.95), 2),
+                'p99 (ms)': round(latences.quantile(0.99), 2),
+                'Max (ms)': round(latences.max(), 2),
+                'Lignes': sum(c.rows for c in calls),
+                'Octets': sum(c.bytes for c in calls),
+                'Attente pool (ms)': round(sum(c.pool_wait for c in calls) * 1000, 2),
+            })
+        columns = ['Méthode', 'Appels', 'Erreurs', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)', 'Max (ms)',
+                   'Lignes', 'Octets', 'Attente pool (ms)']
+        return pd.DataFrame(rows, columns=columns).sort_values('p95 (ms)', ascending=False, ignore_index=True)
+
+    def by_caller(self):
+        """Cumuls depuis le démarrage par appelant (module.fonction) et méthode, du plus coûteux au moins coûteux"""
+        with self._lock:
+            rows = [
+                {'Appelant': caller, 'Méthode': method, **totals}
+                for (caller, method), totals in self._callers.items()
+            ]
+        df = pd.DataFrame(rows, columns=['Appelant', 'Méthode', 'appels', 'erreurs', 'ms', 'lignes', 'octets'])
+        df = df.rename(columns={
+            'appels': 'Appels', 'erreurs': 'Erreurs', 'ms': 'Temps total (ms)', 'lignes': 'Lignes', 'octets': 'Octets'
+        })
+        df['Temps total (ms)'] = df['Temps total (ms)'].round(2)
+        return df.sort_values('Temps total (ms)', ascending=False, ignore_index=True)
+
+    def histogram(self, method=None):
+        """Histogramme des latences de la fenêtre glissante (une méthode ou toutes)"""
+        latences = [c.latency * 1000 for c in self._calls(method)]
+        counts = pd.cut(
+            pd.Series(latences, dtype='float64'), [0] + LATENCY_BUCKETS_MS, right=True, include_lowest=True
+        ).value_counts(sort=False)
+        labels = [f"≤ {b:g} ms" if b != float('inf') else f"> {LATENCY_BUCKETS_MS[-2]:g} ms" for b in LATENCY_BUCKETS_MS]
+        return pd.DataFrame({'Tranche': labels, 'Appels': counts.values})
+
+    def snapshot(self):
+        """Toutes les mesures sous forme sérialisable (export JSON)"""
+        histograms = {}
+        for method in self.summary()['Méthode']:
+            histogram = self.histogram(method)
+            histograms[method] = {t: int(n) for t, n in zip(histogram['Tranche'], histogram['Appels'])}
+        return {
+            'depuis': self._since.isoformat(timespec='seconds'),
+            'genere_le': datetime.now().isoformat(timespec='seconds'),
+            'fenetre': self.window,
+            'methodes': self.summary().to_dict('records'),
+            'appelants': self.by_caller().to_dict('records'),
+            'histogrammes': histograms,
+        }
+
+    def to_json(self):
+        """Export JSON des mesures"""
+        # Scalaires numpy (pandas) convertis en types Python
+        return json.dumps(
+            self.snapshot(), ensure_ascii=False, indent=2,
+            default=lambda v: v.item() if hasattr(v, 'item') else str(v)
+        )
+
+
+_registry = QueryMetrics()
+
+
+def query_metrics():
+    """Mesures des appels du DatabaseManager pour tout le processus"""
+    return _registry
+
+
+def _instrument(method):
+    """Mesure un appel (latence, lignes, octets, attente pool, appelant) ; les appels imbriqués sont inclus"""
+    name = method.__name__
+
+    if inspect.isgeneratorfunction(method):
+        @functools.wraps(method)
+        def generator_wrapper(*args, **kwargs):
+            if _current_call.get() is not None:
+                yield from method(*args, **kwargs)
+                return
+
+            call = QueryCall(name, find_caller())
+            gen = method(*args, **kwargs)
+            try:
+                while True:
+                    # L'appel n'est actif que pendant la production d'un bloc, pas chez le consommateur
+                    token = _current_call.set(call)
+                    start = time.perf_counter()
+                    try:
+                        chunk = next(gen)
+                    except StopIteration:
+                        return
+                    finally:
+                        call.latency += time.perf_counter() - start
+                        _current_call.reset(token)
+                    call.rows += _result_rows(chunk)
+                    yield chunk
+            except Exception as e:
+                call.error = str(e)
+                raise
+            finally:
+                gen.close()
+                _registry.record(call)
+
+        return generator_wrapper
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if _current_call.get() is not None:
+            return method(*args, **kwargs)
+
+        call = QueryCall(name, find_caller())
+        token = _current_call.set(call)
+        start = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+            call.rows = _result_rows(result)
+            return result
+        except Exception as e:
+            call.error = str(e)
+            raise
+        finally:
+            call.latency = time.perf_counter() - start
+            _current_call.reset(token)
+            _registry.record(call)
+
+    return wrapper
+
+
+def instrument(*exclude):
+    """Décorateur de classe : mesure toutes les méthodes publiques, sauf celles de `exclude`"""
+    def decorate(cls):
+        for attr, value in list(vars(cls).items()):
+            if not attr.startswith('_') and attr not in exclude and inspect.isfunction(value):
+                setattr(cls, attr, _instrument(value))
+        return cls
+    return decorate
@@ -0,0 +1,364 @@
+import argparse
+import os
+import re
+import pandas as pd
+from datetime import date, datetime, timedelta
+from database import DatabaseManager
+from history_store import debut_mois, fin_mois
+from schema import ARCHIVE_SCHEMA, ROLLUP_TRIGGERS_SQL, NOTIFY_TRIGGERS_SQL, EXPECTED_TRIGGERS_SQL
+
+# Ancienne table conservée après la migration, le temps de vérifier
+LEGACY_TABLE = 'attendance_unpartitioned'
+
+# Reçoit les pointages d'un mois sans partition : un scan n'est jamais refusé.
+# ensure_partitions les déplace dans la partition du mois dès qu'elle est créée.
+DEFAULT_PARTITION = 'attendance_default'
+
+_BOUNDS = re.compile(r"FROM \('(\d{4}-\d{2}-\d{2})'\) TO \('(\d{4}-\d{2}-\d{2})'\)")
+
+
+def partition_name(mois):
+    """Nom de la partition d'un mois : attendance_AAAA_MM"""
+    return f"attendance_{mois:%Y_%m}"
+
+
+def _mois_suivant(mois):
+    return fin_mois(mois) + timedelta(days=1)
+
+
+def _create_partition_sql(mois):
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(mois)} PARTITION OF attendance "
+        f"FOR VALUES FROM ('{mois:%Y-%m-%d}') TO ('{_mois_suivant(mois):%Y-%m-%d}')"
+    )
+
+
+def _mois_par_defaut(cur):
+    """Mois des pointages rangés dans la partition par défaut"""
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (f"public.{DEFAULT_PARTITION}",))
+    if not cur.fetchone()[0]:
+        return []
+    cur.execute(
+        f"SELECT DISTINCT date_trunc('month', attendance_date)::date FROM {DEFAULT_PARTITION} ORDER BY 1"
+    )
+    return [row[0] for row in cur.fetchall()]
+
+
+def _drain_default(cur, mois, partition):
+    """
+    Déplace dans `partition` les pointages du mois rangés dans la partition par défaut.
+    Instructions adressées aux partitions, pas à `attendance` : les triggers de synthèse
+    et de notification ne se déclenchent pas (les pointages sont déjà comptés).
+    """
+    cur.execute(f"""
+        WITH deplaces AS (
+            DELETE FROM {DEFAULT_PARTITION} WHERE attendance_date BETWEEN %s AND %s RETURNING *
+        )
+        INSERT INTO {partition} SELECT * FROM deplaces
+    """, (mois, fin_mois(mois)))
+    return cur.rowcount
+
+
+def _create_partition(cur, mois, depuis_defaut=False):
+    """
+    Crée la partition d'un mois. Si la partition par défaut contient déjà des pointages
+    du mois, la partition est créée à part, remplie puis rattachée (PostgreSQL refuse
+    une partition dont les lignes sont encore dans la partition par défaut).
+    Retourne le nombre de pointages repris de la partition par défaut.
+    """
+    if not depuis_defaut:
+        cur.execute(_create_partition_sql(mois))
+        return 0
+
+    name = partition_name(mois)
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (f"public.{name}",))
+    if cur.fetchone()[0]:
+        return _drain_default(cur, mois, name)
+
+    cur.execute(f"LOCK TABLE {DEFAULT_PARTITION} IN ACCESS EXCLUSIVE MODE")
+    cur.execute(f"CREATE TABLE {name} (LIKE attendance INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    lignes = _drain_default(cur, mois, name)
+    cur.execute(
+        f"ALTER TABLE attendance ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{mois:%Y-%m-%d}') TO ('{_mois_suivant(mois):%Y-%m-%d}')"
+    )
+    return lignes
+
+
+def list_partitions(db=None):
+    """Partitions rattachées à `attendance` : nom, bornes, lignes estimées, taille"""
+    db = db or DatabaseManager()
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT c.relname, pg_get_expr(c.relpartbound, c.oid),
+                       greatest(c.reltuples, 0)::bigint, pg_total_relation_size(c.oid)
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = to_regclass('attendance')
+                ORDER BY c.relname
+            """)
+            rows = cur.fetchall()
+
+    partitions = []
+    for name, bounds, lignes, taille in rows:
+        match = _BOUNDS.search(bounds or "")
+        partitions.append({
+            'partition': name,
+            'debut': date.fromisoformat(match.group(1)) if match else None,
+            'fin': date.fromisoformat(match.group(2)) - timedelta(days=1) if match else None,
+            'lignes': lignes,
+            'taille_mo': round(taille / 1024 / 1024, 2),
+        })
+    return pd.DataFrame(partitions, columns=['partition', 'debut', 'fin', 'lignes', 'taille_mo'])
+
+
+def migrate_to_partitions(db=None, months_ahead=None):
+    """
+    Migration unique : recrée `attendance` partitionnée par mois (RANGE sur attendance_date).
+    Les lignes, les identifiants, la séquence, les index et les triggers sont repris ;
+    l'ancienne table est renommée LEGACY_TABLE. Les écritures sont bloquées pendant la copie.
+    Refusée si des pointages n'ont pas de date (la clé de partition est obligatoire).
+    """
+    db = db or DatabaseManager()
+    months_ahead = months_ahead if months_ahead is not None else int(os.getenv('PARTITION_MONTHS_AHEAD', '3'))
+
+    if db.attendance_partitioned():
+        return True, "ℹ️ La table attendance est déjà partitionnée"
+
+    try:
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("LOCK TABLE attendance IN ACCESS EXCLUSIVE MODE")
+
+                cur.execute("SELECT pg_get_serial_sequence('attendance', 'id')")
+                sequence = cur.fetchone()[0]
+                cur.execute("""
+                    SELECT i.relname, pg_get_indexdef(i.oid)
+                    FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+                    WHERE x.indrelid = 'attendance'::regclass AND NOT x.indisprimary
+                """)
+                indexes = cur.fetchall()
+                cur.execute(
+                    "SELECT tgname FROM pg_trigger WHERE tgrelid = 'attendance'::regclass AND NOT tgisinternal"
+                )
+                triggers = [row[0] for row in cur.fetchall()]
+                cur.execute("""
+                    SELECT min(attendance_date), max(attendance_date),
+                           count(*) FILTER (WHERE attendance_date IS NULL),
+                           (array_agg(id ORDER BY id) FILTER (WHERE attendance_date IS NULL))[1:10]
+                    FROM attendance
+                """)
+                premier, plus_tard, sans_date, exemples = cur.fetchone()
+                if sans_date:
+                    raise ValueError(
+                        f"{sans_date} pointage(s) sans attendance_date (id {', '.join(map(str, exemples))}"
+                        f"{', …' if sans_date > len(exemples) else ''}) : à dater ou supprimer avant la migration"
+                    )
+                premier = premier or datetime.now().date()
+
+                # L'ancienne table libère les noms (table, index, triggers)
+                cur.execute(f"ALTER TABLE attendance RENAME TO {LEGACY_TABLE}")
+                cur.execute(f"ALTER INDEX attendance_pkey RENAME TO {LEGACY_TABLE}_pkey")
+                for name, _ in indexes:
+                    cur.execute(f"ALTER INDEX {name} RENAME TO {name}_legacy")
+                for trigger in triggers:
+                    cur.execute(f"DROP TRIGGER {trigger} ON {LEGACY_TABLE}")
+
+                cur.execute(f"""
+                    CREATE TABLE attendance (LIKE {LEGACY_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+                    PARTITION BY RANGE (attendance_date)
+                """)
+                # La clé primaire d'une table partitionnée contient la clé de partition
+                cur.execute("ALTER TABLE attendance ADD CONSTRAINT attendance_pkey PRIMARY KEY (id, attendance_date)")
+                if sequence:
+                    cur.execute(f"ALTER SEQUENCE {sequence} OWNED BY attendance.id")
+
+                mois, dernier = debut_mois(premier), debut_mois(datetime.now().date())
+                for _ in range(months_ahead):
+                    dernier = _mois_suivant(dernier)
+                if plus_tard and debut_mois(plus_tard) > dernier:
+                    # Pointages datés au-delà des mois pré-créés : leurs mois ont aussi une partition
+                    print(f"⚠️ Pointages datés jusqu'au {plus_tard} : partitions créées jusqu'à ce mois")
+                    dernier = debut_mois(plus_tard)
+                partitions = 0
+                while mois <= dernier:
+                    cur.execute(_create_partition_sql(mois))
+                    mois = _mois_suivant(mois)
+                    partitions += 1
+                cur.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF attendance DEFAULT")
+
+                # Copie avant les index et les triggers : ni maintenance ligne à ligne, ni double comptage des synthèses
+                cur.execute(f"INSERT INTO attendance SELECT * FROM {LEGACY_TABLE}")
+                lignes = cur.rowcount
+
+                for _, definition in indexes:
+                    cur.execute(definition)
+                if 'attendance_rollup_insert' in triggers:
+                    cur.execute(ROLLUP_TRIGGERS_SQL)
+                if 'attendance_notify_insert' in triggers:
+                    cur.execute(NOTIFY_TRIGGERS_SQL)
+                if 'attendance_implicite_update' in triggers:
+                    cur.execute(EXPECTED_TRIGGERS_SQL)
+                autres = [
+                    t for t in triggers
+                    if not t.startswith(('attendance_rollup_', 'attendance_notify_', 'attendance_implicite_'))
+                ]
+                if autres:
+                    print(f"⚠️ Triggers non recréés (à réinstaller) : {', '.join(autres)}")
+
+                cur.execute("ANALYZE attendance")
+
+        db._partitioned = None
+        print(f"✅ {lignes} pointages migrés vers {partitions} partitions mensuelles (ancienne table : {LEGACY_TABLE})")
+        return True, f"✅ Table partitionnée ({partitions} partitions, {lignes} pointages)"
+
+    except Exception as e:
+        print(f"❌ Erreur migration vers les partitions : {e}")
+        return False, f"❌ Migration échouée : {e}"
+
+
+def ensure_partitions(db=None, months_ahead=None):
+    """
+    Crée les partitions du mois courant et des `months_ahead` suivants, ainsi que la
+    partition par défaut, puis range dans leur mois les pointages reçus par la partition
+    par défaut (idempotent ; planifié chaque nuit, voir render.yaml).
+    """
+    db = db or DatabaseManager()
+    months_ahead = months_ahead if months_ahead is not None else int(os.getenv('PARTITION_MONTHS_AHEAD', '3'))
+
+    if not db.attendance_partitioned():
+        return False, "❌ La table attendance n'est pas partitionnée (python partitioning.py migrate)"
+
+    try:
+        mois = debut_mois(datetime.now().date())
+        a_creer = []
+        for _ in range(months_ahead + 1):
+            a_creer.append(mois)
+            mois = _mois_suivant(mois)
+        dernier = fin_mois(a_creer[-1])
+
+        deplaces = 0
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF attendance DEFAULT")
+                en_attente = _mois_par_defaut(cur)
+                for mois in sorted(set(a_creer) | set(en_attente)):
+                    # Partition détachée vers l'archive : ses pointages tardifs restent par défaut
+                    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (f"{ARCHIVE_SCHEMA}.{partition_name(mois)}",))
+                    if cur.fetchone()[0]:
+                        print(f"⚠️ {mois:%Y-%m} détaché dans {ARCHIVE_SCHEMA} : pointages laissés dans {DEFAULT_PARTITION}")
+                        continue
+                    deplaces += _create_partition(cur, mois, depuis_defaut=mois in en_attente)
+
+        if deplaces:
+            print(f"♻️ {deplaces} pointage(s) déplacé(s) de {DEFAULT_PARTITION} vers leur partition")
+        return True, f"✅ Partitions assurées jusqu'à {dernier}"
+
+    except Exception as e:
+        print(f"❌ Erreur création des partitions : {e}")
+        return False, f"❌ Création des partitions échouée : {e}"
+
+
+def detach_partitions(db=None, avant=None):
+    """
+    Détache les partitions des mois entièrement antérieurs à `avant` et les range dans
+    le schéma ARCHIVE_SCHEMA. Aucun trigger ne se déclenche : les synthèses sont conservées.
+    Les mois concernés sont d'abord capturés dans l'historique local s'il est activé.
+    """
+    db = db or DatabaseManager()
+    limite = debut_mois(avant)
+
+    if not db.attendance_partitioned():
+        return False, "❌ La table attendance n'est pas partitionnée (python partitioning.py migrate)"
+
+    anciennes = list_partitions(db)
+    anciennes = anciennes[anciennes['fin'].notna() & (anciennes['fin'] < limite)]
+    if anciennes.empty:
+        return True, "ℹ️ Aucune partition à détacher"
+
+    try:
+        # Lectures futures servies par l'historique : la capture doit précéder le détachement
+        if db.history.enabled:
+            for mois in anciennes['debut']:
+                db._history_month(mois)
+
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+                en_attente = _mois_par_defaut(cur)
+                for mois, name in zip(anciennes['debut'], anciennes['partition']):
+                    # Pointages tardifs du mois restés par défaut : ils partent avec leur partition
+                    if mois in en_attente:
+                        _drain_default(cur, mois, name)
+                    cur.execute(f"ALTER TABLE attendance DETACH PARTITION {name}")
+                    cur.execute(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}")
+
+        print(f"✅ {len(anciennes)} partition(s) détachée(s) vers le schéma {ARCHIVE_SCHEMA}")
+        return True, f"✅ {len(anciennes)} partition(s) archivée(s) ({anciennes['lignes'].sum()} pointages)"
+
+    except Exception as e:
+        print(f"❌ Erreur détachement des partitions : {e}")
+        return False, f"❌ Détachement échoué : {e}"
+
+
+def attach_partition(db=None, mois=None):
+    """Rattache à `attendance` la partition archivée d'un mois"""
+    db = db or DatabaseManager()
+    mois = debut_mois(mois)
+    name = partition_name(mois)
+
+    try:
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"ALTER TABLE {ARCHIVE_SCHEMA}.{name} SET SCHEMA public")
+                cur.execute(
+                    f"ALTER TABLE attendance ATTACH PARTITION {name} "
+                    f"FOR VALUES FROM ('{mois:%Y-%m-%d}') TO ('{_mois_suivant(mois):%Y-%m-%d}')"
+                )
+        print(f"✅ Partition {name} rattachée")
+        return True, f"✅ Partition {name} rattachée"
+
+    except Exception as e:
+        print(f"❌ Erreur rattachement de la partition : {e}")
+        return False, f"❌ Rattachement échoué : {e}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Partitionnement mensuel des pointages")
+    sub = parser.add_subparsers(dest="commande", required=True)
+
+    migrate = sub.add_parser("migrate", help="Convertit attendance en table partitionnée par mois")
+    migrate.add_argument("--mois-avance", type=int, default=None)
+
+    ensure = sub.add_parser("ensure", help="Crée les partitions des prochains mois et vide la partition par défaut")
+    ensure.add_argument("--mois-avance", type=int, default=None)
+
+    sub.add_parser("list", help="Liste les partitions")
+
+    detach = sub.add_parser("detach", help="Détache et archive les partitions antérieures à une date")
+    detach.add_argument("--avant", type=lambda d: datetime.strptime(d, "%Y-%m-%d").date(), required=True)
+
+    attach = sub.add_parser("attach", help="Rattache la partition archivée d'un mois")
+    attach.add_argument("--mois", type=lambda d: datetime.strptime(d, "%Y-%m").date(), required=True)
+
+    args = parser.parse_args()
+
+    if args.commande == "migrate":
+        success, _ = migrate_to_partitions(months_ahead=args.mois_avance)
+    elif args.commande == "ensure":
+        success, message = ensure_partitions(months_ahead=args.mois_avance)
+        print(message)
+    elif args.commande == "detach":
+        success, _ = detach_partitions(avant=args.avant)
+    elif args.commande == "attach":
+        success, _ = attach_partition(mois=args.mois)
+    else:
+        print(list_partitions().to_string(index=False))
+        success = True
+
+    raise SystemExit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,9 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from database import DatabaseManager
-from utils import classify_domain
+from utils import classify_domain, classify_domains
+from attendance_frame import AttendanceFrame
+from repository import shared_repository
 import plotly.express as px
 import plotly.graph_objects as go
 from sklearn.ensemble import RandomForestClassifier
@@ -13,6 +15,35 @@ from sklearn.metrics import classification_report, accuracy_score
 import warnings
 warnings.filterwarnings('ignore')
 
+# Historique récent d'un employé : derniers pointages comptés par statut
+RECENT_WINDOW = 7
+# Série en cours d'un même statut, bornée aux derniers pointages
+STREAK_WINDOW = 5
+
+
+def _running_counts(flags, debut):
+    """
+    Pour des pointages triés par employé puis par date, `flags` marquant un statut et `debut`
+    l'indice du premier pointage de l'employé de chaque ligne : nombre cumulé du statut,
+    nombre sur les RECENT_WINDOW derniers pointages et longueur de la série en cours
+    (au plus STREAK_WINDOW), pointage courant compris
+    """
+    flags = flags.astype(np.int64)
+    index = np.arange(len(flags))
+    
+    cumul = np.cumsum(flags)
+    cumul -= (cumul - flags)[debut]
+    
+    fenetre = index - RECENT_WINDOW
+    recent = cumul - np.where(fenetre >= debut, cumul[np.maximum(fenetre, 0)], 0)
+    
+    # Dernière ligne sans le statut, au plus tard la veille du premier pointage de l'employé
+    rupture = np.maximum.accumulate(np.where(flags == 0, index, -1))
+    serie = np.minimum(index - np.maximum(rupture, debut - 1), STREAK_WINDOW)
+    
+    return cumul, recent, serie
+
+
 class AttendancePrediction:
     def __init__(self):
         self.db = DatabaseManager()
@@ -20,95 +51,75 @@ class AttendancePrediction:
         self.label_encoder = LabelEncoder()
         self.features = []
         
+    def load_recent_frame(self, days=30):
+        """Pointages des `days` derniers jours en représentation compacte (dépôt partagé)"""
+        repository = shared_repository(self.db)
+        if days <= repository.days:
+            return repository.frame(days)
+        
+        end_date = datetime.now().date()
+        start_date = end_date - timedelta(days=days)
+        return AttendanceFrame.from_dataframe(self.db.get_attendance_data(start_date, end_date))
+    
     def prepare_data(self, df):
-        """Prépare les données pour la prédiction"""
+        """
+        Prépare les données pour la prédiction : un pointage par ligne, par employé (ordre
+        d'apparition) puis par date, avec l'historique de l'employé jusqu'à ce pointage.
+        Calcul en O(n) : sommes cumulées par employé, fenêtre glissante par différence de
+        sommes cumulées et longueur des séries en cours, sans boucle par employé ni par ligne.
+        """
         if df.empty:
             return pd.DataFrame()
         
-        # Ajout de la classification des domaines
-        df['domaine'] = df['matricule'].apply(classify_domain)
+        if isinstance(df, AttendanceFrame):
+            df = df.to_dataframe()
         
-        # Conversion des dates
-        df['date_pointage'] = pd.to_datetime(df['date_pointage'])
+        # Classification des domaines (déjà présente dans la vue d'un AttendanceFrame)
+        domaines = df['domaine'] if 'domaine' in df.columns else classify_domains(df['matricule'])
         
-        # Création des features temporelles
-        df['jour_semaine'] = df['date_pointage'].dt.dayofweek
-        df['mois'] = df['date_pointage'].dt.month
-        df['jour_mois'] = df['date_pointage'].dt.day
-        df['semaine_annee'] = df['date_pointage'].dt.isocalendar().week
+        # Tri stable par employé puis par date ; un matricule manquant n'a pas d'historique
+        employes, matricules = pd.factorize(np.asarray(df['matricule'], dtype=object))
+        dates = pd.to_datetime(df['date_pointage']).to_numpy()
+        valides = np.flatnonzero(employes >= 0)
+        ordre = valides[np.lexsort((dates[valides], employes[valides]))]
+        employes = employes[ordre]
+        jours = pd.DatetimeIndex(dates[ordre])
+        statuts = np.asarray(df['statut'], dtype=object)[ordre]
         
-        # Features d'historique par employé
-        employee_features = []
+        # Premier pointage de l'employé de chaque ligne et rang dans son historique
+        n = len(ordre)
+        debuts = np.flatnonzero(np.r_[True, employes[1:] != employes[:-1]])
+        debut = np.repeat(debuts, np.diff(np.r_[debuts, n]))
+        total_days = np.arange(n) - debut + 1
         
-        for matricule in df['matricule'].unique():
-            emp_data = df[df['matricule'] == matricule].copy()
-            emp_data = emp_data.sort_values('date_pointage')
-            
-            # Calcul des statistiques historiques
-            for i in range(len(emp_data)):
-                historic_data = emp_data.iloc[:i+1]
-                
-                # Statistiques de base
-                total_days = len(historic_data)
-                present_days = len(historic_data[historic_data['statut'] == 'Présent'])
-                absent_days = len(historic_data[historic_data['statut'] == 'Absent'])
-                late_days = len(historic_data[historic_data['statut'] == 'Retard'])
-                
-                # Ratios
-                presence_rate = present_days / total_days if total_days > 0 else 0
-                absence_rate = absent_days / total_days if total_days > 0 else 0
-                late_rate = late_days / total_days if total_days > 0 else 0
-                
-                # Tendances récentes (7 derniers jours)
-                recent_data = historic_data.tail(7)
-                recent_present = len(recent_data[recent_data['statut'] == 'Présent'])
-                recent_absent = len(recent_data[recent_data['statut'] == 'Absent'])
-                recent_late = len(recent_data[recent_data['statut'] == 'Retard'])
-                
-                # Patterns comportementaux
-                consecutive_absences = self._count_consecutive_status(historic_data, 'Absent')
-                consecutive_lates = self._count_consecutive_status(historic_data, 'Retard')
-                
-                # Ajout des features
-                features = {
-                    'matricule': matricule,
-                    'date_pointage': emp_data.iloc[i]['date_pointage'],
-                    'domaine': emp_data.iloc[i]['domaine'],
-                    'jour_semaine': emp_data.iloc[i]['jour_semaine'],
-                    'mois': emp_data.iloc[i]['mois'],
-                    'jour_mois': emp_data.iloc[i]['jour_mois'],
-                    'semaine_annee': emp_data.iloc[i]['semaine_annee'],
-                    'total_days': total_days,
-                    'presence_rate': presence_rate,
-                    'absence_rate': absence_rate,
-                    'late_rate': late_rate,
-                    'recent_present': recent_present,
-                    'recent_absent': recent_absent,
-                    'recent_late': recent_late,
-                    'consecutive_absences': consecutive_absences,
-                    'consecutive_lates': consecutive_lates,
-                    'statut': emp_data.iloc[i]['statut']
-                }
-                
-                employee_features.append(features)
+        features = {
+            'matricule': matricules[employes],
+            'date_pointage': jours,
+            'domaine': np.asarray(domaines, dtype=object)[ordre],
+            'jour_semaine': jours.dayofweek.to_numpy(np.int32),
+            'mois': jours.month.to_numpy(np.int32),
+            'jour_mois': jours.day.to_numpy(np.int32),
+            'semaine_annee': jours.isocalendar()['week'].to_numpy(np.uint32),
+            'total_days': total_days,
+        }
         
-        return pd.DataFrame(employee_features)
-    
-    def _count_consecutive_status(self, df, status):
-        """Compte les occurrences consécutives d'un statut"""
-        if df.empty:
-            return 0
+        historiques = {
+            statut: _running_counts(statuts == statut, debut)
+            for statut in ('Présent', 'Absent', 'Retard')
+        }
+        features['presence_rate'] = historiques['Présent'][0] / total_days
+        features['absence_rate'] = historiques['Absent'][0] / total_days
+        features['late_rate'] = historiques['Retard'][0] / total_days
         
-        recent_statuses = df.tail(5)['statut'].tolist()
-        consecutive = 0
+        # Tendances récentes (RECENT_WINDOW derniers pointages) et séries en cours
+        features['recent_present'] = historiques['Présent'][1]
+        features['recent_absent'] = historiques['Absent'][1]
+        features['recent_late'] = historiques['Retard'][1]
+        features['consecutive_absences'] = historiques['Absent'][2]
+        features['consecutive_lates'] = historiques['Retard'][2]
+        features['statut'] = statuts
         
-        for s in reversed(recent_statuses):
-            if s == status:
-                consecutive += 1
-            else:
-                break
-                
-        return consecutive
+        return pd.DataFrame(features)
     
     def train_model(self, feature_df):
         """Entraîne le modèle de prédiction"""
@@ -154,23 +165,26 @@ class AttendancePrediction:
         
         return accuracy
     
-    def predict_employee_behavior(self, matricule, days_ahead=7):
-        """Prédit le comportement d'un employé pour les prochains jours"""
+    def predict_employee_behavior(self, matricule, days_ahead=7, feature_df=None):
+        """
+        Prédit le comportement d'un employé pour les prochains jours.
+        `feature_df` (sortie de prepare_data) évite de recalculer les features à chaque employé.
+        """
         if not self.model:
             return None
         
         try:
-            # Récupération des données historiques
             end_date = datetime.now().date()
-            start_date = end_date - timedelta(days=30)  # 30 jours d'historique
             
-            df = self.db.get_attendance_data(start_date, end_date)
-            
-            if df.empty:
-                return None
-            
-            # Préparation des données
-            feature_df = self.prepare_data(df)
+            if feature_df is None:
+                # Récupération des données historiques (30 jours)
+                frame = self.load_recent_frame(30)
+                
+                if frame.empty:
+                    return None
+                
+                # Préparation des données
+                feature_df = self.prepare_data(frame)
             
             # Données de l'employé
             emp_data = feature_df[feature_df['matricule'] == matricule]
@@ -222,29 +236,31 @@ class AttendancePrediction:
             st.error(f"Erreur lors de la prédiction: {str(e)}")
             return None
     
-    def get_risk_analysis(self, matricule):
-        """Analyse les risques pour un employé"""
+    def get_risk_analysis(self, matricule, frame=None):
+        """
+        Analyse les risques pour un employé.
+        `frame` (AttendanceFrame des 30 derniers jours) permet de partager un seul chargement.
+        """
         try:
             # Récupération des données des 30 derniers jours
-            end_date = datetime.now().date()
-            start_date = end_date - timedelta(days=30)
+            if frame is None:
+                frame = self.load_recent_frame(30)
             
-            df = self.db.get_attendance_data(start_date, end_date)
-            
-            if df.empty:
+            if frame.empty:
                 return {}
             
             # Données de l'employé
-            emp_data = df[df['matricule'] == matricule]
+            emp_data = frame.for_employee(matricule)
             
             if emp_data.empty:
                 return {}
             
             # Calcul des statistiques
+            status_counts = emp_data.status_counts()
             total_days = len(emp_data)
-            present_days = len(emp_data[emp_data['statut'] == 'Présent'])
-            absent_days = len(emp_data[emp_data['statut'] == 'Absent'])
-            late_days = len(emp_data[emp_data['statut'] == 'Retard'])
+            present_days = status_counts.get('Présent', 0)
+            absent_days = status_counts.get('Absent', 0)
+            late_days = status_counts.get('Retard', 0)
             
             # Ratios
             presence_rate = present_days / total_days if total_days > 0 else 0
@@ -268,8 +284,8 @@ class AttendancePrediction:
                 risk_factors.append(f"Taux de retard élevé ({late_rate:.1%})")
             
             # Tendance récente
-            recent_data = emp_data.tail(7)
-            recent_issues = len(recent_data[recent_data['statut'] != 'Présent'])
+            recent_data = emp_data.take(slice(-7, None))
+            recent_issues = int((recent_data.status != emp_data.status_code('Présent')).sum())
             
             if recent_issues > 3:
                 risk_level = "Élevé"
@@ -295,16 +311,13 @@ class AttendancePrediction:
         """Prédictions globales pour tous les employés"""
         try:
             # Récupération des données
-            end_date = datetime.now().date()
-            start_date = end_date - timedelta(days=30)
-            
-            df = self.db.get_attendance_data(start_date, end_date)
+            frame = self.load_recent_frame(30)
             
-            if df.empty:
+            if frame.empty:
                 return {}
             
-            # Préparation des données
-            feature_df = self.prepare_data(df)
+            # Préparation des données (une seule fois pour tous les employés)
+            feature_df = self.prepare_data(frame)
             
             # Entraînement du modèle
             accuracy = self.train_model(feature_df)
@@ -313,11 +326,11 @@ class AttendancePrediction:
                 return {}
             
             # Prédictions pour tous les employés actifs
-            employees = df['matricule'].unique()
+            employees = frame.unique_employees()
             predictions = {}
             
             for emp in employees:
-                pred = self.predict_employee_behavior(emp, 7)
+                pred = self.predict_employee_behavior(emp, 7, feature_df)
                 if pred:
                     predictions[emp] = pred
             
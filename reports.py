@@ -9,11 +9,23 @@ from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from utils import generate_domain_summary, format_time_display
+from attendance_frame import AttendanceFrame
+from stats_engine import AttendanceStats, attendance_stats
+
+def _stats_and_domains(df, stats):
+    """
+    Indicateurs (format dict) et résumé par domaine ; un AttendanceStats déjà calculé
+    sur la même sélection évite de recompter les pointages
+    """
+    if isinstance(stats, AttendanceStats):
+        return stats.to_dict(), stats.domain_summary()
+    return stats, generate_domain_summary(df)
 
 def generate_pdf_report(df, stats, start_date, end_date, include_predictions=True, include_alerts=True):
     """
     Génère un rapport PDF complet des statistiques de pointage
     """
+    stats, domain_summary = _stats_and_domains(df, stats)
     buffer = BytesIO()
     
     # Configuration du document
@@ -103,8 +115,6 @@ def generate_pdf_report(df, stats, start_date, end_date, include_predictions=Tru
     # Statistiques par domaine
     elements.append(Paragraph("STATISTIQUES PAR DOMAINE", heading_style))
     
-    domain_summary = generate_domain_summary(df)
-    
     domain_data = [['Domaine', 'Total', 'Présents', 'Absents', 'Retards', 'Taux Présence']]
     
     for domain, data in domain_summary.items():
@@ -214,11 +224,17 @@ def generate_pdf_report(df, stats, start_date, end_date, include_predictions=Tru
             prediction_system = AttendancePrediction()
             
             # Analyse des risques pour quelques employés
-            employees_sample = df['matricule'].unique()[:5] if not df.empty else []
+            if isinstance(df, AttendanceFrame):
+                employees_sample = df.unique_employees()[:5]
+            else:
+                employees_sample = df['matricule'].unique()[:5] if not df.empty else []
             risk_employees = []
             
+            # Un seul chargement des 30 derniers jours pour toutes les analyses
+            recent_frame = prediction_system.load_recent_frame(30)
+            
             for emp in employees_sample:
-                risk_analysis = prediction_system.get_risk_analysis(emp)
+                risk_analysis = prediction_system.get_risk_analysis(emp, recent_frame)
                 if risk_analysis and risk_analysis.get('risk_level') in ['Élevé', 'Modéré']:
                     risk_employees.append(risk_analysis)
             
@@ -259,21 +275,18 @@ def generate_pdf_report(df, stats, start_date, end_date, include_predictions=Tru
     
     return buffer.getvalue()
 
-def generate_csv_report(df):
+def _prepare_csv_export(df):
     """
-    Génère un rapport CSV des données de pointage
+    Ajoute les colonnes calculées et ordonne les colonnes d'un export CSV
     """
-    if df.empty:
-        return "Aucune donnée disponible"
-    
-    # Préparation des données pour l'export
-    export_df = df.copy()
+    export_df = df.to_dataframe() if isinstance(df, AttendanceFrame) else df.copy()
     
     # Ajout de colonnes calculées
     if 'date_pointage' in export_df.columns:
-        export_df['semaine'] = pd.to_datetime(export_df['date_pointage']).dt.isocalendar().week
-        export_df['mois'] = pd.to_datetime(export_df['date_pointage']).dt.month
-        export_df['annee'] = pd.to_datetime(export_df['date_pointage']).dt.year
+        dates = pd.to_datetime(export_df['date_pointage'])
+        export_df['semaine'] = dates.dt.isocalendar().week
+        export_df['mois'] = dates.dt.month
+        export_df['annee'] = dates.dt.year
     
     # Réorganisation des colonnes
     column_order = [
@@ -283,7 +296,17 @@ def generate_csv_report(df):
     
     # Garde seulement les colonnes qui existent
     available_columns = [col for col in column_order if col in export_df.columns]
-    export_df = export_df[available_columns]
+    return export_df[available_columns]
+
+def generate_csv_report(df):
+    """
+    Génère un rapport CSV des données de pointage
+    """
+    if df.empty:
+        return "Aucune donnée disponible"
+    
+    # Préparation des données pour l'export
+    export_df = _prepare_csv_export(df)
     
     # Conversion en CSV
     output = StringIO()
@@ -291,11 +314,33 @@ def generate_csv_report(df):
     
     return output.getvalue()
 
+def generate_csv_report_from_chunks(chunks):
+    """
+    Génère un rapport CSV à partir de blocs de pointages (voir iter_attendance_chunks),
+    sans jamais charger toute la période en mémoire
+    """
+    output = StringIO()
+    header = True
+    
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        _prepare_csv_export(chunk).to_csv(output, index=False, header=header, encoding='utf-8-sig')
+        header = False
+    
+    if header:
+        return "Aucune donnée disponible"
+    
+    return output.getvalue()
+
 def generate_excel_report(df, stats):
     """
     Génère un rapport Excel avec plusieurs feuilles
     """
     output = BytesIO()
+    stats, domain_summary = _stats_and_domains(df, stats)
+    if isinstance(df, AttendanceFrame):
+        df = df.to_dataframe()
     
     with pd.ExcelWriter(output, engine='openpyxl') as writer:
         # Feuille 1: Données brutes
@@ -314,7 +359,6 @@ def generate_excel_report(df, stats):
         stats_df.to_excel(writer, sheet_name='Statistiques Globales', index=False)
         
         # Feuille 3: Statistiques par domaine
-        domain_summary = generate_domain_summary(df)
         domain_df = pd.DataFrame.from_dict(domain_summary, orient='index')
         domain_df.reset_index(inplace=True)
         domain_df.rename(columns={'index': 'Domaine'}, inplace=True)
@@ -328,39 +372,31 @@ def create_attendance_summary(df, period_name):
     """
     Crée un résumé d'assiduité pour une période donnée
     """
+    stats = attendance_stats(df)
+    
     summary = {
         'periode': period_name,
         'date_generation': datetime.now().strftime('%d/%m/%Y %H:%M'),
-        'total_employes': df['matricule'].nunique() if not df.empty else 0,
-        'total_enregistrements': len(df),
+        'total_employes': stats.total_employees,
+        'total_enregistrements': stats.total_records,
     }
     
-    if not df.empty:
+    if not stats.empty:
         # Calculs par statut
-        status_counts = df['statut'].value_counts()
         summary.update({
-            'presents': status_counts.get('Présent', 0),
-            'absents': status_counts.get('Absent', 0),
-            'retards': status_counts.get('Retard', 0)
+            'presents': stats.status_count('Présent'),
+            'absents': stats.status_count('Absent'),
+            'retards': stats.status_count('Retard')
         })
         
         # Taux de présence
-        summary['taux_presence'] = (summary['presents'] / max(summary['total_enregistrements'], 1)) * 100
+        summary['taux_presence'] = stats.presence_rate()
         
         # Statistiques par domaine
-        domain_stats = {}
-        for domain in ['Chantre', 'Protocole', 'Régis']:
-            domain_data = df[df['domaine'] == domain]
-            if not domain_data.empty:
-                domain_stats[domain] = {
-                    'total': len(domain_data),
-                    'presents': len(domain_data[domain_data['statut'] == 'Présent']),
-                    'taux_presence': len(domain_data[domain_data['statut'] == 'Présent']) / len(domain_data) * 100
-                }
-            else:
-                domain_stats[domain] = {'total': 0, 'presents': 0, 'taux_presence': 0}
-        
-        summary['domaines'] = domain_stats
+        summary['domaines'] = {
+            domain: {'total': data['total'], 'presents': data['present'], 'taux_presence': data['presence_rate']}
+            for domain, data in stats.domain_summary().items()
+        }
     
     return summary
 
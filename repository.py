@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from data_cache import AttendanceCache
+from database import DatabaseManager
+
+_repositories = {}
+_repositories_lock = threading.Lock()
+
+
+class AttendanceRepository:
+    """
+    Fenêtre glissante des `days` derniers jours de pointages, partagée en lecture seule
+    par le tableau de bord, les alertes, les prédictions et le chatbot. Elle n'est
+    resynchronisée (par delta) que lorsque la version des données change ; avec un
+    ChangeListener connecté, uniquement lorsqu'un changement touche la fenêtre.
+    """
+
+    def __init__(self, db=None, days=None, check_interval=None):
+        self.db = db or DatabaseManager()
+        self.days = days if days is not None else max(int(os.getenv('REPOSITORY_DAYS', '60')), 30)
+        # Délai minimal entre deux vérifications de version (une page = une vérification)
+        self.check_interval = (
+            check_interval if check_interval is not None
+            else float(os.getenv('REPOSITORY_CHECK_INTERVAL', '5'))
+        )
+        self._cache = AttendanceCache(self.db, max_ranges=2)
+        self._frame = None
+        self._window = None
+        self._checked_at = None
+        self._stale = False
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def attach_listener(self, listener):
+        """Branche la fenêtre sur les notifications de changements (listener.ChangeListener)"""
+        self._listener = listener
+        self._cache.attach_listener(listener)
+        listener.subscribe(self.mark_stale)
+        return self
+
+    def mark_stale(self, date_debut=None, date_fin=None, matricules=None):
+        """Signale un changement ; seuls ceux qui recoupent la fenêtre imposent une resynchronisation"""
+        debut, fin = self.window()
+        if date_debut is None or (date_debut <= fin and debut <= date_fin):
+            with self._lock:
+                self._stale = True
+
+    def window(self):
+        """Période couverte : (aujourd'hui - days, aujourd'hui)"""
+        today = datetime.now().date()
+        return today - timedelta(days=self.days), today
+
+    def covers(self, date_debut, date_fin=None):
+        """Indique si une période est entièrement comprise dans la fenêtre"""
+        debut, fin = self.window()
+        return debut <= date_debut and (date_fin or date_debut) <= fin
+
+    @property
+    def version(self):
+        """Repère (dernier id, dernière mise à jour) des données servies"""
+        return self._cache.watermark(*self._window) if self._window else None
+
+    def _current(self):
+        """Fenêtre à jour : vérification de version au plus toutes les `check_interval` secondes"""
+        window = self.window()
+        with self._lock:
+            pushed = self._listener is not None and self._listener.connected
+            fresh = (
+                self._frame is not None and self._window == window and not self._stale
+                and (pushed or time.monotonic() - self._checked_at < self.check_interval)
+            )
+            if not fresh:
+                self._stale = False
+                if self._window is not None and self._window != window:
+                    # Changement de jour : l'ancienne fenêtre est abandonnée
+                    self._cache.invalidate(*self._window)
+                self._frame = self._cache.get_frame(*window).freeze()
+                self._window = window
+                self._checked_at = time.monotonic()
+            return self._frame
+
+    def frame(self, days=None):
+        """AttendanceFrame (lecture seule) des `days` derniers jours, par défaut toute la fenêtre"""
+        frame = self._current()
+        if days is None or days >= self.days:
+            return frame
+        today = datetime.now().date()
+        return frame.between(today - timedelta(days=days), today).freeze()
+
+    def range(self, date_debut, date_fin):
+        """AttendanceFrame d'une période comprise dans la fenêtre"""
+        return self._current().between(date_debut, date_fin).freeze()
+
+    def employee_counts(self, days=None):
+        """Comptes par employé sur les `days` derniers jours"""
+        return self.frame(days).employee_counts()
+
+    def invalidate(self):
+        """Force une vérification de version au prochain accès"""
+        with self._lock:
+            self._stale = True
+
+
+def shared_repository(db=None):
+    """Dépôt partagé par le processus pour la cible de connexion de `db`"""
+    db = db or DatabaseManager()
+    key = db._pool_key()
+
+    with _repositories_lock:
+        repository = _repositories.get(key)
+        if repository is None:
+            repository = AttendanceRepository(db)
+            _repositories[key] = repository
+        return repository
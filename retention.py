@@ -0,0 +1,231 @@
+import argparse
+import os
+import re
+import shutil
+import pandas as pd
+from datetime import datetime, timedelta
+from database import DatabaseManager, ATTENDANCE_COLUMNS, ATTENDANCE_DTYPES, ATTENDANCE_DATE_COLUMNS
+from history_store import debut_mois, fin_mois
+from partitioning import partition_name, _drain_default, _mois_par_defaut
+from schema import ARCHIVE_SCHEMA, ARCHIVE_CATALOG_SQL, ROLLUP_TRIGGERS_SQL, RETENTION_SETTING
+
+_PARTITION = re.compile(r"^attendance_(\d{4})_(\d{2})$")
+
+
+def retention_cutoff(months=None, aujourd_hui=None):
+    """Premier jour conservé en base : début du mois courant moins `months` mois"""
+    months = months if months is not None else int(os.getenv('RETENTION_MONTHS', '24'))
+    if months < 1:
+        raise ValueError("La rétention doit conserver au moins un mois complet")
+
+    mois = debut_mois(aujourd_hui or datetime.now().date())
+    for _ in range(months):
+        mois = debut_mois(mois - timedelta(days=1))
+    return mois
+
+
+def months_to_archive(db, avant):
+    """Mois antérieurs à `avant` encore en base : {mois: relation source}"""
+    sources = {}
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT min(attendance_date) FROM attendance WHERE attendance_date < %s", (avant,))
+            mois = cur.fetchone()[0]
+            mois = debut_mois(mois) if mois else avant
+            while mois < avant:
+                cur.execute(
+                    "SELECT EXISTS (SELECT 1 FROM attendance WHERE attendance_date BETWEEN %s AND %s)",
+                    (mois, fin_mois(mois))
+                )
+                if cur.fetchone()[0]:
+                    sources[mois] = 'attendance'
+                mois = fin_mois(mois) + timedelta(days=1)
+
+            # Partitions déjà détachées par partitioning.py detach
+            cur.execute("""
+                SELECT c.relname FROM pg_class c
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+                WHERE n.nspname = %s AND c.relkind = 'r'
+            """, (ARCHIVE_SCHEMA,))
+            for (name,) in cur.fetchall():
+                match = _PARTITION.match(name)
+                if match:
+                    mois = datetime(int(match.group(1)), int(match.group(2)), 1).date()
+                    if mois < avant:
+                        sources[mois] = f"{ARCHIVE_SCHEMA}.{name}"
+    return dict(sorted(sources.items()))
+
+
+def archive_month(db, mois, source='attendance', partitionnee=None):
+    """
+    Exporte un mois dans l'archive Parquet puis le supprime de la base, en une transaction :
+    les écritures sur le mois sont bloquées entre l'export et la suppression.
+    Les synthèses ne sont pas décrémentées. Retourne le nombre de pointages archivés.
+    Si la transaction échoue, le fichier du mois est remis dans son état précédent : un
+    fichier orphelin masquerait les pointages encore en base (ArchiveStore.is_closed).
+    """
+    # Détecté avant d'emprunter la connexion de la transaction (la détection en emprunte une)
+    if partitionnee is None:
+        partitionnee = db.attendance_partitioned()
+    fin = fin_mois(mois)
+    path = db.archive.month_path(mois)
+    precedent = f"{path}.precedent"
+    nouveau = not os.path.exists(path)
+    try:
+        lignes = _archive_month(db, mois, source, fin, path, precedent, partitionnee)
+    except Exception:
+        if os.path.exists(precedent):
+            os.replace(precedent, path)
+        elif nouveau and os.path.exists(path):
+            os.remove(path)
+        raise
+    if os.path.exists(precedent):
+        os.remove(precedent)
+    return lignes
+
+
+def _archive_month(db, mois, source, fin, path, precedent, partitionnee):
+    """Export, relecture et suppression du mois dans une seule transaction"""
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            partition = None
+            if source == 'attendance' and partitionnee:
+                cur.execute("SELECT to_regclass(%s) IS NOT NULL", (f"public.{partition_name(mois)}",))
+                if cur.fetchone()[0]:
+                    partition = partition_name(mois)
+            cur.execute(f"LOCK TABLE {partition or source} IN SHARE ROW EXCLUSIVE MODE")
+            if partition and mois in _mois_par_defaut(cur):
+                # Pointages tardifs restés dans la partition par défaut : supprimés avec leur mois
+                _drain_default(cur, mois, partition)
+
+            df = db._copy_to_frame(
+                cur,
+                f"""
+                    SELECT {ATTENDANCE_COLUMNS} FROM {source} a
+                    WHERE a.attendance_date BETWEEN %s AND %s
+                    ORDER BY a.attendance_date DESC, a.check_in_time DESC
+                """,
+                (mois, fin),
+                dtype=ATTENDANCE_DTYPES, parse_dates=ATTENDANCE_DATE_COLUMNS
+            )
+            # Mois déjà partiellement archivé (saisie tardive) : l'archive est complétée
+            existant = db.archive.read(mois)
+            if existant is not None and not existant.empty:
+                existant = existant[~existant['id'].isin(df['id'])]
+                df = pd.concat([existant, df], ignore_index=True).sort_values(
+                    ['date_pointage', 'heure_pointage'], ascending=False, na_position='last', ignore_index=True
+                )
+            if os.path.exists(path):
+                # Copie du fichier déjà archivé, restaurée si la transaction échoue
+                shutil.copy2(path, precedent)
+            db.archive.write(mois, df)
+
+            # Relecture avant toute suppression
+            relu = db.archive.read(mois)
+            if relu is None or len(relu) != len(df):
+                raise IOError(f"archive {mois:%Y-%m} incomplète, rien n'est supprimé")
+
+            if source != 'attendance':
+                cur.execute(f"DROP TABLE {source}")
+            elif partition:
+                # Aucun trigger ne se déclenche : ni synthèses, ni notifications
+                cur.execute(f"ALTER TABLE attendance DETACH PARTITION {partition}")
+                cur.execute(f"DROP TABLE {partition}")
+            else:
+                cur.execute(f"SET LOCAL {RETENTION_SETTING} = 'on'")
+                cur.execute("DELETE FROM attendance WHERE attendance_date BETWEEN %s AND %s", (mois, fin))
+
+            cur.execute("""
+                INSERT INTO attendance_archive (mois, lignes, fichier) VALUES (%s, %s, %s)
+                ON CONFLICT (mois) DO UPDATE SET
+                    lignes = EXCLUDED.lignes, fichier = EXCLUDED.fichier, archive_le = now()
+            """, (mois, len(df), path))
+    return len(df)
+
+
+def run_retention(db=None, months=None, dry_run=False):
+    """Archive en Parquet (zstd) et supprime de la base les pointages antérieurs à la rétention"""
+    db = db or DatabaseManager()
+    # Le fichier Parquet devient la seule copie des mois archivés : stockage persistant exigé
+    persistant, raison = db.archive.persistence()
+    if not persistant and not dry_run:
+        print(f"❌ Rétention refusée : {raison}")
+        return False, f"❌ Rétention refusée : {raison}"
+
+    try:
+        avant = retention_cutoff(months)
+        # Détection hors de toute connexion empruntée : une seule connexion du pool à la fois
+        partitionnee = db.attendance_partitioned()
+        sources = months_to_archive(db, avant)
+        if dry_run or not sources:
+            for mois, source in sources.items():
+                print(f"🗃️ {mois:%Y-%m} ({source}) serait archivé")
+            return True, f"ℹ️ {len(sources)} mois antérieur(s) au {avant} à archiver"
+
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(ARCHIVE_CATALOG_SQL)
+                # Triggers à jour : la suppression de rétention ne décrémente pas les synthèses
+                if db.rollups_available():
+                    cur.execute(ROLLUP_TRIGGERS_SQL)
+
+        total = 0
+        for mois, source in sources.items():
+            lignes = archive_month(db, mois, source, partitionnee)
+            total += lignes
+            print(f"🗃️ Mois {mois:%Y-%m} archivé ({lignes} pointages) et supprimé de la base")
+
+        # Les captures de l'historique local sont désormais redondantes
+        db.invalidate_history(min(sources), max(sources))
+
+        print(f"✅ Rétention : {len(sources)} mois archivés, {total} pointages supprimés de la base")
+        return True, f"✅ {len(sources)} mois archivés ({total} pointages)"
+
+    except Exception as e:
+        print(f"❌ Erreur rétention des pointages : {e}")
+        return False, f"❌ Rétention échouée : {e}"
+
+
+def list_archives(db=None):
+    """Mois archivés (catalogue en base) et présence du fichier dans ARCHIVE_DIR"""
+    db = db or DatabaseManager()
+    colonnes = ['mois', 'lignes', 'archive_le', 'fichier_local']
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('attendance_archive') IS NOT NULL")
+            if not cur.fetchone()[0]:
+                return pd.DataFrame(columns=colonnes)
+            cur.execute("SELECT mois, lignes, archive_le FROM attendance_archive ORDER BY mois")
+            rows = cur.fetchall()
+
+    local = set(db.archive.months())
+    return pd.DataFrame(
+        [(mois, lignes, archive_le, mois in local) for mois, lignes, archive_le in rows],
+        columns=colonnes
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rétention et archivage des pointages")
+    sub = parser.add_subparsers(dest="commande", required=True)
+
+    run = sub.add_parser("run", help="Archive et supprime les mois antérieurs à la rétention")
+    run.add_argument("--mois", type=int, default=None, help="Mois conservés en base (RETENTION_MONTHS)")
+    run.add_argument("--dry-run", action="store_true")
+
+    sub.add_parser("list", help="Liste les mois archivés")
+
+    args = parser.parse_args()
+
+    if args.commande == "run":
+        success, message = run_retention(months=args.mois, dry_run=args.dry_run)
+        print(message)
+    else:
+        print(list_archives().to_string(index=False))
+        success = True
+
+    raise SystemExit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,552 @@
+import argparse
+import os
+import pandas as pd
+from datetime import datetime, timedelta
+from database import DatabaseManager, domaine_sql, statut_sql
+from listener import CHANNEL
+
+
+class QueryPlanError(Exception):
+    """Une requête du DatabaseManager parcourt séquentiellement une grande table"""
+
+    def __init__(self, message, report):
+        super().__init__(message)
+        self.report = report
+
+
+# Fonctions SQL partagées par les triggers et les reconstructions
+FUNCTIONS_SQL = f"""
+    CREATE OR REPLACE FUNCTION qr_domaine(matricule text) RETURNS text
+    LANGUAGE sql IMMUTABLE AS $$
+        SELECT {domaine_sql('matricule')}
+    $$;
+
+    CREATE OR REPLACE FUNCTION qr_statut(status text) RETURNS text
+    LANGUAGE sql IMMUTABLE AS $$
+        SELECT {statut_sql('status')}
+    $$;
+"""
+
+# Tables de synthèse : une ligne par (jour, domaine, statut) et par (jour, employé, statut)
+ROLLUP_TABLES_SQL = """
+    CREATE TABLE IF NOT EXISTS attendance_daily_summary (
+        jour date NOT NULL,
+        domaine varchar(20) NOT NULL,
+        statut varchar(20) NOT NULL,
+        nombre integer NOT NULL DEFAULT 0,
+        PRIMARY KEY (jour, domaine, statut)
+    );
+
+    CREATE TABLE IF NOT EXISTS attendance_employee_daily (
+        jour date NOT NULL,
+        matricule varchar(50) NOT NULL,
+        statut varchar(20) NOT NULL,
+        nombre integer NOT NULL DEFAULT 0,
+        PRIMARY KEY (jour, matricule, statut)
+    );
+"""
+
+
+def _rollup_delta_sql(source):
+    """Applique aux tables de synthèse les variations (+1/-1) décrites par `source`"""
+    return f"""
+        INSERT INTO attendance_daily_summary AS s (jour, domaine, statut, nombre)
+        SELECT jour, qr_domaine(employee_id), qr_statut(status), sum(delta)
+        FROM ({source}) d
+        GROUP BY 1, 2, 3
+        HAVING sum(delta) <> 0
+        ON CONFLICT (jour, domaine, statut) DO UPDATE SET nombre = s.nombre + EXCLUDED.nombre;
+
+        INSERT INTO attendance_employee_daily AS s (jour, matricule, statut, nombre)
+        SELECT jour, upper(btrim(employee_id)), qr_statut(status), sum(delta)
+        FROM ({source}) d
+        GROUP BY 1, 2, 3
+        HAVING sum(delta) <> 0
+        ON CONFLICT (jour, matricule, statut) DO UPDATE SET nombre = s.nombre + EXCLUDED.nombre;
+    """
+
+
+# Paramètre de session posé par la purge de rétention
+RETENTION_SETTING = 'qr.retention'
+
+# Schéma qui reçoit les partitions détachées (voir partitioning.py)
+ARCHIVE_SCHEMA = 'archive'
+
+# Catalogue des mois sortis de la base par la rétention (archives Parquet)
+ARCHIVE_CATALOG_SQL = """
+    CREATE TABLE IF NOT EXISTS attendance_archive (
+        mois date PRIMARY KEY,
+        lignes integer NOT NULL,
+        fichier text NOT NULL,
+        archive_le timestamp NOT NULL DEFAULT now()
+    );
+"""
+
+_NEW_ROWS = "SELECT attendance_date AS jour, employee_id, status, 1 AS delta FROM new_rows"
+_OLD_ROWS = "SELECT attendance_date AS jour, employee_id, status, -1 AS delta FROM old_rows"
+
+# Triggers par instruction : un lot de N pointages ne coûte qu'une mise à jour groupée
+ROLLUP_TRIGGERS_SQL = f"""
+    CREATE OR REPLACE FUNCTION attendance_rollup_insert() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        {_rollup_delta_sql(_NEW_ROWS)}
+        RETURN NULL;
+    END $$;
+
+    CREATE OR REPLACE FUNCTION attendance_rollup_update() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        {_rollup_delta_sql(_NEW_ROWS + " UNION ALL " + _OLD_ROWS)}
+        RETURN NULL;
+    END $$;
+
+    CREATE OR REPLACE FUNCTION attendance_rollup_delete() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        -- Purge de rétention (retention.py) : les synthèses des mois archivés sont conservées
+        IF current_setting('{RETENTION_SETTING}', true) = 'on' THEN
+            RETURN NULL;
+        END IF;
+        {_rollup_delta_sql(_OLD_ROWS)}
+        RETURN NULL;
+    END $$;
+
+    DROP TRIGGER IF EXISTS attendance_rollup_insert ON attendance;
+    CREATE TRIGGER attendance_rollup_insert
+        AFTER INSERT ON attendance
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION attendance_rollup_insert();
+
+    DROP TRIGGER IF EXISTS attendance_rollup_update ON attendance;
+    CREATE TRIGGER attendance_rollup_update
+        AFTER UPDATE ON attendance
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION attendance_rollup_update();
+
+    DROP TRIGGER IF EXISTS attendance_rollup_delete ON attendance;
+    CREATE TRIGGER attendance_rollup_delete
+        AFTER DELETE ON attendance
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION attendance_rollup_delete();
+"""
+
+
+# Au-delà, la notification ne liste plus les matricules (charge utile limitée à 8000 octets)
+NOTIFY_MAX_MATRICULES = 100
+
+
+def _notify_sql(source, deplace="false"):
+    """
+    Notifie l'opération, la plage de dates et les matricules des lignes de `source`.
+    `deplace` (expression SQL) signale une mise à jour qui change la date de pointage :
+    comme une suppression, elle retire des lignes de périodes déjà en cache.
+    """
+    return f"""
+        PERFORM pg_notify('{CHANNEL}', json_build_object(
+            'operation', TG_OP,
+            'deplace', {deplace},
+            'debut', min(attendance_date),
+            'fin', max(attendance_date),
+            'matricules', CASE WHEN count(DISTINCT upper(btrim(employee_id))) <= {NOTIFY_MAX_MATRICULES}
+                THEN json_agg(DISTINCT upper(btrim(employee_id))) END
+        )::text)
+        FROM ({source}) r
+        HAVING count(*) > 0;
+    """
+
+
+# Une notification par instruction, envoyée par PostgreSQL à la validation de la transaction
+NOTIFY_TRIGGERS_SQL = f"""
+    CREATE OR REPLACE FUNCTION attendance_notify_insert() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        {_notify_sql("SELECT attendance_date, employee_id FROM new_rows")}
+        RETURN NULL;
+    END $$;
+
+    CREATE OR REPLACE FUNCTION attendance_notify_update() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        {_notify_sql(
+            "SELECT attendance_date, employee_id FROM new_rows UNION ALL SELECT attendance_date, employee_id FROM old_rows",
+            deplace="EXISTS (SELECT 1 FROM old_rows o JOIN new_rows n ON n.id = o.id "
+                    "WHERE n.attendance_date IS DISTINCT FROM o.attendance_date)"
+        )}
+        RETURN NULL;
+    END $$;
+
+    CREATE OR REPLACE FUNCTION attendance_notify_delete() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        {_notify_sql("SELECT attendance_date, employee_id FROM old_rows")}
+        RETURN NULL;
+    END $$;
+
+    DROP TRIGGER IF EXISTS attendance_notify_insert ON attendance;
+    CREATE TRIGGER attendance_notify_insert
+        AFTER INSERT ON attendance
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION attendance_notify_insert();
+
+    DROP TRIGGER IF EXISTS attendance_notify_update ON attendance;
+    CREATE TRIGGER attendance_notify_update
+        AFTER UPDATE ON attendance
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION attendance_notify_update();
+
+    DROP TRIGGER IF EXISTS attendance_notify_delete ON attendance;
+    CREATE TRIGGER attendance_notify_delete
+        AFTER DELETE ON attendance
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION attendance_notify_delete();
+"""
+
+
+# Présences attendues (expected_attendance.py) : calendrier des jours ouvrés, effectif actif
+# des ouvriers et absences déduites, marquées `implicite`
+EXPECTED_TABLES_SQL = """
+    CREATE TABLE IF NOT EXISTS work_calendar (
+        jour date PRIMARY KEY,
+        ouvre boolean NOT NULL,
+        libelle varchar(100),
+        attendus integer,
+        implicites integer,
+        materialise_le timestamp
+    );
+
+    ALTER TABLE workers ADD COLUMN IF NOT EXISTS actif boolean NOT NULL DEFAULT true;
+    ALTER TABLE workers ADD COLUMN IF NOT EXISTS date_entree date;
+    ALTER TABLE workers ADD COLUMN IF NOT EXISTS date_sortie date;
+
+    ALTER TABLE attendance ADD COLUMN IF NOT EXISTS implicite boolean NOT NULL DEFAULT false;
+"""
+
+# Un scan qui remplace une absence déduite (ATTENDANCE_UPSERT_SQL) la rend explicite
+EXPECTED_TRIGGERS_SQL = """
+    CREATE OR REPLACE FUNCTION attendance_implicite_update() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.implicite := false;
+        RETURN NEW;
+    END $$;
+
+    DROP TRIGGER IF EXISTS attendance_implicite_update ON attendance;
+    CREATE TRIGGER attendance_implicite_update
+        BEFORE UPDATE ON attendance
+        FOR EACH ROW WHEN (OLD.implicite)
+        EXECUTE FUNCTION attendance_implicite_update();
+"""
+
+
+def install_notifications(db=None):
+    """Installe les triggers qui notifient les écritures dans `attendance` (voir listener.py)"""
+    db = db or DatabaseManager()
+    try:
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(NOTIFY_TRIGGERS_SQL)
+        print(f"✅ Notifications des changements installées (canal « {CHANNEL} »)")
+        return True, "✅ Notifications installées"
+    except Exception as e:
+        print(f"❌ Erreur installation des notifications : {e}")
+        return False, f"❌ Installation échouée : {e}"
+
+
+def install_rollups(db=None):
+    """Crée (ou met à jour) les tables de synthèse et leurs triggers, puis les remplit"""
+    db = db or DatabaseManager()
+    try:
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(FUNCTIONS_SQL)
+                cur.execute(ROLLUP_TABLES_SQL)
+                cur.execute(ROLLUP_TRIGGERS_SQL)
+        db._rollups = None
+        print("✅ Tables de synthèse installées")
+    except Exception as e:
+        print(f"❌ Erreur installation des tables de synthèse : {e}")
+        return False, f"❌ Installation échouée : {e}"
+
+    return rebuild_rollups(db)
+
+
+def _rebuild_where(colonne, date_debut, date_fin, catalogue):
+    """
+    Clause WHERE (et paramètres) du recalcul sur la colonne de date `colonne` : période
+    demandée, hors mois archivés (`catalogue` : attendance_archive existe) et détachés
+    """
+    conditions, params = [], ()
+    if date_debut and date_fin:
+        conditions.append(f"{colonne} BETWEEN %s AND %s")
+        params = (date_debut, date_fin)
+    if catalogue:
+        conditions.append(f"date_trunc('month', {colonne})::date NOT IN (SELECT mois FROM attendance_archive)")
+    conditions.append(f"""to_char({colonne}, '"attendance_"YYYY_MM') NOT IN (
+        SELECT c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = '{ARCHIVE_SCHEMA}'
+    )""")
+    return f"WHERE {' AND '.join(conditions)}", params
+
+
+def rebuild_rollups(db=None, date_debut=None, date_fin=None):
+    """
+    Recalcule les tables de synthèse depuis `attendance` (tout l'historique ou une période).
+    Les mois archivés par la rétention ou détachés (partitioning.py) ne sont plus dans
+    `attendance` : leurs synthèses sont conservées.
+    """
+    db = db or DatabaseManager()
+
+    try:
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                # Bloque les écritures le temps du recalcul pour ne perdre aucun pointage
+                cur.execute("LOCK TABLE attendance IN SHARE MODE")
+
+                cur.execute("SELECT to_regclass('attendance_archive') IS NOT NULL")
+                catalogue = cur.fetchone()[0]
+                # Même période et mêmes mois exclus, sur la colonne de date de chaque table
+                where, params = _rebuild_where('jour', date_debut, date_fin, catalogue)
+                source_where, source_params = _rebuild_where('attendance_date', date_debut, date_fin, catalogue)
+
+                cur.execute(f"DELETE FROM attendance_daily_summary {where}", params)
+                cur.execute(f"""
+                    INSERT INTO attendance_daily_summary (jour, domaine, statut, nombre)
+                    SELECT attendance_date, qr_domaine(employee_id), qr_statut(status), count(*)
+                    FROM attendance {source_where}
+                    GROUP BY 1, 2, 3
+                """, source_params)
+                jours = cur.rowcount
+
+                cur.execute(f"DELETE FROM attendance_employee_daily {where}", params)
+                cur.execute(f"""
+                    INSERT INTO attendance_employee_daily (jour, matricule, statut, nombre)
+                    SELECT attendance_date, upper(btrim(employee_id)), qr_statut(status), count(*)
+                    FROM attendance {source_where}
+                    GROUP BY 1, 2, 3
+                """, source_params)
+                employes = cur.rowcount
+
+        print(f"✅ Synthèses recalculées : {jours} lignes domaine, {employes} lignes employé")
+        return True, f"✅ Synthèses recalculées ({jours} + {employes} lignes)"
+
+    except Exception as e:
+        print(f"❌ Erreur recalcul des synthèses : {e}")
+        return False, f"❌ Recalcul échoué : {e}"
+
+
+# Index composites couvrant les accès de database.py :
+# - plage de dates triée par date/heure (get_attendance_data, agrégats sans synthèse)
+# - filtre et jointure par employé (workers.matricule = attendance.employee_id)
+# - synchronisation incrémentale sur updated_at (get_attendance_since ; id est la clé primaire)
+# Une fois la clé d'unicité installée (dedupe_attendance), elle remplace l'index par employé.
+INDEXES = {
+    'idx_attendance_date_checkin': "attendance (attendance_date DESC, check_in_time DESC)",
+    'idx_attendance_employee_date': "attendance (employee_id, attendance_date)",
+    'idx_attendance_updated_at': "attendance (updated_at)",
+}
+UNIQUE_KEY = 'uq_attendance_employee_day'
+
+
+def install_indexes(db=None):
+    """Crée les index manquants sans bloquer les écritures (idempotent)"""
+    db = db or DatabaseManager()
+    created = []
+    indexes = dict(INDEXES)
+    # CONCURRENTLY n'existe pas pour une table partitionnée (l'index est propagé aux partitions)
+    concurrently = "" if db.attendance_partitioned() else "CONCURRENTLY "
+
+    try:
+        if db.unique_key_available():
+            indexes.pop('idx_attendance_employee_date')
+        with db.get_connection() as conn:
+            # CREATE INDEX CONCURRENTLY est interdit dans une transaction
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cur:
+                    for name, definition in indexes.items():
+                        cur.execute("SELECT to_regclass(%s) IS NULL", (name,))
+                        if cur.fetchone()[0]:
+                            cur.execute(f"CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {definition}")
+                            created.append(name)
+                    cur.execute("ANALYZE attendance")
+            finally:
+                conn.autocommit = False
+
+        print(f"✅ Index vérifiés ({len(created)} créé(s))")
+        return True, f"✅ {len(indexes)} index présents, {len(created)} créé(s)"
+
+    except Exception as e:
+        print(f"❌ Erreur création des index : {e}")
+        return False, f"❌ Création des index échouée : {e}"
+
+
+def dedupe_attendance(db=None):
+    """
+    Migration unique : supprime les pointages en double (même employé, même jour) puis
+    installe la clé d'unicité utilisée par les écritures ON CONFLICT de database.py.
+    Pour chaque jour est conservé le premier scan, ou à défaut la première absence
+    (même règle que ATTENDANCE_UPSERT_SQL). Les synthèses suivent via leurs triggers.
+    """
+    db = db or DatabaseManager()
+
+    try:
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                # Bloque les écritures jusqu'à la création de la clé
+                cur.execute("LOCK TABLE attendance IN SHARE ROW EXCLUSIVE MODE")
+                cur.execute("""
+                    DELETE FROM attendance a
+                    USING (
+                        SELECT id, row_number() OVER (
+                            PARTITION BY employee_id, attendance_date
+                            ORDER BY lower(btrim(status)) = 'absent', check_in_time, id
+                        ) AS rang
+                        FROM attendance
+                    ) d
+                    WHERE a.id = d.id AND d.rang > 1
+                    RETURNING a.attendance_date
+                """)
+                supprimes = cur.fetchall()
+                jours = {row[0] for row in supprimes}
+
+                cur.execute(
+                    f"CREATE UNIQUE INDEX IF NOT EXISTS {UNIQUE_KEY} "
+                    "ON attendance (employee_id, attendance_date)"
+                )
+                # Redondant avec la clé d'unicité (mêmes colonnes)
+                cur.execute("DROP INDEX IF EXISTS idx_attendance_employee_date")
+
+        db._unique_key = None
+        # Les mois clos déjà capturés contiennent encore les doublons
+        if jours:
+            db.invalidate_history(min(jours), max(jours))
+
+        print(f"✅ {len(supprimes)} doublon(s) supprimé(s), clé d'unicité installée")
+        return True, f"✅ Clé d'unicité installée ({len(supprimes)} doublon(s) supprimé(s))"
+
+    except Exception as e:
+        print(f"❌ Erreur dédoublonnage des pointages : {e}")
+        return False, f"❌ Dédoublonnage échoué : {e}"
+
+
+def _plan_nodes(node):
+    """Parcourt récursivement les nœuds d'un plan EXPLAIN au format JSON"""
+    yield node
+    for child in node.get('Plans', []):
+        yield from _plan_nodes(child)
+
+
+def verify_query_plans(db=None, date_debut=None, date_fin=None, min_rows=None):
+    """
+    Exécute EXPLAIN (ANALYZE, BUFFERS) sur chaque requête de lecture du DatabaseManager.
+    Lève QueryPlanError si l'une d'elles parcourt séquentiellement une table de plus
+    de `min_rows` lignes ; retourne sinon le rapport (temps, blocs, types de parcours).
+    """
+    db = db or DatabaseManager()
+    min_rows = min_rows if min_rows is not None else int(os.getenv('PLAN_SEQSCAN_MIN_ROWS', '10000'))
+    date_fin = date_fin or datetime.now().date()
+    date_debut = date_debut or date_fin - timedelta(days=90)
+
+    report = []
+    violations = []
+    table_sizes = {}
+
+    # Repère lu avant d'emprunter la connexion des EXPLAIN
+    queries = db.read_queries(date_debut, date_fin)
+
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            for name, (query, params) in queries.items():
+                cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", params or None)
+                plan = cur.fetchone()[0][0]
+                nodes = list(_plan_nodes(plan['Plan']))
+
+                seq_scans = []
+                for node in nodes:
+                    if node['Node Type'] != 'Seq Scan':
+                        continue
+                    relation = node['Relation Name']
+                    if relation not in table_sizes:
+                        cur.execute(
+                            "SELECT coalesce(max(reltuples), 0)::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+                            (relation,)
+                        )
+                        table_sizes[relation] = cur.fetchone()[0]
+                    seq_scans.append(relation)
+                    if table_sizes[relation] >= min_rows:
+                        violations.append(
+                            f"{name} : parcours séquentiel de {relation} (~{table_sizes[relation]} lignes)"
+                        )
+
+                report.append({
+                    'Requête': name,
+                    'Temps (ms)': round(plan.get('Execution Time', 0), 2),
+                    'Blocs lus': plan['Plan'].get('Shared Hit Blocks', 0) + plan['Plan'].get('Shared Read Blocks', 0),
+                    'Lignes': plan['Plan'].get('Actual Rows', 0),
+                    'Parcours': ", ".join(sorted({n['Node Type'] for n in nodes if 'Scan' in n['Node Type']})),
+                    'Seq Scan': ", ".join(seq_scans) or "-",
+                })
+        conn.rollback()
+
+    report = pd.DataFrame(report)
+    if violations:
+        message = "❌ Parcours séquentiels sur de grandes tables :\n" + "\n".join(violations)
+        print(message)
+        raise QueryPlanError(message, report)
+
+    print(f"✅ {len(report)} plans de requêtes vérifiés")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gestion du schéma QR Pointage")
+    sub = parser.add_subparsers(dest="commande", required=True)
+
+    sub.add_parser("install-rollups", help="Installe les tables de synthèse et leurs triggers")
+
+    rebuild = sub.add_parser("rebuild-rollups", help="Recalcule les tables de synthèse")
+    rebuild.add_argument("--debut", type=lambda d: datetime.strptime(d, "%Y-%m-%d").date())
+    rebuild.add_argument("--fin", type=lambda d: datetime.strptime(d, "%Y-%m-%d").date())
+
+    sub.add_parser("install-indexes", help="Crée les index composites manquants")
+
+    sub.add_parser("install-notify", help="Installe les triggers de notification des changements")
+
+    sub.add_parser("dedupe-attendance", help="Supprime les doublons et installe la clé d'unicité")
+
+    verify = sub.add_parser("verify-plans", help="Vérifie les plans des requêtes de lecture")
+    verify.add_argument("--min-rows", type=int, default=None)
+
+    history = sub.add_parser("invalidate-history", help="Oublie les mois capturés dans l'historique local")
+    history.add_argument("--debut", type=lambda d: datetime.strptime(d, "%Y-%m-%d").date(), required=True)
+    history.add_argument("--fin", type=lambda d: datetime.strptime(d, "%Y-%m-%d").date())
+
+    args = parser.parse_args()
+
+    if args.commande == "install-rollups":
+        success, _ = install_rollups()
+    elif args.commande == "rebuild-rollups":
+        success, _ = rebuild_rollups(date_debut=args.debut, date_fin=args.fin)
+    elif args.commande == "install-indexes":
+        success, _ = install_indexes()
+    elif args.commande == "install-notify":
+        success, _ = install_notifications()
+    elif args.commande == "dedupe-attendance":
+        success, _ = dedupe_attendance()
+    elif args.commande == "invalidate-history":
+        DatabaseManager().invalidate_history(args.debut, args.fin)
+        success = True
+    else:
+        try:
+            print(verify_query_plans(min_rows=args.min_rows).to_string(index=False))
+            success = True
+        except QueryPlanError as e:
+            print(e.report.to_string(index=False))
+            success = False
+
+    raise SystemExit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,493 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from attendance_frame import AttendanceFrame, DOMAINES, EPOCH, _jour
+from database import STATUTS
+from domains import domain_registry
+
+# Domaines détaillés dans les résumés (tableau de bord, rapports, chatbot) : tous sauf le domaine par défaut
+DOMAINES_RESUME = domain_registry().names
+
+
+def _codes(values, categories):
+    """Codes entiers d'une colonne (catégories connues en tête, -1 si manquante) et catégories complètes"""
+    values = pd.Categorical(values)
+    autres = sorted(set(values.categories) - set(categories), key=str)
+    values = values.set_categories(list(categories) + autres)
+    return values.codes, list(categories) + autres
+
+
+def _datetimes(values):
+    """Colonne datetime64, convertie seulement si nécessaire"""
+    return values if pd.api.types.is_datetime64_any_dtype(values) else pd.to_datetime(values)
+
+
+def _day_codes(dates):
+    """Numéros de jour (depuis 1970-01-01) d'une colonne de dates, -1 si absente ; une seule conversion"""
+    dates = _datetimes(dates)
+    jours = dates.values.astype('datetime64[D]').astype(np.int64) - EPOCH.astype(np.int64)
+    return np.where(dates.isna(), -1, jours)
+
+
+def _cube(jours, domaines, statuts, n_domaines, n_statuts, poids=None):
+    """
+    Comptes jour × domaine × statut en un seul bincount. Le dernier indice de chaque axe
+    reçoit les valeurs manquantes (code -1) : le cube totalise toujours toutes les lignes.
+    Retourne (jours observés, cube).
+    """
+    valides = jours >= 0
+    premier = int(jours[valides].min()) if valides.any() else 0
+    n_jours = int(jours[valides].max()) - premier + 1 if valides.any() else 0
+
+    shape = (n_jours + 1, n_domaines + 1, n_statuts + 1)
+    jour = np.where(valides, jours - premier, n_jours)
+    domaine = np.where(domaines >= 0, domaines, n_domaines)
+    statut = np.where(statuts >= 0, statuts, n_statuts)
+    flat = (jour.astype(np.int64) * shape[1] + domaine) * shape[2] + statut
+    cube = np.bincount(flat, weights=poids, minlength=int(np.prod(shape))).astype(np.int64).reshape(shape)
+
+    # Seuls les jours ayant des pointages sont conservés (le calendrier complet est creux)
+    observes = np.flatnonzero(cube[:-1].sum(axis=(1, 2)) > 0)
+    jours_observes = (observes + premier + EPOCH.astype(np.int64)).astype('datetime64[D]')
+    return jours_observes, np.concatenate([cube[observes], cube[-1:]])
+
+
+class AttendanceStats:
+    """
+    Indicateurs d'une sélection de pointages, tous dérivés d'un même cube jour × domaine × statut
+    construit en une passe : totaux, taux de présence, répartition par domaine, série journalière
+    et comparaison avec la veille. to_dict() et domain_summary() gardent les formats historiques.
+    """
+
+    __slots__ = ('days', 'domains', 'statuts', 'cube', 'total_employees', 'new_employees_today', 'today')
+
+    def __init__(self, days, domains, statuts, cube, total_employees, new_employees_today, today=None):
+        self.days = days
+        self.domains = domains
+        self.statuts = statuts
+        # Dernière ligne / colonne de chaque axe : jour, domaine ou statut manquant
+        self.cube = cube
+        self.total_employees = total_employees
+        self.new_employees_today = new_employees_today
+        self.today = today or datetime.now().date()
+
+    # --- Construction -----------------------------------------------------
+
+    @classmethod
+    def from_frame(cls, frame, today=None):
+        """Depuis un AttendanceFrame : les codes sont déjà des entiers"""
+        today = today or datetime.now().date()
+        days, cube = _cube(
+            frame.day.astype(np.int64), frame.domain, frame.status, len(DOMAINES), len(frame.statuts)
+        )
+        created_today = frame.created.astype('datetime64[D]') == np.datetime64(today, 'D')
+        valides = frame.emp >= 0
+        return cls(
+            days, list(DOMAINES), list(frame.statuts), cube,
+            len(np.unique(frame.emp[valides])),
+            len(np.unique(frame.emp[created_today & valides])),
+            today
+        )
+
+    @classmethod
+    def from_dataframe(cls, df, today=None):
+        """Depuis un DataFrame de pointages (matricule, domaine, statut, date_pointage, created_at)"""
+        today = today or datetime.now().date()
+        n = len(df)
+        manquant = np.full(n, -1, dtype=np.int64)
+
+        jours = _day_codes(df['date_pointage']) if 'date_pointage' in df.columns else manquant
+        if 'domaine' in df.columns:
+            domaines, domains = _codes(df['domaine'], DOMAINES)
+        elif 'matricule' in df.columns:
+            # Blocs bruts (iter_attendance_chunks) : domaine déduit du matricule
+            domaines, domains = domain_registry().codes(df['matricule']), list(DOMAINES)
+        else:
+            domaines, domains = manquant, list(DOMAINES)
+        statuts, labels = _codes(df['statut'], STATUTS) if 'statut' in df.columns else (manquant, list(STATUTS))
+        days, cube = _cube(jours, domaines, statuts, len(domains), len(labels))
+
+        total_employees = new_today = 0
+        if 'matricule' in df.columns:
+            total_employees = df['matricule'].nunique()
+            if 'created_at' in df.columns:
+                created = _datetimes(df['created_at']).values.astype('datetime64[D]')
+                created_today = created == np.datetime64(today, 'D')
+                new_today = df['matricule'][created_today].nunique()
+
+        return cls(days, domains, labels, cube, total_employees, new_today, today)
+
+    @classmethod
+    def from_counts(cls, daily_counts, employee_counts=None, today=None):
+        """Depuis les agrégats SQL (comptes journaliers par domaine/statut, comptes par employé)"""
+        today = today or datetime.now().date()
+        domaines, domains = _codes(daily_counts['domaine'], DOMAINES)
+        statuts, labels = _codes(daily_counts['statut'], STATUTS)
+        days, cube = _cube(
+            _day_codes(daily_counts['date_pointage']), domaines, statuts, len(domains), len(labels),
+            poids=daily_counts['nombre'].to_numpy(dtype=np.float64)
+        )
+
+        total_employees = new_today = 0
+        if employee_counts is not None and not employee_counts.empty:
+            total_employees = len(employee_counts)
+            new_today = int((employee_counts['dernier_pointage'].dt.date == today).sum())
+
+        return cls(days, domains, labels, cube, total_employees, new_today, today)
+
+    # --- Indicateurs ------------------------------------------------------
+
+    @property
+    def empty(self):
+        return self.total_records == 0
+
+    @property
+    def total_records(self):
+        return int(self.cube.sum())
+
+    @property
+    def status_totals(self):
+        """Nombre de pointages par statut (statuts observés)"""
+        totals = self.cube[:, :, :-1].sum(axis=(0, 1))
+        return {s: int(n) for s, n in zip(self.statuts, totals) if n > 0}
+
+    def status_count(self, statut):
+        return self.status_totals.get(statut, 0)
+
+    def presence_rate(self, domaine=None):
+        """Taux de présence (en %) global ou d'un domaine"""
+        cube = self.cube
+        if domaine:
+            if domaine not in self.domains:
+                return 0
+            cube = cube[:, self.domains.index(domaine)]
+        total = int(cube.sum())
+        if total == 0:
+            return 0
+        return (int(cube[..., self.statuts.index('Présent')].sum()) / total) * 100
+
+    def domain_matrix(self):
+        """Tableau domaine × statut des domaines et statuts observés"""
+        matrix = pd.DataFrame(
+            self.cube[:, :-1, :-1].sum(axis=0), index=self.domains, columns=self.statuts
+        )
+        return matrix.loc[matrix.sum(axis=1) > 0, matrix.sum(axis=0) > 0]
+
+    def daily(self):
+        """Série journalière date × statut (jours et statuts observés)"""
+        series = pd.DataFrame(
+            self.cube[:-1, :, :-1].sum(axis=1),
+            index=pd.DatetimeIndex(self.days, name='date_pointage'), columns=self.statuts
+        )
+        return series.loc[:, series.sum(axis=0) > 0]
+
+    def day_totals(self, jour):
+        """Nombre de pointages par statut d'un jour, None si aucun pointage ce jour-là"""
+        position = np.searchsorted(self.days, np.datetime64(jour, 'D'))
+        if position >= len(self.days) or self.days[position] != np.datetime64(jour, 'D'):
+            return None
+        counts = self.cube[position].sum(axis=0)
+        totals = {s: int(n) for s, n in zip(self.statuts, counts[:-1])}
+        totals['total'] = int(counts.sum())
+        return totals
+
+    def between(self, debut, fin, total_employees=0, new_employees_today=0):
+        """Indicateurs restreints aux jours de [debut, fin] (tranche du cube, sans nouveau comptage)"""
+        lo = np.searchsorted(self.days, np.datetime64(debut, 'D'), side='left')
+        hi = np.searchsorted(self.days, np.datetime64(fin, 'D'), side='right')
+        # Les pointages sans date n'appartiennent à aucune période
+        cube = np.concatenate([self.cube[lo:hi], np.zeros_like(self.cube[-1:])])
+        return AttendanceStats(
+            self.days[lo:hi], self.domains, self.statuts, cube, total_employees, new_employees_today, self.today
+        )
+
+    def for_domain(self, domaine):
+        """Indicateurs restreints à un domaine (effectifs non recalculés)"""
+        cube = np.zeros_like(self.cube)
+        if domaine in self.domains:
+            position = self.domains.index(domaine)
+            cube[:, position] = self.cube[:, position]
+        return AttendanceStats(
+            self.days, self.domains, self.statuts, cube, self.total_employees, self.new_employees_today, self.today
+        )
+
+    def cells(self):
+        """Cases non nulles du cube : ((jour, domaine, statut), nombre), None pour une valeur manquante"""
+        jours = np.append(self.days.astype(np.int64), -1)
+        domaines = self.domains + [None]
+        statuts = self.statuts + [None]
+        for j, d, s in zip(*np.nonzero(self.cube)):
+            yield (int(jours[j]), domaines[d], statuts[s]), int(self.cube[j, d, s])
+
+    # --- Formats historiques ----------------------------------------------
+
+    def to_dict(self):
+        """Mêmes clés que utils.calculate_statistics (tableau de bord, rapports)"""
+        if self.empty:
+            return {
+                'total_employees': 0,
+                'total_records': 0,
+                'total_present': 0,
+                'total_absent': 0,
+                'total_late': 0,
+                'new_employees_today': 0
+            }
+
+        stats = {
+            'total_employees': self.total_employees,
+            'total_records': self.total_records,
+            'total_present': self.status_count('Présent'),
+            'total_absent': self.status_count('Absent'),
+            'total_late': self.status_count('Retard'),
+            'domain_breakdown': self.domain_matrix().to_dict(),
+            'new_employees_today': self.new_employees_today,
+        }
+
+        yesterday = self.day_totals(self.today - timedelta(days=1))
+        if yesterday is not None:
+            stats['yesterday_presence_rate'] = (yesterday['Présent'] / max(yesterday['total'], 1)) * 100
+            stats['present_vs_yesterday'] = stats['total_present'] - yesterday['Présent']
+            stats['late_vs_yesterday'] = stats['total_late'] - yesterday['Retard']
+
+        return stats
+
+    def domain_summary(self):
+        """Même résumé par domaine que utils.generate_domain_summary"""
+        if self.empty:
+            return {}
+
+        matrix = self.cube.sum(axis=0)
+        summary = {}
+        for domain in DOMAINES_RESUME:
+            row = matrix[self.domains.index(domain)]
+            total = int(row.sum())
+            present = int(row[self.statuts.index('Présent')])
+            summary[domain] = {
+                'total': total,
+                'present': present,
+                'absent': int(row[self.statuts.index('Absent')]),
+                'late': int(row[self.statuts.index('Retard')]),
+                'presence_rate': (present / total) * 100 if total > 0 else 0
+            }
+        return summary
+
+
+def attendance_stats(source, employee_counts=None, today=None):
+    """Indicateurs d'un AttendanceFrame, d'un DataFrame de pointages ou de comptes journaliers"""
+    if isinstance(source, AttendanceFrame):
+        return AttendanceStats.from_frame(source, today)
+    if 'nombre' in source.columns:
+        return AttendanceStats.from_counts(source, employee_counts, today)
+    return AttendanceStats.from_dataframe(source, today)
+
+
+def _employee_cells(source, today):
+    """Comptes (matricule, statut) et matricules créés ce jour d'un bloc de pointages"""
+    if isinstance(source, AttendanceFrame):
+        valides = source.emp >= 0
+        emp, status = source.emp[valides], source.status[valides]
+        n_statuts = len(source.statuts) + 1
+        flat = emp.astype(np.int64) * n_statuts + np.where(status >= 0, status, n_statuts - 1)
+        counts = np.bincount(flat, minlength=len(source.employees) * n_statuts)
+        statuts = source.statuts + [None]
+        cells = {
+            (source.employees[i // n_statuts], statuts[i % n_statuts]): int(counts[i])
+            for i in np.flatnonzero(counts)
+        }
+        created_today = source.created[valides].astype('datetime64[D]') == np.datetime64(today, 'D')
+        return cells, set(source.employees[np.unique(emp[created_today])])
+
+    if source.empty or 'matricule' not in source.columns:
+        return {}, set()
+
+    statut = source['statut'] if 'statut' in source.columns else pd.Series(None, index=source.index, dtype=object)
+    counts = source.groupby([source['matricule'], statut], observed=True, dropna=False).size()
+    cells = {
+        (matricule, None if pd.isna(s) else s): int(n)
+        for (matricule, s), n in counts.items() if n > 0 and not pd.isna(matricule)
+    }
+    new_today = set()
+    if 'created_at' in source.columns:
+        created = _datetimes(source['created_at']).values.astype('datetime64[D]')
+        new_today = set(source['matricule'][created == np.datetime64(today, 'D')].dropna())
+    return cells, new_today
+
+
+class StatsAccumulator:
+    """
+    Indicateurs cumulés bloc par bloc : comptes par (jour, domaine, statut) et par (employé, statut),
+    matricules créés ce jour. update() ajoute un bloc, merge() combine deux accumulateurs (blocs
+    traités dans d'autres processus), finalize() donne le même dict que calculate_statistics
+    sur l'ensemble des blocs. La mémoire dépend du nombre de jours et d'employés, pas de lignes.
+    """
+
+    def __init__(self, today=None):
+        # Date de référence fixée à la création : tous les blocs sont comparés au même « aujourd'hui »
+        self.today = today or datetime.now().date()
+        self.rows = 0
+        self._cells = {}
+        self._employees = {}
+        self._new_today = set()
+
+    def update(self, chunk):
+        """Ajoute un bloc de pointages (DataFrame ou AttendanceFrame)"""
+        if len(chunk) == 0:
+            return self
+        for cle, nombre in attendance_stats(chunk, today=self.today).cells():
+            self._cells[cle] = self._cells.get(cle, 0) + nombre
+        cells, new_today = _employee_cells(chunk, self.today)
+        for cle, nombre in cells.items():
+            self._employees[cle] = self._employees.get(cle, 0) + nombre
+        self._new_today |= new_today
+        self.rows += len(chunk)
+        return self
+
+    def merge(self, other):
+        """Ajoute les comptes d'un autre accumulateur (même date de référence)"""
+        if other.today != self.today:
+            raise ValueError(f"Dates de référence différentes : {self.today} et {other.today}")
+        for cle, nombre in other._cells.items():
+            self._cells[cle] = self._cells.get(cle, 0) + nombre
+        for cle, nombre in other._employees.items():
+            self._employees[cle] = self._employees.get(cle, 0) + nombre
+        self._new_today |= other._new_today
+        self.rows += other.rows
+        return self
+
+    def employee_counts(self):
+        """Tableau employé × statut des pointages cumulés"""
+        if not self._employees:
+            return pd.DataFrame()
+        counts = pd.Series(self._employees).unstack(fill_value=0).sort_index()
+        ordre = [s for s in STATUTS if s in counts.columns]
+        return counts[ordre + [c for c in counts.columns if c not in ordre]]
+
+    def stats(self):
+        """AttendanceStats des blocs cumulés"""
+        cles = list(self._cells)
+        domaines, domains = _codes([c[1] for c in cles], DOMAINES)
+        statuts, labels = _codes([c[2] for c in cles], STATUTS)
+        days, cube = _cube(
+            np.array([c[0] for c in cles], dtype=np.int64), domaines, statuts, len(domains), len(labels),
+            poids=np.array(list(self._cells.values()), dtype=np.float64)
+        )
+        employees = {matricule for matricule, _ in self._employees}
+        return AttendanceStats(days, domains, labels, cube, len(employees), len(self._new_today), self.today)
+
+    def finalize(self):
+        """Même dict que utils.calculate_statistics sur l'ensemble des blocs"""
+        return self.stats().to_dict()
+
+
+def accumulate(chunks, today=None):
+    """Accumulateur alimenté par un itérable de blocs (utilisable dans un processus de travail)"""
+    accumulator = StatsAccumulator(today)
+    for chunk in chunks:
+        accumulator.update(chunk)
+    return accumulator
+
+
+# Périodes nommées : bornes (début, fin) à partir de la date du jour
+PERIODES = {
+    'today': lambda t: (t, t),
+    'yesterday': lambda t: (t - timedelta(days=1), t - timedelta(days=1)),
+    'week': lambda t: (t - timedelta(days=t.weekday()), t),
+    'last_week': lambda t: (t - timedelta(days=t.weekday() + 7), t - timedelta(days=t.weekday() + 1)),
+    'month': lambda t: (t.replace(day=1), t),
+}
+
+PERIOD_LABELS = {
+    'today': "aujourd'hui",
+    'yesterday': "hier",
+    'week': "cette semaine",
+    'last_week': "la semaine dernière",
+    'month': "ce mois",
+}
+
+
+def resolve_periods(periods, today=None):
+    """
+    {nom: (début, fin)} d'une liste de noms de PERIODES, ou d'un dict {nom: (début, fin)}
+    où une borne à None désigne la période standard du même nom
+    """
+    today = today or datetime.now().date()
+    items = periods.items() if isinstance(periods, dict) else ((nom, None) for nom in periods)
+    bornes = {}
+    for nom, periode in items:
+        if periode is None:
+            if nom not in PERIODES:
+                raise ValueError(f"Période inconnue : {nom}")
+            periode = PERIODES[nom](today)
+        bornes[nom] = tuple(periode)
+    return bornes
+
+
+def _employee_days(source, today):
+    """Paires distinctes (employé, jour) avec indicateur « créé ce jour », None pour des comptes agrégés"""
+    if isinstance(source, AttendanceFrame):
+        valides = source.emp >= 0
+        emp, jours = source.emp[valides].astype(np.int64), source.day[valides].astype(np.int64)
+        created = source.created[valides].astype('datetime64[D]') == np.datetime64(today, 'D')
+    elif 'nombre' in source.columns or 'matricule' not in source.columns:
+        return None
+    else:
+        emp, _ = pd.factorize(source['matricule'])
+        jours = _day_codes(source['date_pointage']) if 'date_pointage' in source.columns else np.full(len(source), -1)
+        created = np.zeros(len(source), dtype=bool)
+        if 'created_at' in source.columns:
+            created = _datetimes(source['created_at']).values.astype('datetime64[D]') == np.datetime64(today, 'D')
+        valides = (emp >= 0) & (jours >= 0)
+        emp, jours, created = emp[valides].astype(np.int64), jours[valides], created[valides]
+
+    if len(emp) == 0:
+        return emp, jours, created
+    # Une ligne par (employé, jour, créé ce jour) : les périodes se testent sur ces paires
+    premier = int(jours.min())
+    span = int(jours.max()) - premier + 1
+    cles = np.unique((emp * span + (jours - premier)) * 2 + created)
+    return cles // 2 // span, cles // 2 % span + premier, (cles % 2).astype(bool)
+
+
+def multi_period_stats(source, periods, today=None):
+    """
+    Indicateurs de plusieurs périodes en une passe sur `source` (AttendanceFrame, DataFrame de
+    pointages ou comptes journaliers couvrant l'union des périodes) : {nom: AttendanceStats}.
+    Chaque période est une tranche du cube ; les effectifs sont comptés sur les paires
+    (employé, jour). Sur des comptes agrégés, les effectifs par période restent à 0.
+    """
+    today = today or datetime.now().date()
+    bornes = resolve_periods(periods, today)
+    base = attendance_stats(source, today=today)
+    paires = _employee_days(source, today)
+
+    resultats = {}
+    for nom, (debut, fin) in bornes.items():
+        total_employees = new_today = 0
+        if paires is not None:
+            emp, jours, created = paires
+            dans = (jours >= _jour(debut)) & (jours <= _jour(fin))
+            total_employees = len(np.unique(emp[dans]))
+            new_today = len(np.unique(emp[dans & created]))
+        resultats[nom] = base.between(debut, fin, total_employees, new_today)
+    return resultats
+
+
+def load_period_stats(db, periods, today=None, detail=False):
+    """
+    Charge une seule fois l'union des périodes puis calcule chacune : comptes journaliers agrégés
+    côté serveur, ou pointages détaillés (dépôt partagé si possible) si `detail` (effectifs exacts)
+    """
+    bornes = resolve_periods(periods, today)
+    debut = min(d for d, _ in bornes.values())
+    fin = max(f for _, f in bornes.values())
+
+    if detail:
+        from repository import shared_repository
+        repository = shared_repository(db)
+        if repository.covers(debut, fin):
+            source = repository.range(debut, fin)
+        else:
+            source = AttendanceFrame.from_dataframe(db.get_attendance_data(debut, fin))
+    else:
+        source = db.get_daily_counts(debut, fin)
+    return multi_period_stats(source, bornes, today)
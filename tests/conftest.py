@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """DatabaseManager sur la base locale DATABASE_URL (test ignoré si elle n'est pas définie)"""
+    url = os.getenv('DATABASE_URL')
+    if not url:
+        pytest.skip("DATABASE_URL non définie : pas de PostgreSQL local")
+
+    # Lectures directes en base : ni historique local ni archives
+    monkeypatch.setenv('Database_url', url)
+    monkeypatch.setenv('HISTORY_DIR', '')
+    monkeypatch.setenv('ARCHIVE_DIR', '')
+
+    from database import DatabaseManager
+    return DatabaseManager()
@@ -0,0 +1,66 @@
+import asyncio
+from datetime import timedelta
+
+import pandas as pd
+
+from async_loader import AsyncDataLoader
+
+
+def _ranges(db, count=6, days=7):
+    """`count` périodes consécutives de `days` jours, finissant au dernier pointage en base"""
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT max(attendance_date) FROM attendance")
+            fin = cur.fetchone()[0]
+    if fin is None:
+        return {}
+    ranges = {}
+    for i in range(count):
+        debut = fin - timedelta(days=days - 1)
+        ranges[f"periode_{i}"] = (debut, fin)
+        fin = debut - timedelta(days=1)
+    return ranges
+
+
+def _normalise(df):
+    """Ordre des lignes indépendant des égalités de tri (date, heure)"""
+    return df.sort_values('id').reset_index(drop=True)
+
+
+def test_concurrent_range_loads_match_sync_loads(db):
+    ranges = _ranges(db)
+    attendus = {name: db.get_attendance_data(*period) for name, period in ranges.items()}
+
+    obtenus = AsyncDataLoader(db).run_ranges(ranges)
+
+    assert set(obtenus) == set(ranges)
+    for name in ranges:
+        pd.testing.assert_frame_equal(_normalise(obtenus[name]), _normalise(attendus[name]))
+
+
+def test_to_thread_loads_through_pool_match_sync_loads(db):
+    ranges = _ranges(db)
+    attendus = {name: db.get_attendance_data(*period) for name, period in ranges.items()}
+
+    async def charger():
+        # Plus de lectures simultanées que de connexions : le pool fait attendre, sans erreur
+        appels = [asyncio.to_thread(db.get_attendance_data, *ranges[name]) for name in ranges for _ in range(3)]
+        return await asyncio.gather(*appels)
+
+    resultats = asyncio.run(charger())
+
+    for i, name in enumerate(n for n in ranges for _ in range(3)):
+        pd.testing.assert_frame_equal(_normalise(resultats[i]), _normalise(attendus[name]))
+
+
+def test_gather_mixes_read_methods(db):
+    ranges = _ranges(db, count=2)
+    (debut, fin), _ = ranges.values()
+
+    obtenus = AsyncDataLoader(db, max_concurrency=2).run({
+        'detail': ('get_attendance_data', (debut, fin)),
+        'employes': ('get_employee_counts', (debut, fin)),
+    })
+
+    pd.testing.assert_frame_equal(_normalise(obtenus['detail']), _normalise(db.get_attendance_data(debut, fin)))
+    pd.testing.assert_frame_equal(obtenus['employes'], db.get_employee_counts(debut, fin))
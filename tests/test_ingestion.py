@@ -0,0 +1,116 @@
+import threading
+from datetime import datetime
+
+from ingestion import ScanQueue, shared_scan_queue, stop_all_queues
+
+
+class FakeDB:
+    """Base factice : enregistre les lots reçus ; `disponible` simule une panne"""
+
+    def __init__(self, disponible=True):
+        self.disponible = disponible
+        self.lots = []
+
+    def insert_attendance_batch(self, pointages):
+        if not self.disponible:
+            return [(False, "❌ base injoignable")] * len(pointages)
+        self.lots.append(list(pointages))
+        return [(True, f"✅ Pointage enregistré : {p[0]}") for p in pointages]
+
+    def test_connection(self):
+        return self.disponible, ""
+
+    @property
+    def matricules(self):
+        return [p[0] for lot in self.lots for p in lot]
+
+
+def _file(db, tmp_path, **options):
+    return ScanQueue(db, flush_interval=0.05, spill_path=str(tmp_path / "spill.jsonl"), **options)
+
+
+def test_enqueue_flush_ack(tmp_path):
+    db = FakeDB()
+    scan_queue = _file(db, tmp_path)
+
+    resultats = [scan_queue.enqueue(m, "present") for m in ("c0001", "P0002", "R0003")]
+    assert all(ok for ok, _ in resultats)
+    assert scan_queue.flush(timeout=5)
+    scan_queue.stop()
+
+    assert db.matricules == ["C0001", "P0002", "R0003"]
+    assert scan_queue.stats['flushed'] == 3
+    # Tous les scans confirmés : rien à rejouer
+    assert scan_queue._pending_from_spill() == []
+
+
+def test_unacked_scans_are_replayed_after_crash(tmp_path):
+    panne = FakeDB(disponible=False)
+    avant = _file(panne, tmp_path)
+    for m in ("C0001", "P0002"):
+        ok, _ = avant.enqueue(m, "present", horodatage=datetime(2026, 3, 2, 8, 0))
+        assert ok
+    # Arrêt sans confirmation (base injoignable) : les scans ne restent que dans le journal
+    avant.stop(timeout=5)
+    assert panne.lots == []
+    assert len(avant._pending_from_spill()) == 2
+
+    db = FakeDB()
+    apres = _file(db, tmp_path).start()
+    assert apres.flush(timeout=5)
+    apres.stop()
+
+    assert sorted(db.matricules) == ["C0001", "P0002"]
+    assert db.lots[0][0][2] == "2026-03-02T08:00:00"
+    assert apres._pending_from_spill() == []
+
+    # Redémarrage suivant : plus rien à rejouer
+    db_suivante = FakeDB()
+    _file(db_suivante, tmp_path).start().stop()
+    assert db_suivante.lots == []
+
+
+def test_concurrent_starts_share_one_writer(tmp_path):
+    scan_queue = _file(FakeDB(), tmp_path)
+    barriere = threading.Barrier(8)
+    erreurs = []
+
+    def demarrer():
+        barriere.wait()
+        try:
+            scan_queue.start()
+        except Exception as e:
+            erreurs.append(e)
+
+    avant = sum(t.name == "scan-queue" for t in threading.enumerate())
+    threads = [threading.Thread(target=demarrer) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    try:
+        assert erreurs == []
+        assert sum(t.name == "scan-queue" for t in threading.enumerate()) == avant + 1
+    finally:
+        scan_queue.stop()
+
+
+def test_insert_attendance_goes_through_queue(db, tmp_path, monkeypatch):
+    monkeypatch.setenv('SCAN_QUEUE', '1')
+    monkeypatch.setenv('SCAN_SPILL_FILE', str(tmp_path / "spill.jsonl"))
+    matricule = 'ZTESTQUEUE1'
+    try:
+        ok, message = db.insert_attendance(matricule, "present")
+        assert ok, message
+        assert shared_scan_queue(db).flush(timeout=10)
+
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT count(*) FROM attendance WHERE employee_id = %s", (matricule,))
+                assert cur.fetchone()[0] == 1
+    finally:
+        stop_all_queues()
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM attendance WHERE employee_id = %s", (matricule,))
+                cur.execute("DELETE FROM workers WHERE matricule = %s", (matricule,))
@@ -0,0 +1,85 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from data_cache import AttendanceCache
+from listener import ChangeListener
+from schema import install_notifications
+
+MATRICULE = 'ZTESTLISTEN1'
+
+
+def _attendre(recus, deja, timeout=10):
+    """Attend que l'abonné de test (prévenu en dernier) ait reçu une notification de plus"""
+    debut = time.monotonic()
+    while len(recus) <= deja:
+        assert time.monotonic() - debut < timeout, "aucune notification reçue"
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def ecoute(db):
+    """Cache branché sur un ChangeListener connecté ; le pointage de test est retiré à la fin"""
+    succes, message = install_notifications(db)
+    assert succes, message
+
+    cache = AttendanceCache(db)
+    listener = ChangeListener(db, reconnect_delay=1)
+    recus = []
+    cache.attach_listener(listener)
+    # Abonné après le cache : prévenu une fois le cache à jour
+    listener.subscribe(lambda debut, fin, matricules: recus.append((debut, fin, matricules)))
+    listener.start()
+
+    debut = time.monotonic()
+    while not listener.connected and time.monotonic() - debut < 10:
+        time.sleep(0.05)
+    assert listener.connected
+
+    try:
+        yield cache, listener, recus
+    finally:
+        listener.stop()
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM attendance WHERE employee_id = %s", (MATRICULE,))
+                cur.execute("DELETE FROM workers WHERE matricule = %s", (MATRICULE,))
+
+
+def test_insert_and_delete_reach_subscribers_and_cache(db, ecoute):
+    cache, _, recus = ecoute
+    horodatage = datetime.now()
+    jour, veille = horodatage.date(), horodatage.date() - timedelta(days=1)
+    periode = (jour - timedelta(days=3), jour)
+
+    avant = cache.get(*periode)
+    assert MATRICULE not in set(avant['matricule'].astype(str))
+
+    [(ok, message)] = db.insert_attendance_batch([(MATRICULE, 'present', horodatage)])
+    assert ok, message
+    _attendre(recus, 0)
+    assert recus[-1] == (jour, jour, [MATRICULE])
+    assert MATRICULE in set(cache.get(*periode)['matricule'].astype(str))
+
+    # Changement de date : retiré de son ancien jour comme par une suppression
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("UPDATE attendance SET attendance_date = %s WHERE employee_id = %s", (veille, MATRICULE))
+    _attendre(recus, 1)
+    assert recus[-1] == (veille, jour, [MATRICULE])
+    assert cache.watermark(*periode) is None
+    deplace = cache.get(*periode)
+    assert list(deplace.loc[deplace['matricule'].astype(str) == MATRICULE, 'date_pointage'].dt.date) == [veille]
+
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM attendance WHERE employee_id = %s", (MATRICULE,))
+    _attendre(recus, 2)
+    assert recus[-1] == (veille, veille, [MATRICULE])
+
+    # Suppression : la période est oubliée, pas seulement marquée pour un delta
+    assert cache.watermark(*periode) is None
+    apres = cache.get(*periode)
+    assert MATRICULE not in set(apres['matricule'].astype(str))
+    assert len(apres) == len(avant)
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from attendance_frame import AttendanceFrame
+from benchmarks.prediction_features import legacy_prepare_data, synthetic
+from database import typer_pointages
+from prediction import AttendancePrediction
+
+
+def _pointages(lignes):
+    """Pointages typés comme à la lecture : (matricule, date, statut)"""
+    dates = pd.to_datetime([date for _, date, _ in lignes])
+    return typer_pointages(pd.DataFrame({
+        'id': np.arange(len(lignes), dtype=np.int64),
+        'matricule': [matricule for matricule, _, _ in lignes],
+        'date_pointage': dates,
+        'heure_pointage': '08:00:00',
+        'statut': [statut for _, _, statut in lignes],
+        'created_at': dates + pd.Timedelta(hours=8),
+    }))
+
+
+def _compare(df):
+    attendu = legacy_prepare_data(df.copy())
+    obtenu = AttendancePrediction().prepare_data(df)
+    pd.testing.assert_frame_equal(obtenu, attendu, check_exact=True)
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_matches_legacy_on_synthetic_data(seed):
+    _compare(synthetic(120, 8, seed=seed))
+
+
+def test_matches_legacy_on_attendance_frame():
+    df = synthetic(120, 8)
+    attendu = legacy_prepare_data(df.copy())
+    obtenu = AttendancePrediction().prepare_data(AttendanceFrame.from_dataframe(df))
+    pd.testing.assert_frame_equal(obtenu, attendu, check_exact=True)
+
+
+def test_duplicate_dates_per_employee():
+    # Plusieurs pointages le même jour : l'ordre d'arrivée départage les séries en cours
+    _compare(_pointages([
+        ('C0001', '2026-03-02', 'Absent'),
+        ('P0002', '2026-03-02', 'Présent'),
+        ('C0001', '2026-03-02', 'Retard'),
+        ('C0001', '2026-03-01', 'Absent'),
+        ('C0001', '2026-03-02', 'Absent'),
+        ('P0002', '2026-03-02', 'Retard'),
+        ('C0001', '2026-03-03', 'Absent'),
+        ('P0002', '2026-03-01', 'Retard'),
+    ]))
+
+
+def test_single_row_employee():
+    _compare(_pointages([
+        ('R0003', '2026-03-04', 'Retard'),
+        ('C0001', '2026-03-01', 'Présent'),
+        ('C0001', '2026-03-02', 'Absent'),
+    ]))
+    _compare(_pointages([('X0004', '2026-03-05', 'Absent')]))
+
+
+def test_empty_dataframe():
+    df = _pointages([])
+    pd.testing.assert_frame_equal(AttendancePrediction().prepare_data(df), legacy_prepare_data(df.copy()))
+    assert AttendancePrediction().prepare_data(df).empty
+
+
+def test_input_left_untouched():
+    df = synthetic(50, 5)
+    colonnes = list(df.columns)
+    AttendancePrediction().prepare_data(df)
+    assert list(df.columns) == colonnes
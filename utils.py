@@ -1,87 +1,32 @@
-import pandas as pd
-from datetime import datetime, timedelta
-import re
+from datetime import datetime
+from attendance_frame import AttendanceFrame
+from domains import domain_registry
+from stats_engine import PERIODES, accumulate, attendance_stats, multi_period_stats
 
 def classify_domain(matricule):
     """
     Classifie un employé dans un domaine selon le préfixe de son matricule
     """
-    if not isinstance(matricule, str):
-        matricule = str(matricule)
-    
-    matricule = matricule.upper().strip()
-    
-    if matricule.startswith('C'):
-        return 'Chantre'
-    elif matricule.startswith('P'):
-        return 'Protocole'
-    elif matricule.startswith('R'):
-        return 'Régis'
-    else:
-        return 'Autre'
+    return domain_registry().classify(matricule)
+
+def classify_domains(matricules):
+    """
+    Classifie une colonne de matricules (une évaluation par matricule distinct, résultat catégoriel)
+    """
+    return domain_registry().classify_series(matricules)
 
 def calculate_statistics(df):
     """
-    Calcule les statistiques principales à partir du DataFrame
+    Calcule les statistiques principales à partir du DataFrame (ou d'un AttendanceFrame)
     """
-    if df.empty:
-        return {
-            'total_employees': 0,
-            'total_records': 0,
-            'total_present': 0,
-            'total_absent': 0,
-            'total_late': 0,
-            'new_employees_today': 0
-        }
-    
-    stats = {}
-    
-    # Statistiques générales
-    stats['total_employees'] = df['matricule'].nunique()
-    stats['total_records'] = len(df)
-    
-    # Comptage par statut
-    status_counts = df['statut'].value_counts()
-    stats['total_present'] = status_counts.get('Présent', 0)
-    stats['total_absent'] = status_counts.get('Absent', 0)
-    stats['total_late'] = status_counts.get('Retard', 0)
-    
-    # Statistiques par domaine
-    domain_stats = df.groupby(['domaine', 'statut']).size().unstack(fill_value=0)
-    stats['domain_breakdown'] = domain_stats.to_dict()
-    
-    # Calculs supplémentaires si les données le permettent
-    try:
-        # Employés nouveaux aujourd'hui (basé sur created_at si disponible)
-        if 'created_at' in df.columns:
-            today = datetime.now().date()
-            new_today = df[pd.to_datetime(df['created_at']).dt.date == today]['matricule'].nunique()
-            stats['new_employees_today'] = new_today
-        else:
-            stats['new_employees_today'] = 0
-        
-        # Comparaison avec hier si possible
-        if 'date_pointage' in df.columns:
-            today = datetime.now().date()
-            yesterday = today - timedelta(days=1)
-            
-            today_data = df[pd.to_datetime(df['date_pointage']).dt.date == today]
-            yesterday_data = df[pd.to_datetime(df['date_pointage']).dt.date == yesterday]
-            
-            if not yesterday_data.empty:
-                yesterday_present = len(yesterday_data[yesterday_data['statut'] == 'Présent'])
-                yesterday_late = len(yesterday_data[yesterday_data['statut'] == 'Retard'])
-                yesterday_total = len(yesterday_data)
-                
-                stats['yesterday_presence_rate'] = (yesterday_present / max(yesterday_total, 1)) * 100
-                stats['present_vs_yesterday'] = stats['total_present'] - yesterday_present
-                stats['late_vs_yesterday'] = stats['total_late'] - yesterday_late
-    
-    except Exception:
-        # En cas d'erreur, continuer avec les stats de base
-        pass
-    
-    return stats
+    return attendance_stats(df).to_dict()
+
+def calculate_statistics_from_chunks(chunks):
+    """
+    Mêmes statistiques que calculate_statistics, cumulées bloc par bloc
+    (par exemple DatabaseManager.iter_attendance_chunks) : mémoire bornée quelle que soit la période
+    """
+    return accumulate(chunks).finalize()
 
 def format_time_display(dt):
     """
@@ -96,50 +41,26 @@ def validate_matricule(matricule):
     if not isinstance(matricule, str):
         return False
     
-    # Doit commencer par C, P, ou R suivi de chiffres
-    pattern = r'^[CPR]\d+$'
-    return bool(re.match(pattern, matricule.upper().strip()))
+    # Doit commencer par un préfixe de domaine suivi de chiffres
+    return domain_registry().is_matricule(matricule)
 
 def calculate_presence_rate(df, domain=None):
     """
     Calcule le taux de présence pour un domaine spécifique ou global
     """
-    if df.empty:
-        return 0
-    
-    if domain:
-        df = df[df['domaine'] == domain]
-    
-    if df.empty:
-        return 0
-    
-    total = len(df)
-    present = len(df[df['statut'] == 'Présent'])
-    
-    return (present / total) * 100
+    return attendance_stats(df).presence_rate(domain)
 
 def get_time_period_stats(df, period='today'):
     """
     Récupère les statistiques pour une période donnée
     """
-    if df.empty or 'date_pointage' not in df.columns:
+    if df.empty or (not isinstance(df, AttendanceFrame) and 'date_pointage' not in df.columns):
         return {}
     
-    now = datetime.now()
+    if period not in PERIODES:
+        return calculate_statistics(df)
     
-    if period == 'today':
-        target_date = now.date()
-        period_data = df[pd.to_datetime(df['date_pointage']).dt.date == target_date]
-    elif period == 'week':
-        start_week = now.date() - timedelta(days=now.weekday())
-        period_data = df[pd.to_datetime(df['date_pointage']).dt.date >= start_week]
-    elif period == 'month':
-        start_month = now.date().replace(day=1)
-        period_data = df[pd.to_datetime(df['date_pointage']).dt.date >= start_month]
-    else:
-        period_data = df
-    
-    return calculate_statistics(period_data)
+    return multi_period_stats(df, [period])[period].to_dict()
 
 def export_summary_stats(stats):
     """
@@ -177,7 +98,7 @@ def clean_dataframe(df):
     if 'matricule' in df_clean.columns:
         df_clean['matricule'] = df_clean['matricule'].astype(str).str.upper().str.strip()
         # Supprime les matricules invalides
-        df_clean = df_clean[df_clean['matricule'].str.match(r'^[CPR]\d+$', na=False)]
+        df_clean = df_clean[df_clean['matricule'].str.fullmatch(domain_registry().matricule_pattern, na=False)]
     
     # Nettoyage des statuts
     if 'statut' in df_clean.columns:
@@ -196,29 +117,4 @@ def generate_domain_summary(df):
     """
     Génère un résumé par domaine
     """
-    if df.empty:
-        return {}
-    
-    summary = {}
-    
-    for domain in ['Chantre', 'Protocole', 'Régis']:
-        domain_data = df[df['domaine'] == domain]
-        
-        if not domain_data.empty:
-            summary[domain] = {
-                'total': len(domain_data),
-                'present': len(domain_data[domain_data['statut'] == 'Présent']),
-                'absent': len(domain_data[domain_data['statut'] == 'Absent']),
-                'late': len(domain_data[domain_data['statut'] == 'Retard']),
-                'presence_rate': calculate_presence_rate(domain_data)
-            }
-        else:
-            summary[domain] = {
-                'total': 0,
-                'present': 0,
-                'absent': 0,
-                'late': 0,
-                'presence_rate': 0
-            }
-    
-    return summary
+    return attendance_stats(df).domain_summary()
@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+
+
+class WorkerDirectory:
+    """
+    Annuaire des ouvriers en mémoire (matricule -> (nom, poste)), partagé par le processus.
+    Rechargé après `ttl` secondes ou sur invalidation ; évite l'INSERT workers des ouvriers
+    déjà connus et remplace la jointure SQL des lectures enrichies.
+    """
+
+    def __init__(self, db, ttl=None):
+        self.db = db
+        self.ttl = ttl if ttl is not None else float(os.getenv('WORKER_CACHE_TTL', '300'))
+        self._workers = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Recharge l'annuaire complet depuis la table workers"""
+        with self.db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT matricule, nom, poste FROM workers")
+                workers = {
+                    str(matricule).strip().upper(): (nom, poste)
+                    for matricule, nom, poste in cur.fetchall()
+                }
+
+        with self._lock:
+            self._workers = workers
+            self._loaded_at = time.monotonic()
+        print(f"👷 Annuaire des ouvriers chargé ({len(workers)} ouvriers)")
+        return workers
+
+    def snapshot(self):
+        """
+        Annuaire à jour (rechargé s'il a expiré). À prendre avant d'emprunter une connexion :
+        le rechargement en emprunte une autre au pool.
+        """
+        return self._current()
+
+    def _current(self):
+        """Annuaire à jour (rechargé s'il a expiré)"""
+        with self._lock:
+            loaded_at, workers = self._loaded_at, self._workers
+        if loaded_at is None or time.monotonic() - loaded_at > self.ttl:
+            workers = self.refresh()
+        return workers
+
+    def __contains__(self, matricule):
+        return matricule in self._current()
+
+    def get(self, matricule):
+        """(nom, poste) d'un ouvrier, ou None s'il est inconnu"""
+        return self._current().get(matricule)
+
+    def add(self, matricule, nom, poste):
+        """Enregistre un ouvrier tout juste inséré (sans recharger l'annuaire)"""
+        with self._lock:
+            if self._loaded_at is not None and matricule not in self._workers:
+                self._workers = {**self._workers, matricule: (nom, poste)}
+
+    def invalidate(self):
+        """Force le rechargement au prochain accès"""
+        with self._lock:
+            self._loaded_at = None
+
+    def enrich(self, df, workers=None):
+        """
+        Ajoute nom et poste aux pointages par correspondance en mémoire.
+        Comme la jointure SQL, les pointages d'ouvriers inconnus sont écartés.
+        `workers` : annuaire déjà obtenu par snapshot(), sinon l'annuaire à jour.
+        """
+        workers = workers if workers is not None else self._current()
+        df = df[df['matricule'].isin(list(workers))].copy()
+
+        # map sur un catégoriel : une correspondance par matricule distinct
+        df['nom'] = df['matricule'].map({m: w[0] for m, w in workers.items()}).astype('category')
+        df['poste'] = df['matricule'].map({m: w[1] for m, w in workers.items()}).astype('category')
+        return df.reset_index(drop=True)